@@ -8,9 +8,33 @@ from jarvis.analysis.structure.neighbors import NeighborsAnalysis
 from jarvis.core.specie import Specie
 from jarvis.core.specie import get_descrp_arr_name
 import numpy as np
+import os
+import hashlib
+import functools
+from jarvis.core.utils import as_atoms, parallel_map
 from math import log
 
 
+def atoms_hash(atoms, **kwargs):
+    """
+    Get a content hash of an Atoms object.
+
+    The hash covers the lattice, fractional coordinates and elements,
+    plus any descriptor options passed as keyword arguments.
+    """
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(atoms.lattice_mat, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(atoms.frac_coords, dtype=float).tobytes())
+    h.update(" ".join(atoms.elements).encode())
+    h.update(repr(sorted(kwargs.items())).encode())
+    return h.hexdigest()
+
+
+def _cfid_row(atoms, kwargs={}):
+    """Get CFID descriptors of one structure as float32 (pool worker)."""
+    return CFID(atoms).get_comp_descp(**kwargs).astype(np.float32)
+
+
 class CFID(object):
     """Convert Atoms class into 1557 descriptors."""
 
@@ -153,6 +177,62 @@ class CFID(object):
             cat = np.array(cat).astype(float)
         return cat
 
+    @staticmethod
+    def batch(
+        atoms_iterable=[], n_jobs=1, chunksize=16, cache_dir=None, **kwargs
+    ):
+        """
+        Get CFID descriptors for many structures.
+
+        Args:
+
+            atoms_iterable: iterable of jarvis.core.atoms.Atoms or of
+            dataset entries with an "atoms" dict
+
+            n_jobs: number of worker processes, -1 for all CPUs
+
+            chunksize: structures sent to a worker at a time
+
+            cache_dir: directory to memoize descriptors in, keyed by
+            atoms_hash, so only new structures are computed on a re-run
+
+            kwargs: options passed to get_comp_descp
+
+        Returns:
+              float32 array with one row of descriptors per structure
+        """
+        rows = []
+        todo = []
+
+        def cache_file(key):
+            return os.path.join(cache_dir, key[:2], key + ".npy")
+
+        def uncached():
+            for item in atoms_iterable:
+                atoms = as_atoms(item)
+                key = atoms_hash(atoms, **kwargs)
+                rows.append(None)
+                if cache_dir is not None and os.path.exists(cache_file(key)):
+                    rows[-1] = np.load(cache_file(key))
+                else:
+                    todo.append((len(rows) - 1, key))
+                    yield atoms
+
+        func = functools.partial(_cfid_row, kwargs=kwargs)
+        results = parallel_map(func, uncached(), n_jobs, chunksize)
+        # results come first: todo grows as the generator is consumed
+        for row, (ind, key) in zip(results, todo):
+            rows[ind] = row
+            if cache_dir is not None:
+                fname = cache_file(key)
+                os.makedirs(os.path.dirname(fname), exist_ok=True)
+                tmp = fname + ".%d.tmp.npy" % os.getpid()
+                np.save(tmp, row)
+                os.replace(tmp, fname)
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+
 
 def feat_names():
     """Names of the 1557 descriptors."""
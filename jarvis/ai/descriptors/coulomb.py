@@ -5,7 +5,25 @@ Refer to: 10.1103/PhysRevLett.108.058301
 """
 
 import numpy as np
-from jarvis.core.specie import Specie
+import functools
+from jarvis.core.utils import as_atoms, parallel_map
+
+
+def _coulomb(atoms):
+    """Get the natoms x natoms Coulomb matrix of an Atoms object."""
+    Z = np.asarray(atoms.Z, dtype=float)
+    dist = atoms.raw_distance_matrix
+    with np.errstate(divide="ignore"):
+        mat = np.outer(Z, Z) / dist
+    mat[np.diag_indices_from(mat)] = 0.5 * Z ** 2.4
+    return mat
+
+
+def _pad(tmp, max_dim):
+    if max_dim < len(tmp):
+        print("WARNING: Increase max_dim")
+    padding = max_dim - len(tmp)
+    return np.pad(tmp, (0, padding), "constant")
 
 
 def coulomb_matrix(atoms="", max_dim=100):
@@ -20,24 +38,88 @@ def coulomb_matrix(atoms="", max_dim=100):
     Returns:
           z: numpy array of 1 x max_dim dimension
     """
-    natoms = atoms.num_atoms
-    mat = np.zeros((natoms, natoms))
-
-    for ii, i in enumerate(atoms.elements):
-        for jj, j in enumerate(atoms.elements):
-            if ii == jj:
-                mat[ii, jj] = 0.5 * Specie(i).Z ** 2.4
-            else:
-                a = atoms.cart_coords[ii]
-                b = atoms.cart_coords[jj]
-                dist = np.linalg.norm(a - b)
-                mat[ii, jj] = (Specie(i).Z * Specie(j).Z) / dist
-    tmp = mat.ravel()
-    if max_dim < len(tmp):
-        print("WARNING: Increase max_dim")
-    padding = max_dim - len(tmp)
-    z = np.pad(tmp, (0, padding), "constant")
-    return z
+    return _pad(_coulomb(atoms).ravel(), max_dim)
+
+
+def sorted_coulomb_matrix(atoms="", max_dim=100):
+    """Get Coulomb matrix with rows/columns sorted by row norm.
+
+    Sorting makes the descriptor invariant to the order of the atoms.
+
+    Args:
+
+        atoms: atoms object
+
+        max_dim: maximum number of atoms=sqrt(max_dim)
+
+    Returns:
+          z: numpy array of 1 x max_dim dimension
+    """
+    mat = _coulomb(atoms)
+    order = np.argsort(-np.linalg.norm(mat, axis=1), kind="stable")
+    return _pad(mat[np.ix_(order, order)].ravel(), max_dim)
+
+
+def coulomb_eigenvalues(atoms="", max_dim=30):
+    """Get eigen-spectrum of the Coulomb matrix.
+
+    Args:
+
+        atoms: atoms object
+
+        max_dim: maximum number of atoms
+
+    Returns:
+          z: eigenvalues sorted by decreasing magnitude, zero padded
+    """
+    eigs = np.linalg.eigvalsh(_coulomb(atoms))
+    return _pad(eigs[np.argsort(-np.abs(eigs), kind="stable")], max_dim)
+
+
+coulomb_kinds = {
+    "matrix": coulomb_matrix,
+    "sorted": sorted_coulomb_matrix,
+    "eigenvalues": coulomb_eigenvalues,
+}
+
+
+def _coulomb_row(item, kind="matrix", max_dim=100):
+    """Get Coulomb descriptor of one structure (pool worker)."""
+    return coulomb_kinds[kind](as_atoms(item), max_dim=max_dim)
+
+
+def coulomb_batch(
+    atoms_iterable=[], kind="matrix", max_dim=100, n_jobs=1, chunksize=64
+):
+    """
+    Get Coulomb descriptors for many structures, e.g. the qm9 dataset.
+
+    Args:
+
+        atoms_iterable: sequence of jarvis.core.atoms.Atoms or of
+        dataset entries with an "atoms" dict
+
+        kind: "matrix", "sorted" or "eigenvalues"
+
+        max_dim: length of each descriptor row
+
+        n_jobs: number of worker processes, -1 for all CPUs
+
+        chunksize: structures sent to a worker at a time
+
+    Returns:
+          float32 array of shape (number of structures, max_dim)
+    """
+    if kind not in coulomb_kinds:
+        raise ValueError("Unknown Coulomb descriptor", kind)
+    if not hasattr(atoms_iterable, "__len__"):
+        atoms_iterable = list(atoms_iterable)
+    out = np.zeros((len(atoms_iterable), max_dim), dtype=np.float32)
+    func = functools.partial(_coulomb_row, kind=kind, max_dim=max_dim)
+    rows = parallel_map(func, atoms_iterable, n_jobs, chunksize)
+    for ii, row in enumerate(rows):
+        out[ii] = row
+    return out
 
 
 """
@@ -1,8 +1,12 @@
 """Helper functions for ML applications."""
 
-from jarvis.db.figshare import data
+from jarvis.db.figshare import download, _source_key
+from jarvis.db.jsonutils import dumpjson, loadjson
+from jarvis.db.jsonutils import iterjson_chunks, pack_chunks
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 import numpy as np
+import hashlib
+import os
 
 typical_data_ranges = {
     "formation_energy_peratom": [-5, 5],
@@ -37,11 +41,19 @@ typical_data_ranges = {
 }
 
 
-def get_ml_data(ml_property="formation_energy_peratom",
-                dataset='cfid_3d', data_ranges=typical_data_ranges):
+def get_ml_data(
+    ml_property="formation_energy_peratom",
+    dataset="cfid_3d",
+    data_ranges=typical_data_ranges,
+    cache_dir=None,
+    chunk_size=10000,
+):
     """
     Provide arrays/pandas-dataframe as input for ML algorithms.
 
+    Descriptors are packed straight into float32 chunks and filtered
+    with boolean masks, so the dataset is never held as Python lists.
+
     Args:
 
         ml_property: target property to train
@@ -50,42 +62,85 @@ def get_ml_data(ml_property="formation_energy_peratom",
 
         dataset: dataset available in jarvis or other array
 
+        cache_dir: directory to keep X, Y and ids of a named dataset
+        in, they are memory-mapped when read again; the entry is keyed
+        by the mtime and size of the dataset json, so a newer download
+        is converted afresh
+
+        chunk_size: records converted at a time
+
     Returns:
-           X, Y , ids
+           X (float32), Y , ids
     """
-    import pandas as pd
+    if data_ranges is not None and ml_property in data_ranges:
+        lo, hi = data_ranges[ml_property]
+    else:
+        lo, hi = None, None
     if isinstance(dataset, str):
-        dataml = data(dataset)
-        df = pd.DataFrame(dataml)
+        path = download(dataset)
+    if isinstance(dataset, str) and cache_dir is not None:
+        source = _source_key(path)
+        key = hashlib.sha1(
+            repr((dataset, ml_property, lo, hi, source)).encode()
+        ).hexdigest()[:10]
+        prefix = os.path.join(
+            cache_dir, "%s-%s-%s" % (dataset, ml_property, key)
+        )
+        if os.path.isfile(prefix + "-ids.json"):
+            return (
+                np.load(prefix + "-X.npy", mmap_mode="r"),
+                np.load(prefix + "-Y.npy", mmap_mode="r"),
+                loadjson(prefix + "-ids.json"),
+            )
+    if isinstance(dataset, str):
+        chunks = iterjson_chunks(
+            path,
+            keys=["jid", ml_property],
+            chunk_size=chunk_size,
+            width=1557,
+        )
     else:
-        df = pd.DataFrame(dataset)
-
-    x = []
-    y = []
+        chunks = pack_chunks(
+            dataset,
+            keys=["jid", ml_property],
+            chunk_size=chunk_size,
+            width=1557,
+        )
+
+    xs = [np.zeros((0, 1557), dtype=np.float32)]
+    ys = []
     jid = []
-    df2 = df[["desc", "jid", ml_property]].replace("na", np.nan).dropna()
-    for ii, i in df2.iterrows():
-        if data_ranges is None:
-            if (
-                len(i["desc"]) == 1557
-                and float(i[ml_property]) != float("inf")
-                and i[ml_property] != "na"
-            ):
-                x.append(i["desc"])
-                y.append(i[ml_property])
-                jid.append(i["jid"])
-        else:
-            if (
-                len(i["desc"]) == 1557
-                and float(i[ml_property]) != float("inf")
-                and i[ml_property] != "na"
-                and float(i[ml_property]) <= data_ranges[ml_property][1]
-                and float(i[ml_property]) >= data_ranges[ml_property][0]
-            ):
-                x.append(i["desc"])
-                y.append(i[ml_property])
-                jid.append(i["jid"])
-    return np.array(x, dtype="float"), np.array(y, dtype="float"), jid
+    for X, records in chunks:
+        ids = [r.get("jid") for r in records]
+        y = np.array([_to_float(r.get(ml_property)) for r in records])
+        keep = ~np.isnan(X).all(axis=1) & ~np.isnan(y) & (y != np.inf)
+        keep &= np.array([i is not None and i != "na" for i in ids])
+        if lo is not None:
+            keep &= (y >= lo) & (y <= hi)
+        xs.append(X[keep])
+        ys.append(y[keep])
+        jid.extend(np.array(ids, dtype=object)[keep].tolist())
+    x = np.concatenate(xs)
+    y = np.concatenate(ys) if ys else np.zeros(0)
+    if isinstance(dataset, str) and cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = ".%d.tmp" % os.getpid()
+        np.save(prefix + "-X" + tmp + ".npy", x)
+        np.save(prefix + "-Y" + tmp + ".npy", y)
+        dumpjson(jid, prefix + "-ids" + tmp + ".json")
+        # ids last, their presence marks a complete cache entry
+        for name in ["-X", "-Y", "-ids"]:
+            ext = ".json" if name == "-ids" else ".npy"
+            os.replace(prefix + name + tmp + ext, prefix + name + ext)
+    return x, y, jid
+
+
+def _to_float(value):
+    """Convert a property value to float, NaN when it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
 
 
 def regr_scores(test, pred):
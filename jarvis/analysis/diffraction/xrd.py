@@ -3,13 +3,41 @@ import numpy as np
 import json
 import collections
 import os
+import functools
 from jarvis.core.specie import Specie
+from jarvis.core.utils import as_atoms, parallel_map
 
 # from jarvis.core.spectrum import Spectrum
-import itertools
 
 # from jarvis.analysis.structure.spacegroup import Spacegroup3D,
 
+_scattering_table = {}
+
+
+def get_scattering_table():
+    """
+    Get atomic scattering parameters as a NumPy table, read once.
+
+    Returns:
+        dictionary with
+
+        index: element symbol -> table row
+
+        coeffs: n_elements x 4 x 2 array of (a, b) form factor terms
+    """
+    if not _scattering_table:
+        fp = os.path.join(
+            os.path.dirname(__file__), "atomic_scattering_params.json"
+        )
+        with open(fp, "r") as f:
+            params = json.load(f)
+        symbols = list(params.keys())
+        _scattering_table["index"] = {el: i for i, el in enumerate(symbols)}
+        _scattering_table["coeffs"] = np.array(
+            [params[el] for el in symbols], dtype=float
+        )
+    return _scattering_table
+
 
 class XRD(object):
     """Constryct an XRD class."""
@@ -44,30 +72,18 @@ class XRD(object):
         Simulate XRD pattern.
 
         Forked from https://github.com/qzhu2017/XRD.
+        Form factors and structure factors are computed for all
+        reflections at once, and reflections with the same 2theta are
+        merged after sorting.
         """
         # atoms=Spacegroup3D(atoms).conventional_standard_structure
         rec_matrix = atoms.lattice.reciprocal_lattice_crystallographic().matrix
 
         min_r = self.wavelength / np.sin(self.max2theta / 2) / 2
-        r1 = list(range(1, self.max_index + 1))
-        r2 = list(range(-self.max_index, 1))
-        r2.reverse()
-        r3 = r1 + r2
-        r = r3
-        hkl_index = [
-            miller
-            for miller in itertools.product(r, r, r)
-            if any([i != 0 for i in miller])
-        ]
         # hkl_index=symmetrically_distinct_miller_indices(cvn_atoms=atoms,max_index=self.max_index)
+        # scaling each miller index by ceil(1 / d / min_r) never raised
+        # the bound above max_index, so the range is max_index itself
         hkl_max = np.array([self.max_index, self.max_index, self.max_index])
-        for index in hkl_index:
-            d = np.linalg.norm(np.dot(index, rec_matrix))
-            multiple = int(np.ceil(1 / d / min_r))
-            index *= multiple
-            for i in range(len(hkl_max)):
-                if hkl_max[i] < index[i]:
-                    hkl_max[i] = index[i]
 
         h1, k1, l1 = hkl_max
         h = np.arange(-h1, h1 + 1)
@@ -86,82 +102,55 @@ class XRD(object):
         self.theta = np.arcsin(sintheta)
         self.hkl_list = np.array(hkl_list)
         self.d_hkl = d_hkl
-        fp = os.path.join(
-            os.path.dirname(__file__), "atomic_scattering_params.json"
-        )
-        with open(fp, "r") as f:
-            ATOMIC_SCATTERING_PARAMS = json.load(f)
+        table = get_scattering_table()
         d0 = (1 / 2 / self.d_hkl) ** 2
-        coeffs = []
-        zs = []
-        for elem in atoms.elements:
-            if elem == "D":
-                elem = "H"
-            c = ATOMIC_SCATTERING_PARAMS[elem]
-            z = Specie(elem).Z
-            coeffs.append(c)
-            zs.append(z)
-        coeffs = np.array(coeffs)
+        elements = ["H" if el == "D" else el for el in atoms.elements]
+        species, kinds = np.unique(elements, return_inverse=True)
+        coeffs = table["coeffs"][[table["index"][el] for el in species]]
+        zs = np.array([Specie(el).Z for el in species], dtype=float)
+
+        # Calculate the scattering factor sf, reflections x species
+        s2 = d0[:, None, None]
+        sf = zs - 41.78214 * d0[:, None] * np.sum(
+            coeffs[:, :, 0] * np.exp(-coeffs[:, :, 1] * s2), axis=2
+        )
+
+        # Calculate the structure factor f
+        g_dot_r = np.dot(self.hkl_list, np.transpose(atoms.frac_coords))
+        f = np.sum(sf[:, kinds] * np.exp(2j * np.pi * g_dot_r), axis=1)
+
+        # Calculate the lorentz polarization factor lf
+        theta = self.theta
+        lf = (1 + np.cos(2 * theta) ** 2) / (
+            np.sin(theta) ** 2 * np.cos(theta)
+        )
+
+        po = 1
+        # Calculate the intensity I
+        intensity = (f * f.conjugate()).real * lf * po
+
+        # calculate 2*theta
+        two_theta = np.degrees(2 * theta)
+
+        # Merge reflections whose scattered angles are equal, each peak
+        # is labelled by its first reflection
+        order = np.argsort(two_theta, kind="stable")
+        new = np.ones(order.size, dtype=bool)
+        new[1:] = np.diff(two_theta[order]) >= self.two_theta_tol
+        group = np.cumsum(new) - 1
+        order = order[np.lexsort((order, group))]
+        starts = np.nonzero(new)[0]
+        first = order[starts]
+        y = np.add.reduceat(intensity[order], starts)
+        x = two_theta[first]
+        d_hkls = d_hkl[first]
+
         self.peaks = {}
-        two_thetas = []
-
-        for hkl, s2, theta, d_hkl in zip(
-            self.hkl_list, d0, self.theta, self.d_hkl
-        ):
-
-            # Calculate the scattering factor sf
-            g_dot_r = np.dot(atoms.frac_coords, np.transpose([hkl])).T[0]
-            sf = zs - 41.78214 * s2 * np.sum(
-                coeffs[:, :, 0] * np.exp(-coeffs[:, :, 1] * s2), axis=1
-            )
-
-            # Calculate the structure factor f
-            f = np.sum(sf * np.exp(2j * np.pi * g_dot_r))
-
-            # Calculate the lorentz polarization factor lf
-            lf = (1 + np.cos(2 * theta) ** 2) / (
-                np.sin(theta) ** 2 * np.cos(theta)
-            )
-
-            po = 1
-            # Calculate the intensity I
-            intensity_tmp = (f * f.conjugate()).real
-
-            # calculate 2*theta
-            two_theta = np.degrees(2 * theta)
-
-            # Find where the scattered angles are equal
-            ind = np.where(
-                np.abs(np.subtract(two_thetas, two_theta)) < self.two_theta_tol
-            )
-
-            # Append intensity, hkl plane, and thetas to lists
-            if len(ind[0]) > 0:
-                self.peaks[two_thetas[ind[0][0]]][0] += intensity_tmp * lf * po
-                self.peaks[two_thetas[ind[0][0]]][1].append(tuple(hkl))
-            else:
-                self.peaks[two_theta] = [
-                    intensity_tmp * lf * po,
-                    [tuple(hkl)],
-                    d_hkl,
-                ]
-                two_thetas.append(two_theta)
-
-        # max_intensity = max([v[0] for v in self.peaks.values()])
-        x = []
-        y = []
-        d_hkls = []
-        hkl_families = []
-        for k in sorted(self.peaks.keys()):
-            v = self.peaks[k]
-            x.append(k)
-            y.append(v[0])
-            d_hkls.append(v[2])
-            family = self.get_unique_families(v[1])
-            hkl_families.append(family)
-        x = np.array(x)
-        y = np.array(y)
-        d_hkls = np.array(d_hkls)
+        hkls = [tuple(i) for i in self.hkl_list[order].tolist()]
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < starts.size else order.size
+            self.peaks[x[i]] = [y[i], hkls[start:end], d_hkls[i]]
+
         const = np.sum(y, axis=0)
         y = y * self.scaling_factor / const
         screen = y > self.intensity_tol
@@ -209,6 +198,197 @@ class XRD(object):
         return pretty_unique
 
 
+def default_two_theta_grid():
+    """Get the 2theta grid of 0 to 90 degrees in 0.1 degree steps."""
+    return np.linspace(0, 90, 901)
+
+
+def broaden_pattern(
+    two_thetas=[], intensities=[], two_theta_grid=None, sigma=0.1
+):
+    """
+    Put a stick XRD pattern on a fixed 2theta grid.
+
+    Each peak becomes a Gaussian of width sigma (degrees) and the
+    result is scaled to a maximum of one.
+
+    Returns:
+          float32 intensities on two_theta_grid
+    """
+    if two_theta_grid is None:
+        two_theta_grid = default_two_theta_grid()
+    grid = np.asarray(two_theta_grid, dtype=float)
+    x = np.asarray(two_thetas, dtype=float)
+    y = np.asarray(intensities, dtype=float)
+    pattern = np.zeros(grid.size)
+    # peaks only touch the grid within 5 sigma
+    lo = np.searchsorted(grid, x - 5 * sigma)
+    hi = np.searchsorted(grid, x + 5 * sigma)
+    for i, j, xi, yi in zip(lo, hi, x, y):
+        pattern[i:j] += yi * np.exp(-((grid[i:j] - xi) ** 2) / 2 / sigma ** 2)
+    if pattern.max() > 0:
+        pattern /= pattern.max()
+    return pattern.astype(np.float32)
+
+
+def _xrd_row(item, two_theta_grid=None, sigma=0.1, kwargs={}):
+    """
+    Get the broadened XRD pattern of one structure (pool worker).
+
+    Returns None for elements without atomic scattering parameters.
+    """
+    try:
+        x, d, y = XRD(**kwargs).simulate(atoms=as_atoms(item))
+    except KeyError as exp:
+        print("No atomic scattering parameters for", exp)
+        return None
+    return broaden_pattern(x, y, two_theta_grid, sigma)
+
+
+def xrd_patterns(
+    dataset=[],
+    filename=None,
+    two_theta_grid=None,
+    sigma=0.1,
+    n_jobs=1,
+    chunksize=16,
+    **kwargs
+):
+    """
+    Get broadened XRD patterns for a whole dataset.
+
+    Args:
+
+        dataset: list of jarvis.core.atoms.Atoms, or of dicts with an
+        "atoms" entry such as jarvis.db.figshare.data("dft_3d")
+
+        filename: .npy file to write the patterns to, opened as a
+        memory map so the matrix never has to fit in memory
+
+        two_theta_grid: 2theta values of the columns
+
+        sigma: Gaussian peak width in degrees
+
+        n_jobs: number of worker processes, -1 for all CPUs
+
+        chunksize: structures sent to a worker at a time
+
+        kwargs: options passed to XRD
+
+    Returns:
+          float32 array with one pattern row per structure, NaN for
+          structures with elements that have no scattering parameters
+    """
+    if two_theta_grid is None:
+        two_theta_grid = default_two_theta_grid()
+    shape = (len(dataset), len(two_theta_grid))
+    if filename is not None:
+        out = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=np.float32, shape=shape
+        )
+    else:
+        out = np.zeros(shape, dtype=np.float32)
+    func = functools.partial(
+        _xrd_row, two_theta_grid=two_theta_grid, sigma=sigma, kwargs=kwargs
+    )
+    rows = parallel_map(func, dataset, n_jobs, chunksize)
+    for i, row in enumerate(rows):
+        if row is None:
+            print("XRD pattern not simulated for entry", i)
+            row = np.nan
+        out[i] = row
+    if filename is not None:
+        out.flush()
+    return out
+
+
+class XRDSearch(object):
+    """Find the simulated XRD patterns most similar to a measured one."""
+
+    def __init__(self, patterns=[], ids=None, metric="cosine", coarse=10):
+        """
+        Initialize the index.
+
+        Args:
+
+            patterns: n x ngrid matrix from xrd_patterns, or its .npy file,
+            rows with NaN are never matched
+
+            ids: label of every row, e.g. the jids of the dataset
+
+            metric: "cosine" or "pearson"
+
+            coarse: grid points summed into one bin of the pre-filter
+        """
+        if isinstance(patterns, str):
+            patterns = np.load(patterns, mmap_mode="r")
+        self.ids = ids
+        self.metric = metric
+        self.coarse = coarse
+        patterns = np.asarray(patterns, dtype=np.float32)
+        self.valid = np.isfinite(patterns).all(axis=1)
+        self.matrix = self.normalize(
+            np.where(self.valid[:, None], patterns, 0)
+        )
+        self.coarse_matrix = self.normalize(self.bin(self.matrix))
+
+    def normalize(self, x):
+        """Scale rows to unit norm, after centering for pearson."""
+        x = np.array(x, dtype=np.float32, ndmin=2)
+        if self.metric == "pearson":
+            x -= x.mean(axis=1, keepdims=True)
+        elif self.metric != "cosine":
+            raise ValueError("Unknown metric", self.metric)
+        norm = np.linalg.norm(x, axis=1, keepdims=True)
+        norm[norm == 0] = 1
+        return x / norm
+
+    def bin(self, x):
+        """Sum groups of coarse neighbouring grid points."""
+        n = x.shape[1] // self.coarse * self.coarse
+        return x[:, :n].reshape(x.shape[0], -1, self.coarse).sum(axis=2)
+
+    def query(self, pattern=[], top_k=10, prefilter=None):
+        """
+        Get the rows most similar to a pattern.
+
+        Args:
+
+            pattern: intensities on the same 2theta grid, see
+            broaden_pattern for stick patterns
+
+            top_k: number of matches
+
+            prefilter: if set, only this many best rows of the binned
+            matrix are scored on the full grid
+
+        Returns:
+              list of (id, score) pairs, best first, with row indices
+              as ids when none were given
+        """
+        q = self.normalize(pattern)
+        rows = None
+        if prefilter is not None and prefilter < self.matrix.shape[0]:
+            qc = self.normalize(self.bin(q))[0]
+            scores = np.dot(self.coarse_matrix, qc)
+            scores[~self.valid] = -np.inf
+            rows = np.argpartition(-scores, prefilter)[:prefilter]
+            scores = np.dot(self.matrix[rows], q[0])
+            scores[~self.valid[rows]] = -np.inf
+        else:
+            scores = np.dot(self.matrix, q[0])
+            scores[~self.valid] = -np.inf
+        top_k = min(top_k, int(np.isfinite(scores).sum()))
+        if top_k == 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        inds = best if rows is None else rows[best]
+        if self.ids is None:
+            return [(int(i), float(s)) for i, s in zip(inds, scores[best])]
+        return [(self.ids[i], float(s)) for i, s in zip(inds, scores[best])]
+
+
 """
 if __name__ == "__main__":
     # h=create_index()
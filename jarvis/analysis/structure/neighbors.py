@@ -1,8 +1,8 @@
 """This module provides classes to specify atomic structure."""
 # import line_profiler
 import numpy as np
-import matplotlib.pyplot as plt
-import math
+import itertools
+from scipy.spatial import cKDTree
 from toolz.curried import pipe
 
 
@@ -139,6 +139,439 @@ def calc_structure_data(coords, box, all_symbs, c_size):
     return make_coords((c_size / np.max(np.abs(box), axis=1)).astype(int) + 1)
 
 
+def minimum_image_bonds(coords, lat, i, j):
+    """
+    Get bond vectors and lengths between pairs of atoms.
+
+    Uses the same minimum image convention as the pair loop it replaces:
+    a fractional difference larger than 0.5 is shifted by one lattice
+    vector.
+
+    Args:
+
+      coords: fractional coordinates of all the atoms
+
+      lat: the lattice matrix
+
+      i: array of first atom indices
+
+      j: array of second atom indices
+
+    Returns:
+      cartesian bond vectors (from coords[j] to coords[i]) and lengths
+
+    >>> coords = np.array([[0.0, 0.0, 0.0], [0.9, 0.0, 0.0]])
+    >>> lat = np.eye(3) * 10.0
+    >>> bonds, dist = minimum_image_bonds(coords, lat, [0], [1])
+    >>> [round(i, 2) for i in bonds[0]], round(dist[0], 2)
+    ([1.0, 0.0, 0.0], 1.0)
+    """
+    diff = coords[i] - coords[j]
+    ind = np.fabs(diff) > 0.5
+    diff[ind] -= np.sign(diff[ind])
+    bonds = np.dot(diff, lat)
+    # A 1x3 by 3x1 matmul per bond is the same BLAS dot product as
+    # np.linalg.norm of one bond vector in the pair loop, so lengths agree
+    # to the last bit; element-wise sums can differ by 1 ulp, which moves
+    # cosines of collinear bonds across the +-1 clamp in bond_angles
+    dd = np.sqrt(np.matmul(bonds[:, None, :], bonds[:, :, None])[:, 0, 0])
+    return bonds, dd
+
+
+def brute_force_pairs(coords, lat, rcut, chunk_size=256):
+    """
+    Get all atom pairs (i < j) within a cut-off by direct search.
+
+    The search is vectorized over chunks of atoms, so it needs
+    O(chunk_size * N) memory but still does O(N^2) work.
+
+    Args:
+
+      coords: fractional coordinates of all the atoms
+
+      lat: the lattice matrix
+
+      rcut: distance cut-off
+
+      chunk_size: number of atoms handled in one vectorized block
+
+    Returns:
+      first indices, second indices, bond vectors and bond lengths
+    """
+    nat = len(coords)
+    all_i = []
+    all_j = []
+    for start in range(0, nat, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, nat))
+        i, j = np.nonzero(np.arange(nat)[None, :] > rows[:, None])
+        i = rows[i]
+        _, dd = minimum_image_bonds(coords, lat, i, j)
+        mask = (dd < rcut) & (dd >= 0.1)
+        all_i.append(i[mask])
+        all_j.append(j[mask])
+    i = np.concatenate(all_i) if all_i else np.zeros(0, dtype="int")
+    j = np.concatenate(all_j) if all_j else np.zeros(0, dtype="int")
+    bonds, dd = minimum_image_bonds(coords, lat, i, j)
+    return i, j, bonds, dd
+
+
+def kdtree_pairs(coords, lat, rcut):
+    """
+    Get all atom pairs (i < j) within a cut-off using a KD-tree.
+
+    The periodic images reachable through the minimum image convention
+    are the 27 cells shifted by -1, 0 or 1 lattice vectors, so a
+    KD-tree of the cartesian coordinates is queried against each of
+    these shifted copies. The candidates are then re-measured with
+    minimum_image_bonds, which gives exactly the brute-force result.
+
+    Args:
+
+      coords: fractional coordinates of all the atoms
+
+      lat: the lattice matrix
+
+      rcut: distance cut-off
+
+    Returns:
+      first indices, second indices, bond vectors and bond lengths
+
+    >>> coords = np.random.rand(50, 3)
+    >>> lat = np.array([[6.0, 0, 0], [1.0, 5.0, 0], [0.5, 0.3, 7.0]])
+    >>> a = kdtree_pairs(coords, lat, 4.0)
+    >>> b = brute_force_pairs(coords, lat, 4.0)
+    >>> np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+    True
+    """
+    nat = len(coords)
+    cart = np.dot(coords, lat)
+    tree = cKDTree(cart)
+    search_r = rcut * (1.0 + 1e-8) + 1e-8
+    keys = []
+    for shift in itertools.product([-1, 0, 1], repeat=3):
+        image = cKDTree(cart + np.dot(shift, lat))
+        found = tree.sparse_distance_matrix(
+            image, search_r, output_type="ndarray"
+        )
+        i = found["i"].astype("int")
+        j = found["j"].astype("int")
+        mask = i < j
+        keys.append(i[mask] * nat + j[mask])
+    keys = np.unique(np.concatenate(keys))
+    i = keys // nat
+    j = keys % nat
+    bonds, dd = minimum_image_bonds(coords, lat, i, j)
+    mask = (dd < rcut) & (dd >= 0.1)
+    return i[mask], j[mask], bonds[mask], dd[mask]
+
+
+def periodic_neighbors(coords, lat, rcut, max_neighbors=None):
+    """
+    Get all neighbors within a cut-off, over every periodic image.
+
+    Unlike kdtree_pairs this does not use the minimum image convention,
+    so an atom can see several images of another atom and images of
+    itself without building a supercell. The number of image cells
+    along each lattice vector follows from the spacing of the lattice
+    planes.
+
+    Args:
+
+      coords: fractional coordinates of all the atoms
+
+      lat: the lattice matrix
+
+      rcut: distance cut-off
+
+      max_neighbors: keep only this many nearest neighbors per atom
+
+    Returns:
+      source indices, destination indices, image shifts of the
+      destination, cartesian vectors from source to destination and
+      their lengths, sorted by source and then by length
+
+    >>> coords = np.array([[0.0, 0.0, 0.0]])
+    >>> i, j, images, vec, dd = periodic_neighbors(coords, np.eye(3), 1.1)
+    >>> len(i), sorted(set(np.round(dd, 3)))
+    (6, [1.0])
+    """
+    lat = np.array(lat, dtype=float)
+    cart = np.dot(np.array(coords, dtype=float) % 1.0, lat)
+    # lattice plane spacing along each vector is 1 / |row of inv(lat).T|
+    recip = np.linalg.inv(lat).T
+    reach = np.ceil(rcut * np.linalg.norm(recip, axis=1)).astype("int")
+    tree = cKDTree(cart)
+    all_i = []
+    all_j = []
+    all_s = []
+    for shift in itertools.product(*[range(-n, n + 1) for n in reach]):
+        image = cKDTree(cart + np.dot(shift, lat))
+        found = tree.sparse_distance_matrix(image, rcut, output_type="ndarray")
+        i = found["i"].astype("int")
+        j = found["j"].astype("int")
+        if not any(shift):
+            keep = i != j
+            i, j = i[keep], j[keep]
+        all_i.append(i)
+        all_j.append(j)
+        all_s.append(np.tile(shift, (len(i), 1)))
+    i = np.concatenate(all_i)
+    j = np.concatenate(all_j)
+    images = np.concatenate(all_s).astype("int").reshape(-1, 3)
+    vec = cart[j] + np.dot(images, lat) - cart[i]
+    dd = np.sqrt(
+        vec[:, 0] * vec[:, 0] + vec[:, 1] * vec[:, 1] + vec[:, 2] * vec[:, 2]
+    )
+    mask = (dd <= rcut) & (dd >= 1e-8)
+    order = np.lexsort((dd[mask], i[mask]))
+    i, j, images, vec, dd = [x[mask][order] for x in (i, j, images, vec, dd)]
+    if max_neighbors is not None:
+        counts = np.bincount(i, minlength=len(cart))
+        keep = ragged_arange(counts) < max_neighbors
+        i, j, images, vec, dd = [x[keep] for x in (i, j, images, vec, dd)]
+    return i, j, images, vec, dd
+
+
+neighbor_backends = {"kdtree": kdtree_pairs, "brute": brute_force_pairs}
+
+
+def neighbor_arrays(nat, i, j, bonds, dd, max_n=500):
+    """
+    Arrange atom pairs into per-atom neighbor arrays.
+
+    Neighbors of each atom are ordered by their index, and a pair is
+    dropped once either of its atoms already has max_n neighbors,
+    in the same order as the original pair loop.
+
+    Args:
+
+      nat: number of atoms
+
+      i, j: pair indices with i < j, sorted by (i, j)
+
+      bonds: bond vectors coords[i] - coords[j] in cartesian
+
+      dd: bond lengths
+
+      max_n: maximum number of neighbors per atom
+
+    Returns:
+      nbor_info dictionary and a warning message
+    """
+    nb_warn = ""
+    nn = np.bincount(np.concatenate([i, j]), minlength=nat)
+    if len(nn) and nn.max() > max_n:
+        count = np.zeros(nat, dtype="int")
+        keep = np.zeros(len(i), dtype=bool)
+        for ind, (p, q) in enumerate(zip(i.tolist(), j.tolist())):
+            if count[p] < max_n and count[q] < max_n:
+                count[p] += 1
+                count[q] += 1
+                keep[ind] = True
+            else:
+                nb_warn = "Very large nearest neighbors observed " + str(
+                    count[p]
+                )
+        i, j, bonds, dd = i[keep], j[keep], bonds[keep], dd[keep]
+        nn = count
+    atom = np.concatenate([i, j])
+    partner = np.concatenate([j, i])
+    vec = np.concatenate([bonds, -bonds])
+    length = np.concatenate([dd, dd])
+    order = np.lexsort((partner, atom))
+    atom = atom[order]
+    start = np.concatenate([[0], np.cumsum(nn)[:-1]])
+    slot = np.arange(len(atom)) - start[atom]
+
+    dist = np.zeros((max_n, nat))
+    nn_id = np.zeros((max_n, nat), dtype="int")
+    bondx = np.zeros((max_n, nat))
+    bondy = np.zeros((max_n, nat))
+    bondz = np.zeros((max_n, nat))
+    dist[slot, atom] = length[order]
+    nn_id[slot, atom] = partner[order]
+    bondx[slot, atom] = vec[order, 0]
+    bondy[slot, atom] = vec[order, 1]
+    bondz[slot, atom] = vec[order, 2]
+    nbor_info = {}
+    nbor_info["dist"] = dist
+    nbor_info["nat"] = nat
+    nbor_info["nn_id"] = nn_id
+    nbor_info["nn"] = nn.astype("int")
+    nbor_info["bondx"] = bondx
+    nbor_info["bondy"] = bondy
+    nbor_info["bondz"] = bondz
+    return nbor_info, nb_warn
+
+
+def ragged_arange(counts):
+    """
+    Concatenate np.arange(n) for each n in counts.
+
+    >>> ragged_arange(np.array([3, 0, 2]))
+    array([0, 1, 2, 0, 1])
+    """
+    counts = np.asarray(counts, dtype="int")
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(counts.sum()) - starts
+
+
+def round_values(values, ndigits=3):
+    """
+    Round an array exactly as the builtin round does for each float.
+
+    np.round scales by 10**ndigits first, which can land on the other
+    side of a half-way point, so the values close to one are re-rounded
+    with the builtin.
+
+    >>> round_values(np.array([0.0005, 1.2345, 179.99999]))
+    array([  0.   ,   1.234, 180.   ])
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    rounded[near_half] = [round(v, ndigits) for v in values[near_half]]
+    return rounded
+
+
+def key_histogram(keys, atoms, nbins=179):
+    """
+    Histogram distinct angle values in 1 degree bins starting at 1.
+
+    Each distinct value is weighted by the number of times it occurs
+    divided by the number of different atoms it occurs on.
+
+    Args:
+
+      keys: rounded angles, in the order they were generated
+
+      atoms: central atom of each angle
+
+      nbins: number of bins
+
+    Returns:
+      histogram and bin edges
+    """
+    bins = np.arange(1, nbins + 2.0, 1)
+    if len(keys) == 0:
+        return np.zeros(nbins), bins
+    uniq, first, inverse, counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True
+    )
+    base = int(atoms.max()) + 1
+    pairs = np.unique(inverse * base + atoms)
+    n_atoms = np.bincount(pairs // base, minlength=len(uniq))
+    # Accumulate in the order the values first appeared
+    order = np.argsort(first, kind="stable")
+    angs = uniq[order]
+    norm = counts[order] / n_atoms[order]
+    return np.histogram(angs, weights=norm, bins=bins, density=False)
+
+
+def bond_angles(nbor_info):
+    """
+    Get the angles between all pairs of bonds at each atom.
+
+    Returns:
+      central atoms and angles in degrees, in (atom, bond1, bond2) order
+    """
+    nn = nbor_info["nn"]
+    dist = nbor_info["dist"]
+    bondx = nbor_info["bondx"]
+    bondy = nbor_info["bondy"]
+    bondz = nbor_info["bondz"]
+    atom = np.repeat(np.arange(nbor_info["nat"]), nn)
+    in1 = ragged_arange(nn)
+    counts = nn[atom] - 1 - in1
+    atom = np.repeat(atom, counts)
+    in1 = np.repeat(in1, counts)
+    in2 = in1 + 1 + ragged_arange(counts)
+    nm = dist[in1, atom] * dist[in2, atom]
+    keep = nm != 0
+    atom, in1, in2, nm = atom[keep], in1[keep], in2[keep], nm[keep]
+    rrx = bondx[in1, atom] * bondx[in2, atom]
+    rry = bondy[in1, atom] * bondy[in2, atom]
+    rrz = bondz[in1, atom] * bondz[in2, atom]
+    cos = (rrx + rry + rrz) / nm
+    cos[cos <= -1.0] += 0.000001
+    cos[cos >= 1.0] -= 0.000001
+    return atom, np.degrees(np.arccos(cos))
+
+
+def _rowdot(a, b):
+    """
+    Get the dot products of matching rows of two n x 3 arrays.
+
+    Each is the BLAS dot product np.dot gives for one pair of vectors,
+    so results match the per-bond loops to the last bit.
+    """
+    return np.matmul(a[:, None, :], b[:, :, None])[:, 0, 0]
+
+
+def dihedral_angles(nbor_info, chunk_size=1000000):
+    """
+    Get the dihedral angles around every bond i-j with j > i.
+
+    For each bond, all other neighbors of i are combined with all
+    other neighbors of j. The bonds are processed in chunks of about
+    chunk_size dihedrals to bound the memory use.
+
+    Returns:
+      atoms i and dihedral angles in degrees, in the order of the loop
+      over (i, j, neighbor of i, neighbor of j)
+    """
+    nn = nbor_info["nn"]
+    nn_id = nbor_info["nn_id"]
+    bonds = np.stack(
+        [nbor_info["bondx"], nbor_info["bondy"], nbor_info["bondz"]],
+        axis=-1,
+    )
+    owner = np.repeat(np.arange(nbor_info["nat"]), nn)
+    in1 = ragged_arange(nn)
+    j1 = nn_id[in1, owner]
+    keep = j1 > owner
+    owner, in1, j1 = owner[keep], in1[keep], j1[keep]
+    sizes = np.cumsum(nn[owner] * nn[j1])
+    splits = np.searchsorted(
+        sizes, np.arange(chunk_size, sizes[-1] if len(sizes) else 0,
+                         chunk_size)
+    )
+    all_atoms = []
+    all_angles = []
+    for ind in np.split(np.arange(len(owner)), splits):
+        i, s1, j = owner[ind], in1[ind], j1[ind]
+        counts = nn[i]
+        i, s1, j = np.repeat(i, counts), np.repeat(s1, counts), np.repeat(
+            j, counts
+        )
+        s2 = ragged_arange(counts)
+        keep = nn_id[s2, i] != j
+        i, s1, j, s2 = i[keep], s1[keep], j[keep], s2[keep]
+        counts = nn[j]
+        i, s1, j, s2 = (np.repeat(x, counts) for x in (i, s1, j, s2))
+        s3 = ragged_arange(counts)
+        keep = nn_id[s3, j] != i
+        i, s1, j, s2, s3 = (x[keep] for x in (i, s1, j, s2, s3))
+        v1 = bonds[s2, i]
+        v2 = -bonds[s1, i]
+        v3 = -bonds[s3, j]
+        v23 = np.cross(v2, v3)
+        v12 = np.cross(v1, v2)
+        theta = np.degrees(
+            np.arctan2(
+                np.sqrt(_rowdot(v2, v2)) * _rowdot(v1, v23),
+                _rowdot(v12, v23),
+            )
+        )
+        theta[theta < 0.00001] *= -1
+        all_atoms.append(i)
+        all_angles.append(theta)
+    if not all_atoms:
+        return np.zeros(0, dtype="int"), np.zeros(0)
+    return np.concatenate(all_atoms), np.concatenate(all_angles)
+
+
 class NeighborsAnalysis(object):
     """Get neighbor informations (RDF,ADF,DDF) for Atoms object."""
 
@@ -150,6 +583,7 @@ class NeighborsAnalysis(object):
         max_cut=10.0,
         rcut2=None,
         verbose=False,
+        backend="kdtree",
     ):
         """
         Initialize the function.
@@ -161,7 +595,13 @@ class NeighborsAnalysis(object):
         >>> distributions = NeighborsAnalysis(Si).get_all_distributions
         >>> distributions['rdf']
         1
+
+        The neighbor search backend can be "kdtree" (default) or "brute".
         """
+        if backend not in neighbor_backends:
+            raise ValueError("Unknown neighbor backend", backend)
+        self.backend = backend
+        self._nbor_pairs = {}
         self._atoms = atoms
         self.max_n = max_n
         self.max_cut = max_cut
@@ -187,70 +627,43 @@ class NeighborsAnalysis(object):
             c_size,
         )
 
-    # @profile
-    # kernprof -v -l neighbors.py
+    def _pair_list(self, rcut=10.0, c_size=12.0):
+        """
+        Get atom pairs within rcut for a supercell size.
+
+        The pair search for each supercell size is done once, at the
+        largest cut-off asked for so far, and smaller cut-offs are
+        filtered from it.
+        """
+        cached = self._nbor_pairs.get(c_size)
+        if cached is None or cached["rcut"] < rcut:
+            struct_info = self.get_structure_data(c_size)
+            coords = np.array(struct_info["coords"])
+            lat = np.array(struct_info["lat"])
+            i, j, bonds, dd = neighbor_backends[self.backend](
+                coords, lat, rcut
+            )
+            cached = dict(
+                rcut=rcut, nat=struct_info["nat"], i=i, j=j, bonds=bonds, dd=dd
+            )
+            self._nbor_pairs[c_size] = cached
+        mask = cached["dd"] < rcut
+        return (
+            cached["nat"],
+            cached["i"][mask],
+            cached["j"][mask],
+            cached["bonds"][mask],
+            cached["dd"][mask],
+        )
+
     def nbor_list(self, rcut=10.0, c_size=12.0):
         """Generate neighbor info."""
-        max_n = self.max_n
-        nbor_info = {}
-        struct_info = self.get_structure_data(c_size)
-        coords = np.array(struct_info["coords"])
-        nat = struct_info["nat"]
-        new_symbs = struct_info["new_symbs"]
-        lat = np.array(struct_info["lat"])
-        different_bond = {}
-        nn = np.zeros((nat), dtype="int")
-        # print ('max_n, nat',max_n, nat)
-        dist = np.zeros((max_n, nat))
-        nn_id = np.zeros((max_n, nat), dtype="int")
-        bondx = np.zeros((max_n, nat))
-        bondy = np.zeros((max_n, nat))
-        bondz = np.zeros((max_n, nat))
-        for i in range(nat):
-            for j in range(i + 1, nat):
-                diff = coords[i] - coords[j]
-                ind = np.where(np.fabs(diff) > np.array([0.5, 0.5, 0.5]))
-                diff[ind] -= np.sign(diff[ind])
-                new_diff = np.dot(diff, lat)
-                dd = np.linalg.norm(new_diff)
-                if dd < rcut and dd >= 0.1:
-                    sumb_i = new_symbs[i]
-                    sumb_j = new_symbs[j]
-                    comb = "_".join(
-                        sorted(str(sumb_i + "_" + sumb_j).split("_"))
-                    )
-                    different_bond.setdefault(comb, []).append(dd)
-
-                    # print ('dd',dd)
-                    nn_index = nn[i]  # index of the neighbor
-                    nn_index1 = nn[j]  # index of the neighbor
-                    if nn_index < max_n and nn_index1 < max_n:
-                        nn[i] = nn[i] + 1
-                        dist[nn_index][i] = dd  # nn_index counter id
-                        nn_id[nn_index][i] = j  # exact id
-                        bondx[nn_index][i] = new_diff[0]
-                        bondy[nn_index][i] = new_diff[1]
-                        bondz[nn_index][i] = new_diff[2]
-                        nn[j] = nn[j] + 1
-                        dist[nn_index1][j] = dd  # nn_index counter id
-                        nn_id[nn_index1][j] = i  # exact id
-                        bondx[nn_index1][j] = -new_diff[0]
-                        bondy[nn_index1][j] = -new_diff[1]
-                        bondz[nn_index1][j] = -new_diff[2]
-                    else:
-                        self.nb_warn = (
-                            "Very large nearest neighbors observed "
-                            + str(nn_index)
-                        )
-        nbor_info["dist"] = dist
-        nbor_info["nat"] = nat
-        nbor_info["nn_id"] = nn_id
-        nbor_info["nn"] = nn
-        nbor_info["bondx"] = bondx
-        nbor_info["bondy"] = bondy
-        nbor_info["bondz"] = bondz
-        # print ('nat',nat)
-
+        nat, i, j, bonds, dd = self._pair_list(rcut=rcut, c_size=c_size)
+        nbor_info, nb_warn = neighbor_arrays(
+            nat, i, j, bonds, dd, max_n=self.max_n
+        )
+        if nb_warn != "":
+            self.nb_warn = nb_warn
         return nbor_info
 
     def get_rdf(self, plot=False):
@@ -275,6 +688,8 @@ class NeighborsAnalysis(object):
         )  # /len(n_zero_d)
         nn = rdf / self._atoms.num_atoms
         if plot:
+            import matplotlib.pyplot as plt
+
             plt.plot(bins[:-1], rdf)
             plt.savefig("rdf.png")
             plt.close()
@@ -364,46 +779,8 @@ class NeighborsAnalysis(object):
 
             ang_bins1: angle bins
         """
-        # rcut1,rcut2=self.get_dist_cutoffs()
-        # rcut=rcut1
-        # nbor_info=self.nbor_list()
-        znm = 0
-        nat = nbor_info["nat"]
-        dist = nbor_info["dist"]
-        # nn_id = nbor_info["nn_id"]
-        nn = nbor_info["nn"]
-        bondx = nbor_info["bondx"]
-        bondy = nbor_info["bondy"]
-        bondz = nbor_info["bondz"]
-
-        ang_at = {}
-
-        for i in range(nat):
-            for in1 in range(nn[i]):
-                # j1 = nn_id[in1][i]
-                for in2 in range(in1 + 1, nn[i]):
-                    # j2 = nn_id[in2][i]
-                    nm = dist[in1][i] * dist[in2][i]
-                    if nm != 0:
-                        rrx = bondx[in1][i] * bondx[in2][i]
-                        rry = bondy[in1][i] * bondy[in2][i]
-                        rrz = bondz[in1][i] * bondz[in2][i]
-                        cos = float(rrx + rry + rrz) / float(nm)
-                        if cos <= -1.0:
-                            cos = cos + 0.000001
-                        if cos >= 1.0:
-                            cos = cos - 0.000001
-                        deg = math.degrees(math.acos(cos))
-                        ang_at.setdefault(round(deg, 3), []).append(i)
-                    else:
-                        znm = znm + 1
-        angs = np.array([float(i) for i in ang_at.keys()])
-        norm = np.array(
-            [float(len(i)) / float(len(set(i))) for i in ang_at.values()]
-        )
-        ang_hist, ang_bins = np.histogram(
-            angs, weights=norm, bins=np.arange(1, 181.0, 1), density=False,
-        )
+        atoms, angles = bond_angles(nbor_info)
+        ang_hist, ang_bins = key_histogram(round_values(angles, 3), atoms)
         # if plot == True:
         #    plt.bar(ang_bins[:-1], ang_hist)
         #    plt.savefig("ang1.png")
@@ -419,6 +796,7 @@ class NeighborsAnalysis(object):
         ang_hist, ang_bins = self.ang_dist(nbor_info=nbor_info)
         # print ('anghist',ang_hist)
         if plot:
+            import matplotlib.pyplot as plt
 
             plt.plot(ang_bins[:-1], ang_hist)
             plt.savefig("adf1.png")
@@ -434,6 +812,8 @@ class NeighborsAnalysis(object):
         nbor_info = self.nbor_list(rcut=rcut2)
         ang_hist, ang_bins = self.ang_dist(nbor_info=nbor_info)
         if plot:
+            import matplotlib.pyplot as plt
+
             plt.plot(ang_bins[:-1], ang_hist)
             plt.savefig("adf2.png")
             plt.close()
@@ -445,65 +825,11 @@ class NeighborsAnalysis(object):
         rcut1 = self.rcut1
         # rcut2 = self.rcut2
         nbor_info = self.nbor_list(rcut=rcut1)
-        nat = nbor_info["nat"]
-        # dist = nbor_info["dist"]
-        nn_id = nbor_info["nn_id"]
-        nn = nbor_info["nn"]
-        bondx = nbor_info["bondx"]
-        bondy = nbor_info["bondy"]
-        bondz = nbor_info["bondz"]
-        dih_at = {}
-        for i in range(nat):
-            for in1 in range(nn[i]):
-                j1 = nn_id[in1][i]
-                if j1 > i:
-                    for in2 in range(nn[i]):
-                        # all other nn of i that are not j
-                        j2 = nn_id[in2][i]
-                        if j2 != j1:
-                            for in3 in range(
-                                nn[j1]
-                            ):  # all other nn of j that are not i
-                                j3 = nn_id[in3][j1]
-                                if j3 != i:
-                                    v1 = []
-                                    v2 = []
-                                    v3 = []
-                                    v1.append(bondx[in2][i])
-                                    v1.append(bondy[in2][i])
-                                    v1.append(bondz[in2][i])
-                                    v2.append(-bondx[in1][i])
-                                    v2.append(-bondy[in1][i])
-                                    v2.append(-bondz[in1][i])
-                                    v3.append(-bondx[in3][j1])
-                                    v3.append(-bondy[in3][j1])
-                                    v3.append(-bondz[in3][j1])
-                                    v23 = np.cross(v2, v3)
-                                    v12 = np.cross(v1, v2)
-                                    theta = math.degrees(
-                                        math.atan2(
-                                            np.linalg.norm(v2)
-                                            * np.dot(v1, v23),
-                                            np.dot(v12, v23),
-                                        )
-                                    )
-                                    if theta < 0.00001:
-                                        theta = -theta
-                                    # print "theta=",theta
-                                    dih_at.setdefault(
-                                        round(theta, 3), []
-                                    ).append(i)
-        dih = np.array([float(i) for i in dih_at.keys()])
-        # dih1 = set(dih)
-        # print "dih",dih1
-        norm = np.array(
-            [float(len(i)) / float(len(set(i))) for i in dih_at.values()]
-        )
-
-        dih_hist1, dih_bins1 = np.histogram(
-            dih, weights=norm, bins=np.arange(1, 181.0, 1), density=False,
-        )
+        atoms, angles = dihedral_angles(nbor_info)
+        dih_hist1, dih_bins1 = key_histogram(round_values(angles, 3), atoms)
         if plot:
+            import matplotlib.pyplot as plt
+
             plt.plot(dih_bins1[:-1], dih_hist1)
             plt.savefig("dihedrals.png")
             plt.close()
@@ -513,6 +839,8 @@ class NeighborsAnalysis(object):
     def get_all_distributions(self):
         """Get all distributions."""
         distributions = {}
+        # One pair search at the largest cut-off serves ADF-a, ADF-b, DDF
+        self._pair_list(rcut=max(self.rcut1, self.rcut2))
         _, rdf, nn = self.get_rdf()
         ddf, _ = self.get_ddf()
         adfa, _ = self.ang_dist_first()
@@ -545,50 +873,20 @@ class NeighborsAnalysis(object):
 
     def atomwise_angle_dist(self, rcut=None, nbins=180, c_size=0):
         """Get angle distribution for each atom."""
-
-        def angle(
-            dist1, dist2, bondx1, bondx2, bondy1, bondy2, bondz1, bondz2,
-        ):
-            """Get an angle."""
-            nm = dist1 * dist2
-            rrx = bondx1 * bondx2
-            rry = bondy1 * bondy2
-            rrz = bondz1 * bondz2
-            cos = (rrx + rry + rrz) / (nm)
-            if cos <= -1.0:
-                cos = cos + 0.000001
-            if cos >= 1.0:
-                cos = cos - 0.000001
-            deg = math.degrees(math.acos(cos))
-            return deg
-
         if rcut is None:
             rcut = self.rcut1
         nbor_info = self.nbor_list(rcut=rcut, c_size=c_size)
-        atom_angles = []
-        for i in range(nbor_info["nat"]):
-            angles = [
-                angle(
-                    nbor_info["dist"][in1][i],
-                    nbor_info["dist"][in2][i],
-                    nbor_info["bondx"][in1][i],
-                    nbor_info["bondx"][in2][i],
-                    nbor_info["bondy"][in1][i],
-                    nbor_info["bondy"][in2][i],
-                    nbor_info["bondz"][in1][i],
-                    nbor_info["bondz"][in2][i],
-                )
-                for in1 in range(nbor_info["nn"][i])
-                for in2 in range(nbor_info["nn"][i])
-                if in2 > in1
-                and nbor_info["dist"][in1][i] * nbor_info["dist"][in2][i] != 0
-            ]
-            ang_hist, ang_bins = np.histogram(
-                angles, bins=np.arange(1, nbins + 2, 1), density=False,
-            )
-            atom_angles.append(ang_hist)
-            # print("fff",i,ang_hist)
-            if self.verbose:
+        nat = nbor_info["nat"]
+        atoms, angles = bond_angles(nbor_info)
+        keep = (angles >= 1) & (angles <= nbins + 1)
+        atoms, angles = atoms[keep], angles[keep]
+        ind = np.floor(angles - 1).astype("int")
+        ind[ind == nbins] = nbins - 1
+        atom_angles = np.bincount(
+            atoms * nbins + ind, minlength=nat * nbins
+        ).reshape(nat, nbins)
+        if self.verbose:
+            for ang_hist in atom_angles:
                 exact_angles = np.arange(1, nbins + 2, 1)[ang_hist.nonzero()]
                 print("exact_angles", exact_angles)
         # return (atom_angles)#/nbor_info['nat']
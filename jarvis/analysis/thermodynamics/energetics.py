@@ -4,7 +4,7 @@ import os
 import json
 # from jarvis.io.vasp.outputs import Vasprun
 # import glob
-from jarvis.db.figshare import data
+from jarvis.db.figshare import get_jid_data
 from jarvis.core.atoms import Atoms
 
 # OptB88vdW energy per atoms for elements
@@ -60,15 +60,14 @@ def form_enp(atoms=None, total_energy=None):
 
 def get_twod_defect_energy(vrun="", jid="", atom=""):
     """Get mono 2D defect formation energy with OptB88vdW data."""
-    dft2d = data("dft_2d")
 
     def get_enp_jid(jid=""):
-        for i in dft2d:
-            if i["jid"] == jid:
-                return (
-                    i["optb88vdw_total_energy"]
-                    / Atoms.from_dict(i["atoms"]).num_atoms
-                )
+        i = get_jid_data(jid=jid, dataset="dft_2d")
+        if i is not None:
+            return (
+                i["optb88vdw_total_energy"]
+                / Atoms.from_dict(i["atoms"]).num_atoms
+            )
 
         # dir='JVASP-667_C_C_c'
         # tmp=dir.split('_')
@@ -51,8 +51,109 @@ class Spillage(object):
         Q = u[:, :num]
         return Q, num
 
-    def overlap_so_spinpol(self):
-        """Calculate spillage."""
+    def matching_kpoints(self, noso, so, tol=1e-7):
+        """
+        Get indices of k-points shared by the two WAVECARs.
+
+        Only k-points with the same index in both files are compared,
+        so this is a single vectorized comparison instead of a double
+        loop over all k-point pairs.
+
+        Args:
+            noso: Wavecar without spin-orbit coupling
+
+            so: Wavecar with spin-orbit coupling
+
+            tol: absolute tolerance on each k-point component
+
+        Returns:
+              zero-based k-point indices
+        """
+        nk = min(noso._nkpts, so._nkpts)
+        diff = np.abs(so._kvecs[:nk, :] - noso._kvecs[:nk, :])
+        return np.nonzero(np.all(diff < tol, axis=1))[0]
+
+    def occupied_bands(self, occs):
+        """
+        Get the index of the first band with occupation below 50%.
+
+        Args:
+            occs: occupations for one spin channel, k-points x bands
+
+        Returns:
+              number of occupied bands at each k-point
+        """
+        below = occs < 0.5
+        return np.where(below.any(axis=1), below.argmax(axis=1), occs.shape[1])
+
+    def gamma_kpoint(self, noso, so, nk, nelec_up, nelec_dn):
+        """
+        Calculate spillage at a single k-point.
+
+        The overlap of the occupied non-soc and soc subspaces is one
+        matrix product, and its squared Frobenius norm is the number of
+        non band-inverted electrons.
+
+        Args:
+            noso: Wavecar without spin-orbit coupling
+
+            so: Wavecar with spin-orbit coupling
+
+            nk: zero-based k-point index
+
+            nelec_up: occupied spin-up bands in noso
+
+            nelec_dn: occupied spin-down bands in noso
+
+        Returns:
+              gamma_k, eq 4 in prb 90 125133
+        """
+        nelec_tot = nelec_up + nelec_dn
+        # number of plane waves in noso
+        n_noso1 = noso._nplws[nk]
+        # number of plane waves in so
+        n_so = so._nplws[nk]
+        vs = min(n_noso1 * 2, n_so)
+        # Vnono,and so holds wavefunctions
+        Vnoso = np.zeros((vs, nelec_tot), dtype=complex)
+        Vso = np.zeros((vs, nelec_tot), dtype=complex)
+
+        # prepare matricies,
+        # putting the wavefunction coeffients
+        # align so that they have same structure as SOC case
+        # which has both spin and down together
+        # bands x plane waves blocks, one read per spin
+        up = noso.read_bands(1, nk + 1, slice(0, nelec_up))
+        Vnoso[0 : vs // 2, 0:nelec_up] = up[:, 0 : vs // 2].T
+        dn = noso.read_bands(2, nk + 1, slice(0, nelec_dn))
+        Vnoso[vs // 2 : vs, nelec_up:nelec_tot] = dn[:, 0 : vs // 2].T
+
+        t = so.read_bands(1, nk + 1, slice(0, nelec_tot))
+        Vso[0 : vs // 2, :] = t[:, 0 : vs // 2].T
+        Vso[vs // 2 : vs, :] = t[:, n_so // 2 : n_so // 2 + vs // 2].T
+        # make orthonormal basis?
+        # Occupied bands, both up and down
+        # Generally to get wavefunctions, we have
+        # <psi><S><psi*>
+        # But as we do't have S from DFT saved
+        # we orthogalize the wavefunctions hoping
+        # they span the same space
+        Qnoso, num_noso = self.orth(Vnoso)
+        Qso, num_so = self.orth(Vso)
+
+        # Inner products of all nonsoc and soc occupied bands,
+        # which is a delta function of n1 and n2 if SOC is weak
+        M = np.dot(Qnoso[:, :nelec_tot].conj().T, Qso[:, :nelec_tot])
+        Mmn = np.sum(M.real ** 2 + M.imag ** 2)
+        return nelec_tot - Mmn
+
+    def overlap_so_spinpol(self, n_jobs=1):
+        """
+        Calculate spillage.
+
+        Args:
+            n_jobs: number of threads used to process k-points
+        """
         noso = Wavecar(filename=self.wf_noso, lsorbit=False)
         so = Wavecar(filename=self.wf_so, lsorbit=True)
         # band gap stuff. not needed per se, just a useful sanity check
@@ -67,30 +168,11 @@ class Spillage(object):
         # noso._kvecs[nk1 - 1, :]: number of kpoints are rows,
         # number of columns three, kpoint units
 
-        nelec_list = []
-        for nk1 in range(1, noso._nkpts + 1):  # no spin orbit kpoints loop
-            knoso = noso._kvecs[nk1 - 1, :]
-            for nk2 in range(1, so._nkpts + 1):  # spin orbit
-                kso = so._kvecs[nk2 - 1, :]
-                if (
-                    self.isclose(kso[0], knoso[0])
-                    and self.isclose(kso[1], knoso[1])
-                    and self.isclose(kso[2], knoso[2])
-                ):  # do kpoints match?
-                    if nk1 == nk2:
-                        for c, e in enumerate(noso._occs[0, nk1 - 1, :]):
-                            if e < 0.5:
-                                cup = c
-                                break
-                        for c, e in enumerate(noso._occs[1, nk1 - 1, :]):
-                            if e < 0.5:
-                                cdn = c
-                                break
-
-                        nelec_list.append([cup, cdn, cup + cdn])
-                        # total number of occupied bands at k point nk1
-
-        n_arr = np.array(nelec_list)
+        knums = self.matching_kpoints(noso, so)
+        cup = self.occupied_bands(noso._occs[0, knums, :])
+        cdn = self.occupied_bands(noso._occs[1, knums, :])
+        # total number of occupied bands at each k point
+        n_arr = np.column_stack([cup, cdn, cup + cdn])
 
         n_up = int(round(np.mean(n_arr[:, 0])))
         n_dn = int(round(np.mean(n_arr[:, 1])))
@@ -98,154 +180,49 @@ class Spillage(object):
 
         nelec = int(n_tot)
 
-        # noso_homo_up = np.max(noso_bands[0, :, n_up - 1])
-        # noso_lumo_up = np.min(noso_bands[0, :, n_up])
-        # noso_homo_dn = np.max(noso_bands[1, :, n_dn - 1])
-        # noso_lumo_dn = np.min(noso_bands[1, :, n_dn])
-
         so_homo = np.max(so_bands[0, :, nelec - 1])
         so_lumo = np.min(so_bands[0, :, nelec])
 
-        # noso_direct_up = np.min(noso_bands[0, :, n_up] -
-        # noso_bands[0, :, n_up - 1])
-        # noso_direct_dn = np.min(noso_bands[1, :, n_dn] -
-        # noso_bands[1, :, n_dn - 1])
-
         so_direct = np.min(so_bands[0, :, nelec] - so_bands[0, :, nelec - 1])
 
-        noso_direct = 1000000.0
-        noso_homo = -10000000.0
-        noso_lumo = 100000000.0
-        for i in range(noso_bands.shape[1]):
-            homo_k = max(
-                noso_bands[0, i, n_up - 1], noso_bands[1, i, n_dn - 1]
-            )
-            lumo_k = min(noso_bands[0, i, n_up], noso_bands[1, i, n_dn])
-            noso_direct = min(noso_direct, lumo_k - homo_k)
-
-            noso_homo = max(noso_homo, homo_k)
-            noso_lumo = min(noso_lumo, lumo_k)
+        homo_k = np.maximum(
+            noso_bands[0, :, n_up - 1], noso_bands[1, :, n_dn - 1]
+        )
+        lumo_k = np.minimum(noso_bands[0, :, n_up], noso_bands[1, :, n_dn])
+        noso_direct = min(1000000.0, float(np.min(lumo_k - homo_k)))
+        noso_homo = max(-10000000.0, float(np.max(homo_k)))
+        noso_lumo = min(100000000.0, float(np.min(lumo_k)))
 
-        gamma_k = []
-        kpoints = []
         np.set_printoptions(precision=4)
 
-        x = []
-        y = []
-
-        nelec_tot = 0.0
-        for nk1 in range(1, noso._nkpts + 1):  # no spin orbit kpoints loop
-            knoso = noso._kvecs[nk1 - 1, :]
-            for nk2 in range(1, so._nkpts + 1):  # spin orbit
-                kso = so._kvecs[nk2 - 1, :]
-                if (
-                    self.isclose(kso[0], knoso[0])
-                    and self.isclose(kso[1], knoso[1])
-                    and self.isclose(kso[2], knoso[2])
-                ):  # do kpoints match?
-
-                    # changes section 2
-                    if nk1 == nk2:
-                        nelec_up = n_arr[nk1 - 1, 0]
-                        nelec_dn = n_arr[nk1 - 1, 1]
-                        nelec_tot = n_arr[nk1 - 1, 2]
-
-                        gamma_k.append(nelec_tot)
-                        kpoints.append(kso)
-                        Mmn = 0.0
-                        vnoso = noso.readBandCoeff(
-                            ispin=1, ikpt=nk1, iband=1, norm=False
-                        )
-                        # Getting size of matrices
-                        n_noso1 = vnoso.shape[0]
-                        # number of plane waves in noso
-                        vnoso = noso.readBandCoeff(
-                            ispin=2, ikpt=nk1, iband=1, norm=False
-                        )
-                        # spin, kpt, bands, number of plane wave
-                        # n_noso2 = vnoso.shape[0]
-                        vso = so.readBandCoeff(
-                            ispin=1, ikpt=nk2, iband=1, norm=False
-                        )
-                        n_so = vso.shape[0]  # number of plane waves in so
-                        vs = min(n_noso1 * 2, n_so)
-                        # Vnono,and so holds wavefunctions
-                        Vnoso = np.zeros((vs, nelec_tot), dtype=complex)
-                        Vso = np.zeros((vs, nelec_tot), dtype=complex)
-
-                        # prepare matricies,
-                        # putting the wavefunction coeffients
-                        # align so that they have same structure as SOC case
-                        # which has both spin and down together
-
-                        for n1 in range(1, nelec_up + 1):
-                            Vnoso[0 : vs // 2, n1 - 1] = noso.readBandCoeff(
-                                ispin=1, ikpt=nk1, iband=n1, norm=False
-                            )[0 : vs // 2]
-                        for n1 in range(1, nelec_dn + 1):
-                            Vnoso[
-                                vs // 2 : vs, n1 - 1 + nelec_up
-                            ] = noso.readBandCoeff(
-                                ispin=2, ikpt=nk1, iband=n1, norm=False
-                            )[
-                                0 : vs // 2
-                            ]
-
-                        for n1 in range(1, nelec_tot + 1):
-                            t = so.readBandCoeff(
-                                ispin=1, ikpt=nk2, iband=n1, norm=False
-                            )
-                            Vso[0 : vs // 2, n1 - 1] = t[0 : vs // 2]
-                            Vso[vs // 2 : vs, n1 - 1] = t[
-                                n_so // 2 : n_so // 2 + vs // 2
-                            ]
-                        # make orthonormal basis?
-                        # Occupied bands, both up and down
-                        # Generally to get wavefunctions, we have
-                        # <psi><S><psi*>
-                        # But as we do't have S from DFT saved
-                        # we orthogalize the wavefunctions hoping
-                        # they span the same space
-                        Qnoso, num_noso = self.orth(Vnoso)
-
-                        Qso, num_so = self.orth(Vso)
-
-                        # evalute main expression
-
-                        a = []
-                        for n1 in range(0, nelec_tot):  # noso occupied bands
-                            v1 = Qnoso[:, n1]  # number of plane waves, bands
-                            aa = 0.0
-                            # represents the non band-inverted electrons
-                            for n2 in range(0, nelec_tot):  # so occupied bands
-                                v2 = Qso[:, n2]
-                                # Inner product of a nonsoc
-                                # and soc wavefunction
-                                # index n1 and n2
-
-                                # The inner product
-                                # of bands with and without SOC
-                                # will be 1 for trivial bands
-
-                                # Delta function of n1 and n2 if SOC is weak
-
-                                t = np.dot(np.conj(v1), v2)
-                                Mmn += t * t.conj()
-                                aa += (t * t.conj()).real
-                            a.append(aa)
-                        gamma_k[-1] -= Mmn  # eq 4 in prb 90 125133
-                        x.append(kso)
-                        y.append(np.real(gamma_k[-1]))
-                        if gamma_k[-1] > 0.5:
-                            print(
-                                "nk1 nk2 kpoint gamma_k ",
-                                nk1,
-                                nk2,
-                                kso,
-                                knoso,
-                                np.real(gamma_k[-1]),
-                                "!!!!!!!!!!",
-                            )
+        def gamma(i):
+            return self.gamma_kpoint(
+                noso, so, knums[i], int(n_arr[i, 0]), int(n_arr[i, 1])
+            )
+
+        if n_jobs > 1 and len(knums) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            # BLAS and the memory-mapped reads release the GIL
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                gamma_k = list(pool.map(gamma, range(len(knums))))
+        else:
+            gamma_k = [gamma(i) for i in range(len(knums))]
+
+        kpoints = [so._kvecs[nk, :] for nk in knums]
+        x = kpoints
+        y = gamma_k
+        for nk, kso, g in zip(knums, kpoints, gamma_k):
+            if g > 0.5:
+                print(
+                    "nk1 nk2 kpoint gamma_k ",
+                    nk + 1,
+                    nk + 1,
+                    kso,
+                    noso._kvecs[nk, :],
+                    g,
+                    "!!!!!!!!!!",
+                )
 
         gmax = max(np.real(gamma_k))
         nkmax = np.argmax(np.real(gamma_k))
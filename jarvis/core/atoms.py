@@ -1,20 +1,77 @@
 """This module provides classes to specify atomic structure."""
 import numpy as np
 from jarvis.core.composition import Composition
-from jarvis.core.specie import Specie
+from jarvis.core.specie import Specie, element_properties
 from jarvis.core.lattice import Lattice, lattice_coords_transformer
 from collections import OrderedDict
 from jarvis.core.utils import get_counts
 import itertools
+import weakref
 from jarvis.core.utils import get_angle
 
 amu_gm = 1.66054e-24
 ang_cm = 1e-8
 
 
+class _ElementList(list):
+    """List of element symbols that tells its Atoms when it is edited."""
+
+    __slots__ = ("_owner",)
+
+    def __reduce__(self):
+        """Pickle and copy as a plain list."""
+        return list, (list(self),)
+
+
+def _element_edit(name):
+    method = getattr(list, name)
+
+    def edit(self, *args):
+        out = method(self, *args)
+        owner = self._owner()
+        if owner is not None and owner._cache.get("elements") is self:
+            # species are re-derived from this list when next needed
+            owner._cache = {"elements": self, "edited": True}
+        return out
+
+    edit.__name__ = name
+    edit.__doc__ = method.__doc__
+    return edit
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(_ElementList, _name, _element_edit(_name))
+
+
 class Atoms(object):
     """Generate Atoms python object."""
 
+    # elements are stored as indices into the unique symbols, derived
+    # properties are computed on first use and kept in _cache
+    _state = (
+        "_lattice_mat",
+        "_coords",
+        "_cartesian",
+        "_symbols",
+        "_species",
+        "_props",
+        "show_props",
+    )
+    __slots__ = _state + ("_cache", "__weakref__")
+
     def __init__(
         self,
         lattice_mat=None,
@@ -46,7 +103,7 @@ class Atoms(object):
         >>> Si.num_atoms
         2
         >>> Si.frac_coords[0][0]
-        0
+        0.0
         >>> Si.cart_coords[0][0]
         0.0
         >>> coords = [[0, 0, 0], [1.3575 , 1.22175, 1.22175]]
@@ -57,21 +114,141 @@ class Atoms(object):
         >>> Si.pymatgen_converter()!={}
         True
         """
-        self.lattice_mat = np.array(lattice_mat)
+        self._cache = {}
         self.show_props = show_props
-        self.lattice = Lattice(lattice_mat)
-        self.coords = np.array(coords)
-        self.elements = elements
+        self.lattice_mat = lattice_mat
         self.cartesian = cartesian
+        self.coords = coords
+        self.elements = elements
         self.props = props
-        if self.props is None:
-            self.props = ["" for i in range(len(self.elements))]
-        if self.cartesian:
-            self.cart_coords = self.coords
-            self.frac_coords = np.array(self.lattice.frac_coords(self.coords))
-        else:
-            self.frac_coords = self.coords
-            self.cart_coords = np.array(self.lattice.cart_coords(self.coords))
+
+    def __getstate__(self):
+        """Pickle the stored arrays but not the caches."""
+        self._sync_species()
+        return tuple(getattr(self, k) for k in self._state)
+
+    def __setstate__(self, state):
+        """Restore from __getstate__."""
+        for k, v in zip(self._state, state):
+            setattr(self, k, v)
+        self._cache = {}
+
+    def clear_cache(self):
+        """
+        Drop derived properties computed so far.
+
+        Replacing lattice_mat, coords, elements or cartesian, or editing
+        the elements list, clears the cache automatically; call this
+        after editing the lattice_mat or coords arrays in place.
+        """
+        self._sync_species()
+        self._cache.clear()
+
+    def _sync_species(self):
+        if self._cache.pop("edited", False):
+            self._set_species(self._cache["elements"])
+
+    def _cached(self, name, func):
+        try:
+            return self._cache[name]
+        except KeyError:
+            val = self._cache[name] = func()
+            return val
+
+    @property
+    def lattice_mat(self):
+        """Get lattice matrix as a 3x3 float64 array."""
+        return self._lattice_mat
+
+    @lattice_mat.setter
+    def lattice_mat(self, lattice_mat):
+        self._lattice_mat = np.array(lattice_mat, dtype=np.float64)
+        self.clear_cache()
+
+    @property
+    def lattice(self):
+        """Get Lattice object of the lattice matrix."""
+        return self._cached("lattice", lambda: Lattice(self._lattice_mat))
+
+    @property
+    def cartesian(self):
+        """Get whether coords are cartesian or fractional."""
+        return self._cartesian
+
+    @cartesian.setter
+    def cartesian(self, cartesian):
+        self._cartesian = cartesian
+        self.clear_cache()
+
+    @property
+    def coords(self):
+        """Get coordinates as given, see cartesian."""
+        return self._coords
+
+    @coords.setter
+    def coords(self, coords):
+        self._coords = np.array(coords, dtype=np.float64).reshape(-1, 3)
+        self.clear_cache()
+
+    @property
+    def frac_coords(self):
+        """Get fractional coordinates."""
+        if not self._cartesian:
+            return self._coords
+        return self._cached(
+            "frac_coords",
+            lambda: np.array(self.lattice.frac_coords(self._coords)),
+        )
+
+    @property
+    def cart_coords(self):
+        """Get cartesian coordinates."""
+        if self._cartesian:
+            return self._coords
+        return self._cached(
+            "cart_coords",
+            lambda: np.array(self.lattice.cart_coords(self._coords)),
+        )
+
+    @property
+    def elements(self):
+        """Get list of element symbols."""
+        return self._cached("elements", self._element_list)
+
+    def _element_list(self):
+        symbols = np.empty(len(self._symbols), dtype=object)
+        symbols[:] = self._symbols
+        elements = _ElementList(symbols[self._species].tolist())
+        elements._owner = weakref.ref(self)
+        return elements
+
+    @elements.setter
+    def elements(self, elements):
+        self._set_species(elements)
+        self._cache.clear()
+
+    def _set_species(self, elements):
+        index = {}
+        species = np.fromiter(
+            (index.setdefault(el, len(index)) for el in elements),
+            dtype=np.int32,
+            count=len(elements),
+        )
+        if len(index) < 2 ** 15:
+            species = species.astype(np.int16)
+        self._symbols = tuple(index)
+        self._species = species
+
+    @property
+    def props(self):
+        """Get per-atom properties, empty strings by default."""
+        if self._props is None:
+            self._props = ["" for i in range(len(self.elements))]
+        return self._props
+
+    @props.setter
+    def props(self, props):
+        self._props = props
 
     def write_cif(
         self, filename="atoms.cif", comment=None, with_spg_info=True
@@ -528,19 +705,12 @@ class Atoms(object):
 
     def remove_site_by_index(self, site=0):
         """Remove an atom by its index number."""
-        new_els = []
-        new_coords = []
-        new_props = []
-        for ii, i in enumerate(self.frac_coords):
-            if ii != site:
-                new_els.append(self.elements[ii])
-                new_coords.append(self.frac_coords[ii])
-                new_props.append(self.props[ii])
+        keep = np.arange(self.num_atoms) != site
         return Atoms(
             lattice_mat=self.lattice_mat,
-            elements=new_els,
-            coords=np.array(new_coords),
-            props=new_props,
+            elements=[el for el, k in zip(self.elements, keep) if k],
+            coords=self.frac_coords[keep],
+            props=[p for p, k in zip(self.props, keep) if k],
             cartesian=False,
         )
 
@@ -645,52 +815,78 @@ class Atoms(object):
     @property
     def volume(self):
         """Get volume of the atoms object."""
-        m = self.lattice_mat
-        vol = float(abs(np.dot(np.cross(m[0], m[1]), m[2])))
-        return vol
+
+        def volume():
+            m = self._lattice_mat
+            return float(abs(np.dot(np.cross(m[0], m[1]), m[2])))
+
+        return self._cached("volume", volume)
 
     @property
     def composition(self):
         """Get composition of the atoms object."""
-        comp = {}
-        for i in self.elements:
-            comp[i] = comp.setdefault(i, 0) + 1
-        return Composition(OrderedDict(comp))
+
+        def composition():
+            self._sync_species()
+            counts = np.bincount(self._species, minlength=len(self._symbols))
+            content = OrderedDict(zip(self._symbols, counts.tolist()))
+            return Composition(content)
+
+        return self._cached("composition", composition)
 
     @property
     def density(self):
         """Get density in g/cm3 of the atoms object."""
-        den = float(self.composition.weight * amu_gm) / (
-            float(self.volume) * (ang_cm) ** 3
+
+        def density():
+            return float(self.composition.weight * amu_gm) / (
+                float(self.volume) * (ang_cm) ** 3
+            )
+
+        return self._cached("density", density)
+
+    def _species_property(self, key):
+        self._sync_species()
+        table = self._cached(
+            key, lambda: element_properties(self._symbols, [key])[:, 0]
         )
-        return den
+        return table[self._species]
+
+    @property
+    def Z(self):
+        """Get array of atomic numbers, NaN for unknown elements."""
+        return self._species_property("Z")
+
+    @property
+    def mass(self):
+        """Get array of atomic masses."""
+        return self._species_property("atom_mass")
+
+    @property
+    def radius(self):
+        """Get array of atomic radii."""
+        return self._species_property("atom_rad")
 
     @property
     def atomic_numbers(self):
         """Get list of atomic numbers of atoms in the atoms object."""
-        numbers = []
-        for i in self.elements:
-            numbers.append(Specie(i).Z)
-        return numbers
+        return [int(z) if z == z else z for z in self.Z]
 
     @property
     def num_atoms(self):
         """Get number of atoms."""
-        return len(self.coords)
+        return len(self._coords)
 
     @property
     def uniq_species(self):
         """Get unique elements."""
-        uniq = set()
-        return [x for x in self.elements if not (x in uniq or uniq.add(x))]
+        self._sync_species()
+        return list(self._symbols)
 
     def get_center_of_mass(self):
         """Get center of mass of the atoms object."""
         # atomic_mass
-        m = []
-        for i in self.elements:
-            m.append(Specie(i).atomic_mass)
-        m = np.array(m)
+        m = self.mass
         com = np.dot(m, self.cart_coords) / m.sum()
         # com = np.linalg.solve(self.lattice_mat.T, com)
         return com
@@ -781,11 +977,13 @@ class Atoms(object):
     @property
     def packing_fraction(self):
         """Get packing fraction of the atoms object."""
-        total_rad = 0
-        for i in self.elements:
-            total_rad = total_rad + Specie(i).atomic_rad ** 3
-        pf = np.array([4 * np.pi * total_rad / (3 * self.volume)])
-        return round(pf[0], 5)
+
+        def packing_fraction():
+            total_rad = np.sum(self.radius ** 3)
+            pf = np.array([4 * np.pi * total_rad / (3 * self.volume)])
+            return round(pf[0], 5)
+
+        return self._cached("packing_fraction", packing_fraction)
 
     def lattice_points_in_supercell(self, supercell_matrix):
         """
@@ -879,13 +1077,12 @@ class Atoms(object):
         f_lat = self.lattice_points_in_supercell(scale_matrix)
         c_lat = new_lattice.cart_coords(f_lat)
 
-        new_sites = []
-        new_elements = []
-        for site, el in zip(self.cart_coords, self.elements):
-            for v in c_lat:
-                new_elements.append(el)
-                tmp = site + v
-                new_sites.append(tmp)
+        nimg = len(c_lat)
+        new_sites = (
+            np.asarray(self.cart_coords, dtype=float)[:, None, :]
+            + c_lat[None, :, :]
+        ).reshape(-1, 3)
+        new_elements = np.repeat(self.elements, nimg).tolist()
         return Atoms(
             lattice_mat=new_lattice.lattice(),
             elements=new_elements,
@@ -898,41 +1095,16 @@ class Atoms(object):
         dim = np.array(dim)
         if dim.shape == (3, 3):
             dim = np.array([int(np.linalg.norm(v)) for v in dim])
-        coords = self.frac_coords
-        all_symbs = self.elements  # [i.symbol for i in s.species]
-        nat = len(coords)
-
-        new_nat = nat * dim[0] * dim[1] * dim[2]
-        new_coords = np.zeros((new_nat, 3))
-        new_symbs = []  # np.chararray((new_nat))
-        props = []  # self.props
-
-        ct = 0
-        for i in range(nat):
-            for j in range(dim[0]):
-                for k in range(dim[1]):
-                    for m in range(dim[2]):
-                        props.append(self.props[i])
-                        new_coords[ct][0] = (coords[i][0] + j) / float(dim[0])
-                        new_coords[ct][1] = (coords[i][1] + k) / float(dim[1])
-                        new_coords[ct][2] = (coords[i][2] + m) / float(dim[2])
-                        new_symbs.append(all_symbs[i])
-                        ct = ct + 1
-
-        nat = new_nat
-
-        nat = len(coords)  # int(s.composition.num_atoms)
-        lat = np.zeros((3, 3))
-        box = self.lattice_mat
-        lat[0][0] = dim[0] * box[0][0]
-        lat[0][1] = dim[0] * box[0][1]
-        lat[0][2] = dim[0] * box[0][2]
-        lat[1][0] = dim[1] * box[1][0]
-        lat[1][1] = dim[1] * box[1][1]
-        lat[1][2] = dim[1] * box[1][2]
-        lat[2][0] = dim[2] * box[2][0]
-        lat[2][1] = dim[2] * box[2][1]
-        lat[2][2] = dim[2] * box[2][2]
+        coords = np.asarray(self.frac_coords, dtype=float)
+        # images in (j, k, m) loop order, atoms outermost
+        images = np.indices(dim).reshape(3, -1).T
+        nimg = len(images)
+        new_coords = (
+            (coords[:, None, :] + images[None, :, :]) / dim.astype(float)
+        ).reshape(-1, 3)
+        new_symbs = np.repeat(self.elements, nimg).tolist()
+        props = [p for p in self.props for _ in range(nimg)]
+        lat = dim[:, None] * np.asarray(self.lattice_mat, dtype=float)
         super_cell = Atoms(
             lattice_mat=lat,
             coords=new_coords,
@@ -1,10 +1,15 @@
 """Module to generate networkx graphs."""
 from jarvis.core.atoms import get_supercell_dims
-from jarvis.core.specie import Specie
-from jarvis.core.utils import random_colors
+from jarvis.core.specie import Specie, element_index, element_properties
+from jarvis.core.utils import random_colors, as_atoms, parallel_map
 import numpy as np
 from collections import OrderedDict
 from jarvis.analysis.structure.neighbors import NeighborsAnalysis
+from jarvis.analysis.structure.neighbors import periodic_neighbors
+import itertools
+import functools
+import json
+import os
 
 
 class Graph(object):
@@ -18,6 +23,7 @@ class Graph(object):
         edge_attributes=[],
         color_map=None,
         labels=None,
+        edge_vectors=None,
     ):
         """
         Initialize the graph object.
@@ -32,6 +38,8 @@ class Graph(object):
 
             edge_attributes: attributes for each connectivity.
                              as simple as euclidean distances.
+
+            edge_vectors: cartesian vector of each edge, sparse graphs.
         """
         self.nodes = nodes
         self.node_attributes = node_attributes
@@ -39,6 +47,7 @@ class Graph(object):
         self.edge_attributes = edge_attributes
         self.color_map = color_map
         self.labels = labels
+        self.edge_vectors = edge_vectors
 
     @staticmethod
     def from_atoms(
@@ -55,6 +64,9 @@ class Graph(object):
         max_cut=5.0,
         verbose=False,
         make_colormap=True,
+        sparse=False,
+        cutoff=8.0,
+        max_neighbors=12,
     ):
         """
         Get Networkx graph. Requires Networkx installation.
@@ -73,21 +85,28 @@ class Graph(object):
                        See: jarvis/core/specie.py
 
              enforce_c_size: minimum size of the simulation cell in Angst.
+
+             sparse: only link atoms within cutoff over all periodic
+                     images, keeping max_neighbors nearest per atom,
+                     instead of all pairs of a supercell. Edges are
+                     (source, destination) index arrays with the
+                     distances as edge_attributes and the cartesian
+                     vectors as edge_vectors.
         """
         if get_prim:
             atoms = atoms.get_primitive_atoms
-        dim = get_supercell_dims(atoms=atoms, enforce_c_size=enforce_c_size)
-        atoms = atoms.make_supercell(dim)
-        raw_data = np.array(atoms.raw_distance_matrix)
-        adj = variance * np.exp(-raw_data / lengthscale)
-        if zero_diag:
-            np.fill_diagonal(adj, 0.0)
+        if not sparse:
+            dim = get_supercell_dims(
+                atoms=atoms, enforce_c_size=enforce_c_size
+            )
+            atoms = atoms.make_supercell(dim)
+            raw_data = np.array(atoms.raw_distance_matrix)
+            adj = variance * np.exp(-raw_data / lengthscale)
+            if zero_diag:
+                np.fill_diagonal(adj, 0.0)
         nodes = np.arange(atoms.num_atoms)
         if features == "atomic_number":
-            node_attributes = np.array(
-                [[np.array(Specie(i).Z)] for i in atoms.elements],
-                dtype="float",
-            )
+            node_attributes = element_properties(atoms.elements, ["Z"])
         elif features == "basic":
             feats = [
                 "Z",
@@ -102,26 +121,11 @@ class Graph(object):
                 "first_ion_en",
                 "elec_aff",
             ]
-            node_attributes = []
-            for i in atoms.elements:
-                tmp = []
-                for j in feats:
-                    tmp.append(Specie(i).element_property(j))
-                node_attributes.append(tmp)
-            node_attributes = np.array(node_attributes, dtype="float")
+            node_attributes = element_properties(atoms.elements, feats)
         elif features == "cfid":
-            node_attributes = np.array(
-                [np.array(Specie(i).get_descrp_arr) for i in atoms.elements],
-                dtype="float",
-            )
+            node_attributes = Specie.table[element_index(atoms.elements)]
         elif isinstance(features, list):
-            node_attributes = []
-            for i in atoms.elements:
-                tmp = []
-                for j in features:
-                    tmp.append(Specie(i).element_property(j))
-                node_attributes.append(tmp)
-            node_attributes = np.array(node_attributes, dtype="float")
+            node_attributes = element_properties(atoms.elements, features)
         else:
             raise ("Please check the input options.")
         if node_atomwise_rdf or node_atomwise_angle_dist:
@@ -138,13 +142,17 @@ class Graph(object):
                 (node_attributes, nbr.atomwise_angle_dist()), axis=1
             )
             node_attributes = np.array(node_attributes, dtype="float")
-        uv = []
-        edge_features = []
-        for ii, i in enumerate(atoms.elements):
-            for jj, j in enumerate(atoms.elements):
-                uv.append((ii, jj))
-                edge_features.append(adj[ii, jj])
-        edge_attributes = edge_features
+        edge_vectors = None
+        if sparse:
+            i, j, images, edge_vectors, dd = periodic_neighbors(
+                atoms.frac_coords, atoms.lattice_mat, cutoff, max_neighbors
+            )
+            uv = np.stack([i, j], axis=1)
+            edge_attributes = dd
+        else:
+            uv = list(itertools.product(range(atoms.num_atoms), repeat=2))
+            edge_attributes = adj.ravel()
+        color_map = None
         if make_colormap:
             sps = atoms.uniq_species
             color_dict = random_colors(number_of_colors=len(sps))
@@ -160,6 +168,7 @@ class Graph(object):
             node_attributes=np.array(node_attributes),
             edge_attributes=np.array(edge_attributes),
             color_map=color_map,
+            edge_vectors=edge_vectors,
         )
 
     def to_networkx(self):
@@ -193,6 +202,7 @@ class Graph(object):
             edge_attributes=d["edge_attributes"],
             color_map=d["color_map"],
             labels=d["labels"],
+            edge_vectors=d.get("edge_vectors"),
         )
 
     def to_dict(self):
@@ -204,6 +214,8 @@ class Graph(object):
         info["edge_attributes"] = np.array(self.edge_attributes).tolist()
         info["color_map"] = np.array(self.color_map).tolist()
         info["labels"] = np.array(self.labels).tolist()
+        if self.edge_vectors is not None:
+            info["edge_vectors"] = np.array(self.edge_vectors).tolist()
         return info
 
     def __repr__(self):
@@ -212,10 +224,178 @@ class Graph(object):
 
     @property
     def adjacency_matrix(self):
-        """Provide adjacency_matrix of graph."""
-        return np.array(self.edge_attributes).reshape(
-            self.num_nodes, self.num_nodes
+        """
+        Provide adjacency_matrix of graph.
+
+        For dense graphs this is the variance * exp(-d / lengthscale)
+        matrix of from_atoms. For sparse graphs entry (i, j) is the
+        number of edges from i to j, i.e. how many periodic images of
+        atom j are among the neighbors of atom i.
+        """
+        if self.edge_vectors is None:
+            return np.array(self.edge_attributes).reshape(
+                self.num_nodes, self.num_nodes
+            )
+        adj = np.zeros((self.num_nodes, self.num_nodes))
+        edges = np.array(self.edges, dtype="int").reshape(-1, 2)
+        np.add.at(adj, (edges[:, 0], edges[:, 1]), 1)
+        return adj
+
+
+graph_array_names = [
+    "node_attributes",
+    "node_ptr",
+    "edges",
+    "edge_attributes",
+    "edge_vectors",
+    "edge_ptr",
+]
+
+
+def _graph_arrays(item, kwargs={}):
+    """Get flat float32/int arrays of one sparse graph (pool worker)."""
+    g = Graph.from_atoms(
+        as_atoms(item), sparse=True, make_colormap=False, **kwargs
+    )
+    return (
+        np.array(g.node_attributes, dtype=np.float32).reshape(
+            g.num_nodes, -1
+        ),
+        np.array(g.edges, dtype=np.int32).reshape(-1, 2),
+        np.array(g.edge_attributes, dtype=np.float32),
+        np.array(g.edge_vectors, dtype=np.float32).reshape(-1, 3),
+    )
+
+
+def _write_shard(prefix, graphs):
+    """Concatenate graphs and save them with their offset pointers."""
+    nn = [len(g[0]) for g in graphs]
+    ne = [len(g[1]) for g in graphs]
+    arrays = {
+        "node_attributes": np.concatenate([g[0] for g in graphs]),
+        "node_ptr": np.concatenate([[0], np.cumsum(nn)]).astype(np.int64),
+        "edges": np.concatenate([g[1] for g in graphs]),
+        "edge_attributes": np.concatenate([g[2] for g in graphs]),
+        "edge_vectors": np.concatenate([g[3] for g in graphs]),
+        "edge_ptr": np.concatenate([[0], np.cumsum(ne)]).astype(np.int64),
+    }
+    for name in graph_array_names:
+        np.save("%s-%s.npy" % (prefix, name), arrays[name])
+
+
+def export_graphs(
+    dataset=[],
+    prefix="graphs",
+    shard_size=10000,
+    n_jobs=1,
+    chunksize=16,
+    **kwargs
+):
+    """
+    Write sparse graphs of many structures as flat arrays in shards.
+
+    Each shard stores, as <prefix>-<shard>-<name>.npy, the node
+    features, edges (node indices local to their graph), edge distances
+    and edge vectors of all its graphs concatenated, and node_ptr and
+    edge_ptr offsets so graph k owns rows ptr[k]:ptr[k + 1]. The shards
+    of this export are listed in <prefix>-shards.json, so files left
+    over from an earlier export or another prefix are never read.
+
+    Args:
+
+        dataset: list of jarvis.core.atoms.Atoms, or of dicts with an
+        "atoms" entry such as jarvis.db.figshare.data("dft_3d")
+
+        prefix: path prefix of the shard files
+
+        shard_size: graphs per shard
+
+        n_jobs: number of worker processes, -1 for all CPUs
+
+        chunksize: structures sent to a worker at a time
+
+        kwargs: options passed to Graph.from_atoms, e.g. cutoff
+
+    Returns:
+          list of shard prefixes
+    """
+    func = functools.partial(_graph_arrays, kwargs=kwargs)
+    shards = []
+    graphs = []
+    for g in parallel_map(func, dataset, n_jobs, chunksize):
+        graphs.append(g)
+        if len(graphs) == shard_size:
+            shards.append("%s-%05d" % (prefix, len(shards)))
+            _write_shard(shards[-1], graphs)
+            graphs = []
+    if graphs:
+        shards.append("%s-%05d" % (prefix, len(shards)))
+        _write_shard(shards[-1], graphs)
+    # Written last: a partial export has no manifest to be read from
+    with open(prefix + "-shards.json", "w") as f:
+        json.dump([os.path.basename(shard) for shard in shards], f)
+    return shards
+
+
+class GraphDataset(object):
+    """Random access to graphs written by export_graphs."""
+
+    def __init__(self, prefix="graphs"):
+        """Memory-map the shards listed by export_graphs for a prefix."""
+        with open(prefix + "-shards.json", "r") as f:
+            names = json.load(f)
+        self.shards = []
+        for name in names:
+            shard = os.path.join(os.path.dirname(prefix), name)
+            self.shards.append(
+                {
+                    name: np.load("%s-%s.npy" % (shard, name), mmap_mode="r")
+                    for name in graph_array_names
+                }
+            )
+        counts = [len(s["node_ptr"]) - 1 for s in self.shards]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+
+    def __len__(self):
+        """Get the number of graphs."""
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index):
+        """Get a graph as a dictionary of arrays."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Graph index out of range", index)
+        k = np.searchsorted(self.offsets, index, side="right") - 1
+        s = self.shards[k]
+        i = index - self.offsets[k]
+        n0, n1 = s["node_ptr"][i], s["node_ptr"][i + 1]
+        e0, e1 = s["edge_ptr"][i], s["edge_ptr"][i + 1]
+        return {
+            "node_attributes": np.array(s["node_attributes"][n0:n1]),
+            "edges": np.array(s["edges"][e0:e1]),
+            "edge_attributes": np.array(s["edge_attributes"][e0:e1]),
+            "edge_vectors": np.array(s["edge_vectors"][e0:e1]),
+        }
+
+    def batch(self, indices=[]):
+        """
+        Get several graphs merged into one disconnected graph.
+
+        Edges are shifted to the merged node numbering and graph_index
+        gives the position in indices of the graph owning each node.
+        """
+        graphs = [self[i] for i in indices]
+        nn = np.array([len(g["node_attributes"]) for g in graphs], dtype=int)
+        shift = np.cumsum(nn) - nn
+        out = {}
+        for name in ["node_attributes", "edge_attributes", "edge_vectors"]:
+            out[name] = np.concatenate([g[name] for g in graphs])
+        out["edges"] = np.concatenate(
+            [g["edges"] + d for g, d in zip(graphs, shift)]
         )
+        out["graph_index"] = np.repeat(np.arange(len(graphs)), nn)
+        return out
 
 
 """
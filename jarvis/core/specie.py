@@ -3,18 +3,137 @@
 import os
 import json
 import numpy as np
+from collections.abc import Mapping
+
+
+class _LazyJSON(Mapping):
+    """Read-only mapping that loads a json file on first access."""
+
+    def __init__(self, filename=""):
+        self._filename = filename
+        self._data = None
+
+    @property
+    def data(self):
+        """Get the loaded dictionary."""
+        if self._data is None:
+            with open(self._filename, "r") as f:
+                self._data = json.load(f)
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
 
 el_chem_json_file = str(os.path.join(
                         os.path.dirname(__file__), "Elements.json"))
-el_chem_json = open(el_chem_json_file, "r")
-chem_data = json.load(el_chem_json)
-el_chem_json.close()
+chem_data = _LazyJSON(el_chem_json_file)
 
 el_chrg_json_file = str(os.path.join(
                         os.path.dirname(__file__), "element_charge.json"))
-el_chrg_json = open(el_chrg_json_file, "r")
-chrg_data = json.load(el_chrg_json)
-el_chrg_json.close()
+chrg_data = _LazyJSON(el_chrg_json_file)
+
+
+_element_tables = {}
+
+
+def get_element_tables():
+    """
+    Get element data as NumPy tables, built once on first use.
+
+    The last row of every table is NaN and is used for unknown symbols.
+
+    Returns:
+        dictionary with
+
+        symbols: element symbols, in table row order
+
+        index: element symbol -> table row
+
+        keys: property names, the columns of props
+
+        props: (n_elements + 1) x 438 properties in the order of keys
+
+        descrp: (n_elements + 1) x 438 descriptors as in get_descrp_arr
+
+        chg: (n_elements + 1) x 378 charge descriptors
+    """
+    if not _element_tables:
+        symbols = list(chem_data.keys())
+        keys = list(chem_data[symbols[0]].keys())
+        nan_row = [np.nan] * len(keys)
+        props = [[chem_data[el][k] for k in keys] for el in symbols]
+        descrp = [list(chem_data[el].values()) for el in symbols]
+        nchg = len(next(iter(chrg_data.values()))[0][1])
+        chg = [
+            chrg_data[el][0][1] if el in chrg_data else [np.nan] * nchg
+            for el in symbols
+        ]
+        _element_tables["symbols"] = symbols
+        _element_tables["index"] = {el: i for i, el in enumerate(symbols)}
+        _element_tables["keys"] = keys
+        _element_tables["props"] = np.array(props + [nan_row]).astype(float)
+        _element_tables["descrp"] = np.array(descrp + [nan_row]).astype(float)
+        _element_tables["chg"] = np.array(chg + [[np.nan] * nchg], dtype=float)
+    return _element_tables
+
+
+def element_index(symbols=[]):
+    """
+    Get table rows for a list of element symbols.
+
+    Unknown symbols point to the last (NaN) row.
+
+    >>> element_index(["Al", "Al", "asdfg"]).tolist() == [
+    ...     get_element_tables()["index"]["Al"]] * 2 + [
+    ...     len(get_element_tables()["symbols"])]
+    True
+    """
+    tables = get_element_tables()
+    index = tables["index"]
+    unknown = len(tables["symbols"])
+    return np.array([index.get(el, unknown) for el in symbols], dtype=int)
+
+
+def element_properties(symbols=[], keys=["Z"]):
+    """
+    Get element properties for many atoms with one gather.
+
+    Args:
+
+        symbols: element symbol of each atom
+
+        keys: property names, see Specie.element_property
+
+    Returns:
+          len(symbols) x len(keys) array, NaN for unknown symbols or keys
+
+    >>> element_properties(["Al", "O"], ["Z", "atom_mass"]).round(2).tolist()
+    [[13.0, 26.98], [8.0, 16.0]]
+    """
+    tables = get_element_tables()
+    cols = {k: i for i, k in enumerate(tables["keys"])}
+    props = tables["props"]
+    nan_col = np.full((len(props), 1), np.nan)
+    table = np.concatenate((props, nan_col), axis=1)
+    ind = [cols.get(k, len(tables["keys"])) for k in keys]
+    return table[element_index(symbols)][:, ind]
+
+
+class _ElementTable(object):
+    """Class attribute giving one of the element tables."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        return get_element_tables()[self.name]
 
 
 def get_descrp_arr_name(elm="Al"):
@@ -62,9 +181,17 @@ class Specie(object):
     >>> el = Specie('asdfg')
     >>> el.element_property("asdfg")
     nan
+    >>> Specie.table.shape == (len(Specie.index) + 1, 438)
+    True
 
     """
 
+    # Descriptor and charge tables, one row per element, see
+    # get_element_tables; gather many atoms with Specie.table[rows]
+    table = _ElementTable("descrp")
+    chg_table = _ElementTable("chg")
+    index = _ElementTable("index")
+
     def __init__(self, symbol=""):
         """Initialize with periodic table element."""
         self.symbol = symbol
@@ -94,13 +221,9 @@ class Specie(object):
         Returns:
              arr: array value
         """
-        arr = []
-
-        # try:
-        arr = chrg_data[self.symbol][0][1]
-        # except:
-        #    pass
-        return arr
+        if self.symbol not in chrg_data:
+            raise KeyError(self.symbol)
+        return self.chg_table[self.index[self.symbol]].copy()
 
     @property
     def get_descrp_arr(self):
@@ -116,14 +239,7 @@ class Specie(object):
         Returns:
              arr: array value
         """
-        arr = []
-
-        d = chem_data[self.symbol]
-        arr = []
-        for k, v in d.items():
-            arr.append(v)
-        arr = np.array(arr).astype(float)
-        return arr
+        return self.table[self.index[self.symbol]].copy()
 
     @property
     def atomic_rad(self):
@@ -5,11 +5,14 @@ from collections import defaultdict
 import random
 import numpy as np
 import math
-import xmltodict
+import os
+from multiprocessing import Pool
 
 
 def xml_to_dict(fname):
     """Parse XML file."""
+    import xmltodict
+
     with open(fname, "r") as f:
         data = xmltodict.parse(f.read())
     return data
@@ -169,6 +172,49 @@ def update_dict(main={}, extra={}):
     return tmp
 
 
+def as_atoms(item):
+    """Get Atoms from an Atoms object or a dataset entry with "atoms"."""
+    if isinstance(item, dict):
+        # Imported here, jarvis.core.atoms itself imports this module
+        from jarvis.core.atoms import Atoms
+
+        return Atoms.from_dict(item["atoms"])
+    return item
+
+
+def parallel_map(func, iterable=[], n_jobs=1, chunksize=16):
+    """
+    Apply a function to every item, in order, in worker processes.
+
+    Args:
+
+        func: picklable function of one item, e.g. a module level
+        function wrapped in functools.partial
+
+        iterable: items, consumed lazily
+
+        n_jobs: number of worker processes, -1 for all CPUs
+
+        chunksize: items sent to a worker at a time
+
+    Returns:
+          generator of results; the workers are stopped once it is
+          exhausted or closed
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+    pool = Pool(n_jobs)
+    try:
+        for result in pool.imap(func, iterable, chunksize=chunksize):
+            yield result
+    finally:
+        pool.terminate()
+
+
 # def is_xml_valid(xsd="jarvisdft.xsd", xml="JVASP-1002.xml"):
 #    """Check if XML is valid."""
 #    xml_file = etree.parse(xml)
@@ -8,8 +8,10 @@ import zipfile
 # import tempfile
 import os
 # import io
+import json
+import sqlite3
 import requests
-from jarvis.db.jsonutils import loadjson
+from jarvis.db.jsonutils import loadjson, iterjson
 
 
 def datasets(dataset=""):
@@ -55,18 +57,9 @@ def datasets(dataset=""):
     return url, js_tag
 
 
-def data(dataset="dft_2d"):
-    """Provide main function to download datasets."""
+def download(dataset="dft_2d"):
+    """Get the path of a dataset json, downloading it if needed."""
     url, js_tag = datasets(dataset)
-
-    # r = requests.get(url)
-    # z = zipfile.ZipFile(io.BytesIO(r.content))
-    # wdat = z.read(js_tag).decode("utf-8")
-    # fd, path = tempfile.mkstemp()
-    # with os.fdopen(fd, "w") as tmp:
-    #    tmp.write(wdat)
-    # data = loadjson(path)
-
     path = str(os.path.join(os.path.dirname(__file__), js_tag))
     if not os.path.isfile(path):
         zfile = str(os.path.join(os.path.dirname(__file__), "tmp.zip"))
@@ -79,16 +72,230 @@ def data(dataset="dft_2d"):
             # zipObj.extract(path)
             zipObj.extractall(os.path.join(os.path.dirname(__file__)))
         os.remove(zfile)
+    return path
+
+
+def data(dataset="dft_2d", columns=None):
+    """
+    Provide main function to download datasets.
+
+    With columns, e.g. ["jid", "desc"], only those entries are read
+    from the local SQLite store instead of loading the whole json.
+    """
+    if columns is not None:
+        return store_columns(local_store(dataset), columns=columns)
+
+    # r = requests.get(url)
+    # z = zipfile.ZipFile(io.BytesIO(r.content))
+    # wdat = z.read(js_tag).decode("utf-8")
+    # fd, path = tempfile.mkstemp()
+    # with os.fdopen(fd, "w") as tmp:
+    #    tmp.write(wdat)
+    # data = loadjson(path)
+
+    path = download(dataset)
     data = loadjson(path)
     return data
 
 
 def get_jid_data(jid="JVASP-667", dataset="dft_2d"):
     """Get info for a jid and dataset."""
-    d = data(dataset)
-    for i in d:
-        if i["jid"] == jid:
-            return i
+    return store_lookup(local_store(dataset), jid=jid)
+
+
+# scalar entries that get an index in the store when present
+store_index_keys = [
+    "jid",
+    "formula",
+    "spg_number",
+    "formation_energy_peratom",
+    "optb88vdw_bandgap",
+    "mbj_bandgap",
+    "ehull",
+]
+
+
+# hidden store column noting missing entries and NaN values of a row
+_special_column = "__special__"
+
+
+def local_store(dataset="dft_2d"):
+    """
+    Get the SQLite copy of a dataset.
+
+    The store is rebuilt from the json whenever the json mtime or size
+    differ from those the store was made from.
+    """
+    path = download(dataset)
+    filename = os.path.splitext(path)[0] + ".sqlite"
+    if store_source(filename) != _source_key(path):
+        make_store(_JsonRecords(path), filename, source=path)
+    return filename
+
+
+def _source_key(path=""):
+    """Get mtime and size of a file."""
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+
+def store_source(filename=""):
+    """Get mtime and size of the json a store was made from, if known."""
+    if not os.path.isfile(filename):
+        return None
+    conn = sqlite3.connect(filename)
+    try:
+        info = dict(conn.execute("SELECT name, value FROM info"))
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+    if "source_mtime" in info and "source_size" in info:
+        return [info["source_mtime"], info["source_size"]]
+
+
+class _JsonRecords(object):
+    """Stream the entries of a json list, once per iteration."""
+
+    def __init__(self, filename=""):
+        self.filename = filename
+
+    def __iter__(self):
+        return iterjson(self.filename)
+
+
+def _quote(name=""):
+    """Quote a column name for SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def make_store(records=[], filename="", source=None):
+    """
+    Write records to an SQLite file with one column per entry.
+
+    records can be any iterable that can be looped over twice, the
+    first pass only collects the entry names.
+
+    Scalar entries are stored as they are and listed first, lists and
+    dicts are stored as json text at the end of the row. Reading a few
+    scalar columns so never touches the large desc or atoms entries.
+
+    Missing entries and NaN values are NULL in SQL, a hidden column
+    records which they were so that store_columns returns the records
+    as they were. source is the json file the records come from, its
+    mtime and size are kept for local_store.
+    """
+    keys = {}
+    for rec in records:
+        for k, v in rec.items():
+            scalar = v is None or isinstance(v, (str, int, float))
+            scalar = scalar and not isinstance(v, bool)
+            keys[k] = keys.get(k, True) and scalar
+    cols = [k for k in keys if keys[k]] + [k for k in keys if not keys[k]]
+
+    tmp = filename + ".%d.tmp" % os.getpid()
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("CREATE TABLE columns (name TEXT, is_json INTEGER)")
+        conn.executemany(
+            "INSERT INTO columns VALUES (?, ?)",
+            [(k, int(not keys[k])) for k in cols],
+        )
+        conn.execute("CREATE TABLE info (name TEXT, value)")
+        if source is not None:
+            mtime, size = _source_key(source)
+            conn.executemany(
+                "INSERT INTO info VALUES (?, ?)",
+                [("source_mtime", mtime), ("source_size", size)],
+            )
+        conn.execute(
+            "CREATE TABLE data (%s)"
+            % ", ".join(_quote(k) for k in cols + [_special_column])
+        )
+
+        def row(rec):
+            special = {}
+            out = []
+            for k in cols:
+                v = rec.get(k)
+                if k not in rec:
+                    special[k] = "missing"
+                elif isinstance(v, float) and v != v:
+                    special[k] = "nan"
+                out.append(v if keys[k] else json.dumps(v))
+            out.append(json.dumps(special) if special else None)
+            return out
+
+        conn.executemany(
+            "INSERT INTO data VALUES (%s)"
+            % ", ".join("?" * (len(cols) + 1)),
+            (row(rec) for rec in records),
+        )
+        for k in store_index_keys:
+            if keys.get(k):
+                conn.execute(
+                    "CREATE INDEX %s ON data (%s)"
+                    % (_quote("idx_" + k), _quote(k))
+                )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, filename)
+
+
+def store_columns(filename="", columns=None, where=None, params=()):
+    """
+    Read entries from a store made by make_store.
+
+    Args:
+
+        filename: SQLite file
+
+        columns: entries to read, all when None
+
+        where: optional SQL condition, e.g. '"jid" = ?', note that
+        text such as "na" compares greater than any number and that
+        missing entries and NaN values are NULL
+
+        params: values for the ? in where
+
+    Returns:
+          list of dictionaries
+    """
+    conn = sqlite3.connect(filename)
+    try:
+        is_json = dict(conn.execute("SELECT name, is_json FROM columns"))
+        columns = list(is_json) if columns is None else list(columns)
+        query = "SELECT %s FROM data" % ", ".join(
+            _quote(k) for k in columns + [_special_column]
+        )
+        if where is not None:
+            query += " WHERE " + where
+        out = []
+        for row in conn.execute(query, params):
+            special = json.loads(row[-1]) if row[-1] is not None else {}
+            rec = {}
+            for k, v in zip(columns, row):
+                kind = special.get(k)
+                if kind == "missing":
+                    continue
+                if kind == "nan":
+                    rec[k] = float("nan")
+                else:
+                    rec[k] = json.loads(v) if is_json[k] else v
+            out.append(rec)
+    finally:
+        conn.close()
+    return out
+
+
+def store_lookup(filename="", jid="JVASP-667", columns=None):
+    """Get the entry of a jid from a store with an index lookup."""
+    rows = store_columns(
+        filename, columns=columns, where='"jid" = ?', params=(jid,)
+    )
+    if rows:
+        return rows[0]
 
 
 def get_ff_eneleast():
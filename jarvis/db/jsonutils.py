@@ -1,6 +1,10 @@
 """Helper functions for JSON files."""
 
 import json
+import re
+import numpy as np
+
+_list_sep = re.compile(r"\s*[,\]]")
 
 
 def loadjson(filename=""):
@@ -11,6 +15,146 @@ def loadjson(filename=""):
     return d
 
 
+def iterjson(filename="", chunk_size=1 << 20):
+    """
+    Iterate over the entries of a json list one at a time.
+
+    The file is read in chunks of chunk_size characters, so only the
+    current entry is held in memory, not the whole list.
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, "r") as f:
+        buf = f.read(chunk_size)
+        pos = len(buf) - len(buf.lstrip())
+        if buf[pos : pos + 1] != "[":
+            raise ValueError("Not a json list", filename)
+        pos += 1
+        eof = False
+        while True:
+            # skip separators, refilling the buffer when it runs out
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf = f.read(chunk_size)
+                pos = 0
+                eof = not buf
+            if pos >= len(buf):
+                raise ValueError("Unterminated json list", filename)
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # a number may continue past the end of the buffer
+                complete = eof or _list_sep.match(buf, end) is not None
+            except ValueError:
+                if eof:
+                    raise
+                complete = False
+            if complete:
+                yield value
+                pos = end
+            else:
+                # read at least as much again, so long entries cost
+                # a linear number of retries
+                more = f.read(max(chunk_size, len(buf) - pos))
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+
+
+def iterjson_chunks(
+    filename="",
+    array_key="desc",
+    keys=None,
+    chunk_size=10000,
+    dtype=np.float32,
+    width=None,
+):
+    """
+    Iterate over a json list in chunks, packing one entry as an array.
+
+    Args:
+
+        filename: json file with a list of dictionaries
+
+        array_key: list-valued entry packed into the array, e.g. "desc"
+
+        keys: other entries to keep, all when None
+
+        chunk_size: number of records per chunk
+
+        dtype: array data type
+
+        width: length of array_key, that of the first list when None;
+        chunks before the first list are held back until it is found,
+        and have zero columns if there is no list at all
+
+    Returns:
+          generator of (X, records), X is a chunk_size x width array of
+          array_key with NaN rows where it is missing or of another
+          length, records are the other entries
+    """
+    return pack_chunks(
+        iterjson(filename),
+        array_key=array_key,
+        keys=keys,
+        chunk_size=chunk_size,
+        dtype=dtype,
+        width=width,
+    )
+
+
+def pack_chunks(
+    records=[],
+    array_key="desc",
+    keys=None,
+    chunk_size=10000,
+    dtype=np.float32,
+    width=None,
+):
+    """Group records in chunks as in iterjson_chunks, records unchanged."""
+    rows = []
+    chunk = []
+    # chunks seen before the width is known wait here, so that every
+    # chunk has the same number of columns
+    pending = []
+
+    def pack(rows):
+        X = np.full((len(rows), width or 0), np.nan, dtype=dtype)
+        for i, row in enumerate(rows):
+            if row is not None:
+                X[i] = row
+        return X
+
+    for rec in records:
+        arr = rec.get(array_key)
+        if keys is None:
+            rec = {k: v for k, v in rec.items() if k != array_key}
+        else:
+            rec = {k: rec[k] for k in keys if k in rec}
+        if isinstance(arr, list) and width is None:
+            width = len(arr)
+        if isinstance(arr, list) and len(arr) == width:
+            rows.append(np.array(arr, dtype=dtype))
+        else:
+            rows.append(None)
+        chunk.append(rec)
+        if len(chunk) == chunk_size:
+            pending.append((rows, chunk))
+            rows = []
+            chunk = []
+        if width is not None:
+            for r, c in pending:
+                yield pack(r), c
+            pending = []
+    if chunk:
+        pending.append((rows, chunk))
+    for r, c in pending:
+        yield pack(r), c
+
+
 def dumpjson(data=[], filename=""):
     """Provide helper function to write a json file."""
     f = open(filename, "w")
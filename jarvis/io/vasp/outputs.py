@@ -1,24 +1,36 @@
 """Modulet for analzing VASP outputs."""
 
-from scipy.constants import physical_constants
-from scipy.constants import speed_of_light
 from jarvis.core.atoms import Atoms
+import os
+import json
 import numpy as np
 from collections import OrderedDict
 from jarvis.core.specie import Specie
-import xmltodict
 from jarvis.core.kpoints import Kpoints3D as Kpoints
 from jarvis.io.vasp.inputs import Poscar
-from matplotlib import pyplot as plt
 from jarvis.core.utils import rec_dict
 from jarvis.core.utils import recast_array_on_uniq_array_elements
-import scipy.signal as ss
 
 RYTOEV = 13.605826
 AUTOA = 0.529177249
 TPI = 2 * np.pi
 HSQDTM = RYTOEV * AUTOA * AUTOA
-plt.switch_backend("agg")
+step_fields = {
+    "structure": "structures",
+    "forces": "forces",
+    "stress": "stresses",
+    "energy": "energies",
+}
+
+
+def _pyplot():
+    """Import pyplot on first use, switching to the agg backend once."""
+    import matplotlib.pyplot as plt
+
+    if not getattr(_pyplot, "switched", False):
+        plt.switch_backend("agg")
+        _pyplot.switched = True
+    return plt
 
 
 class Chgcar(object):
@@ -34,6 +46,7 @@ class Chgcar(object):
         augdiff=None,
         dim=None,
         nsets=1,
+        cache=False,
     ):
         """
         Contain CHGCAR data.
@@ -54,6 +67,9 @@ class Chgcar(object):
            augdiff: augmentation difference
 
            nsets: number of CHG sets.
+
+           cache: save the parsed grids next to the file as .npy and
+           reuse them, memory-mapped read-only, while the file is unchanged
         """
         self.filename = filename
         self.atoms = atoms
@@ -63,6 +79,7 @@ class Chgcar(object):
         self.aug = aug
         self.augdiff = augdiff
         self.nsets = nsets
+        self.cache = cache
         if self.atoms is None:
             self.read_file()
 
@@ -115,52 +132,67 @@ class Chgcar(object):
         else:
             return False
 
+    def read_header(self):
+        """Read structure and grid dimensions, return the grid line."""
+        head = []
+        with open(self.filename, "r") as f:
+            for line in f:
+                head.append(line.rstrip("\n"))
+                if len(head) == 7:
+                    natoms = sum([int(i) for i in head[6].split()])
+                if len(head) > 7 and len(head) == natoms + 10:
+                    break
+        self.atoms = Poscar.from_string("\n".join(head)).atoms
+        ng_line = head[-1]
+        self.dim = np.array([int(j) for j in ng_line.split()])
+        return ng_line
+
     def read_file(self):
         """Read CHGCAR."""
-        f = open(self.filename, "r")
-        lines = f.read()
-        f.close()
-        self.atoms = Poscar.from_string(lines).atoms
+        ng_line = self.read_header()
+        sidecar = self.filename + ".npy"
+        if (
+            self.cache
+            and os.path.isfile(sidecar)
+            and os.path.isfile(sidecar + ".json")
+        ):
+            mtime = os.path.getmtime(self.filename)
+            if os.path.getmtime(sidecar + ".json") >= mtime:
+                with open(sidecar + ".json", "r") as f:
+                    self.nsets = json.load(f)["nsets"]
+                self.chg = np.load(sidecar, mmap_mode="r")
+                return
+        with open(self.filename, "r") as f:
+            text = f.read()
         volume = self.atoms.volume
-        text = lines.splitlines()
-        ng_line = text[self.atoms.num_atoms + 9]
         ng = [int(j) for j in ng_line.split()]
-        self.dim = np.array(ng)
-        found = self.atoms.num_atoms + 8
-        nsets = 0
-        for i in text:
-            if "augmentation occupancies   1 " in i:
-                nsets = nsets + 1
-        self.nsets = nsets
+        self.nsets = text.count("augmentation occupancies   1 ")
         if self.is_spin_orbit():
             ValueError("Not implemeted for spin-orbit calculations yet")
-        # print ('nsets=',nsets)
-
-        start = found + 2
+        # Every repeat of the grid line starts a data block
+        marker = "\n" + ng_line + "\n"
+        starts = []
+        pos = text.find(marker)
+        while pos != -1:
+            starts.append(pos + len(marker))
+            pos = text.find(marker, pos + 1)
+        chg = []
+        for ii, start in enumerate(starts):
+            end = starts[ii + 1] if ii + 1 < len(starts) else len(text)
+            chg.append(self.chg_set(text[start:end], volume, ng))
+        self.chg = np.array(chg)
+        if self.cache:
+            np.save(sidecar, self.chg)
+            with open(sidecar + ".json", "w") as f:
+                json.dump({"nsets": self.nsets}, f)
+
+    def chg_set(self, text, volume, ng):
+        """Return one CHGCAR set from the text following its grid line."""
         ngs = int(ng[0] * ng[1] * ng[2])
-        if ngs % 5 == 0:
-            nlines = int(ngs / 5.0)
-        else:
-            nlines = int(ngs / 5.0) + 1
-        end = nlines + start  # +1
-
-        for ii, i in enumerate(text):
-            if text[ii] == ng_line:
-                start = ii + 1
-                end = start + nlines
-                chg = self.chg_set(text, start, end, volume, ng)
-                self.chg.append(chg)
-        self.chg = np.array(self.chg)
-
-    def chg_set(self, text, start, end, volume, ng):
-        """Return CHGCAR sets."""
-        lines_0 = text[start:end]
-        tmp = []
-        for i in lines_0:
-            for j in i.split():
-                if j != "":
-                    tmp.append(float(j))
-        tmp = np.array(tmp).reshape(ng)
+        tmp = np.fromstring(text, dtype="float", sep=" ", count=ngs)
+        if tmp.size != ngs:
+            raise ValueError("Incomplete grid data", self.filename)
+        tmp = tmp.reshape(ng)
         tmp = tmp / volume
         return tmp
 
@@ -214,7 +246,8 @@ class Locpot(Chgcar):
         avg_max = max(average)
 
         dif = float(avg_max) - float(Ef)
-        if plt:
+        if plot:
+            plt = _pyplot()
             plt.xlabel("z (Angstrom)")
             plt.plot(xs, ys, "-", linewidth=2, markersize=10)
             horiz_line_data = np.array([avg_max for i in range(len(xs))])
@@ -820,13 +853,16 @@ class Wavecar(object):
         self._occs = occs
         self._gvec = gvec
         self._lattice_mat = lattice_mat
+        self._kgrid = None
+        self._gvec_cache = {}
 
         assert not (lsorbit and lgamma), "The two settings conflict!"
 
         try:
             self._wfc = open(self._filename, "rb")
+            self._mmap = np.memmap(self._filename, dtype=np.uint8, mode="r")
         except Exception:
-            raise IOError("Failed to open %s" % self._fname)
+            raise IOError("Failed to open %s" % self._filename)
 
         # read the basic information
         self.readWFHeader()
@@ -936,57 +972,45 @@ class Wavecar(object):
             self._kpath = None
         return self._kpath, self._energies
 
+    def fft_grid(self):
+        """Get integer FFT grid points, x running fastest, as in VASP."""
+        if self._kgrid is None:
+            freqs = []
+            for n in self._ngrid:
+                f = np.arange(n)
+                f[f >= n / 2 + 1] -= n
+                freqs.append(f)
+            fz, fy, fx = np.meshgrid(
+                freqs[2], freqs[1], freqs[0], indexing="ij"
+            )
+            fx, fy, fz = fx.ravel(), fy.ravel(), fz.ravel()
+            if self._lgam:
+                # parallel gamma version of VASP WAVECAR exclude some
+                # planewave components, -DwNGZHalf
+                keep = (
+                    (fz > 0) | ((fz == 0) & (fy > 0))
+                    | ((fz == 0) & (fy == 0) & (fx >= 0))
+                )
+                fx, fy, fz = fx[keep], fy[keep], fz[keep]
+            self._kgrid = np.stack((fx, fy, fz), axis=1).astype(float)
+        return self._kgrid
+
     def gvectors(self, ikpt=1):
         """
         Generate the G-vectors.
 
          satisfies the following relation
             (G + k)**2 / 2 < ENCUT
+
+        Results are cached per k-point.
         """
         assert 1 <= ikpt <= self._nkpts, "Invalid kpoint index!"
 
+        if ikpt in self._gvec_cache:
+            self._gvec = self._gvec_cache[ikpt]
+            return self._gvec.copy()
         kvec = self._kvecs[ikpt - 1]
-        # fx, fy, fz = [fftfreq(n) * n for n in self._ngrid]
-        # fftfreq in scipy.fftpack is a little different with VASP frequencies
-        fx = [
-            ii if ii < self._ngrid[0] / 2 + 1 else ii - self._ngrid[0]
-            for ii in range(self._ngrid[0])
-        ]
-        fy = [
-            jj if jj < self._ngrid[1] / 2 + 1 else jj - self._ngrid[1]
-            for jj in range(self._ngrid[1])
-        ]
-        fz = [
-            kk if kk < self._ngrid[2] / 2 + 1 else kk - self._ngrid[2]
-            for kk in range(self._ngrid[2])
-        ]
-        if self._lgam:
-            # parallel gamma version of VASP WAVECAR exclude some planewave
-            # components, -DwNGZHalf
-            kgrid = np.array(
-                [
-                    (fx[ii], fy[jj], fz[kk])
-                    for kk in range(self._ngrid[2])
-                    for jj in range(self._ngrid[1])
-                    for ii in range(self._ngrid[0])
-                    if (
-                        (fz[kk] > 0)
-                        or (fz[kk] == 0 and fy[jj] > 0)
-                        or (fz[kk] == 0 and fy[jj] == 0 and fx[ii] >= 0)
-                    )
-                ],
-                dtype=float,
-            )
-        else:
-            kgrid = np.array(
-                [
-                    (fx[ii], fy[jj], fz[kk])
-                    for kk in range(self._ngrid[2])
-                    for jj in range(self._ngrid[1])
-                    for ii in range(self._ngrid[0])
-                ],
-                dtype=float,
-            )
+        kgrid = self.fft_grid()
 
         # Kinetic_Energy = (G + k)**2 / 2
         # HSQDTM    =  hbar**2/(2*ELECTRON MASS)
@@ -1011,20 +1035,47 @@ class Wavecar(object):
                 % (Gvec.shape[0], self._nplws[ikpt - 1], np.prod(self._ngrid))
             )
         self._gvec = np.asarray(Gvec, dtype=int)
+        self._gvec_cache[ikpt] = self._gvec
 
-        return np.asarray(Gvec, dtype=int)
+        return self._gvec.copy()
 
-    def readBandCoeff(self, ispin=1, ikpt=1, iband=1, norm=False):
-        """Read the planewave coefficients of specified KS states."""
-        self.checkIndex(ispin, ikpt, iband)
+    def read_bands(self, ispin=1, ikpt=1, band_slice=slice(None), norm=False):
+        """
+        Read planewave coefficients of several bands in one operation.
+
+        Args:
+
+            ispin: spin index, starting from 1
+
+            ikpt: k-point index, starting from 1
 
-        rec = self.whereRec(ispin, ikpt, iband)
-        self._wfc.seek(rec * self._recl)
+            band_slice: slice over bands, 0-based as in numpy
 
+            norm: normalize each band
+
+        Returns:
+              complex array of shape (number of bands, number of planewaves)
+        """
+        self.checkIndex(ispin, ikpt, 1)
+        bands = np.arange(self._nbands)[band_slice]
         nplw = self._nplws[ikpt - 1]
-        dump = np.fromfile(self._wfc, dtype=self._WFPrec, count=nplw)
+        nbytes = nplw * np.dtype(self._WFPrec).itemsize
+        # Band records are recl bytes apart, coefficients at their start
+        start = self.whereRec(ispin, ikpt, 1) * self._recl
+        records = self._mmap[start : start + self._nbands * self._recl]
+        records = records.reshape(self._nbands, self._recl)
+        block = np.ascontiguousarray(records[bands, :nbytes])
+        cg = block.view(self._WFPrec).astype(np.complex128)
+        if norm:
+            cg /= np.linalg.norm(cg, axis=1)[:, np.newaxis]
+        return cg
 
-        cg = np.asarray(dump, dtype=np.complex128)
+    def readBandCoeff(self, ispin=1, ikpt=1, iband=1, norm=False):
+        """Read the planewave coefficients of specified KS states."""
+        self.checkIndex(ispin, ikpt, iband)
+        cg = self.read_bands(
+            ispin=ispin, ikpt=ikpt, band_slice=slice(iband - 1, iband)
+        )[0]
         if norm:
             cg /= np.linalg.norm(cg)
         return cg
@@ -1048,18 +1099,316 @@ class Wavecar(object):
         assert 1 <= iband <= self._nbands, "Invalid band index!"
 
 
+vasprun_sections = (
+    "energies",
+    "structures",
+    "forces",
+    "stresses",
+    "eigenvalues",
+    "dos",
+)
+
+
+def _grouped_children(elem):
+    """Group child elements by tag, in the order xmltodict keys them."""
+    groups = OrderedDict()
+    for child in elem:
+        groups.setdefault(child.tag, []).append(child)
+    return groups
+
+
+def _named_texts(elems, d):
+    """Add stripped text of named elements, skipping empty ones."""
+    for m in elems:
+        text = (m.text or "").strip()
+        if text:
+            d[m.get("name")] = text
+
+
+def _float_rows(rows):
+    """Convert <v> or <r> elements to a 2D float array."""
+    texts = [r.text for r in rows]
+    return np.array(" ".join(texts).split(), dtype="float").reshape(
+        len(texts), -1
+    )
+
+
+def _float_sets(elem):
+    """Convert nested <set> blocks ending in <r> rows to one array."""
+    shape = []
+    inner = elem
+    sets = inner.findall("set")
+    while sets:
+        shape.append(len(sets))
+        inner = sets[0]
+        sets = inner.findall("set")
+    rows = [r.text for r in elem.iter("r")]
+    shape.extend([len(inner.findall("r")), -1])
+    return np.array(" ".join(rows).split(), dtype="float").reshape(shape)
+
+
+def _named_varray(elem, name):
+    """Get <varray> child with the given name as float array."""
+    for varray in elem.findall("varray"):
+        if varray.get("name") == name:
+            return _float_rows(varray.findall("v"))
+    return None
+
+
+def _iter_vasprun(filename="vasprun.xml", sections=vasprun_sections):
+    """
+    Stream vasprun.xml, yielding header blocks and then ionic steps.
+
+    Yields (tag, dict) pairs for the parameters, atominfo and kpoints
+    blocks and ("calculation", dict) for every ionic step, with the
+    eigenvalues and dos elements left unparsed.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    step = {}
+    # depth counts ancestors, top is the tag of the current child of root
+    depth = 0
+    top = ""
+    root = None
+    for event, elem in iterparse(filename, events=("start", "end")):
+        if event == "start":
+            if depth == 0:
+                root = elem
+            elif depth == 1:
+                top = elem.tag
+                if top == "calculation":
+                    step = {}
+            depth += 1
+            continue
+        depth -= 1
+        if depth > 2:
+            continue
+        if depth == 1 and elem.tag == "parameters":
+            # Same selection as Vasprun.all_input_parameters with xmltodict
+            d = OrderedDict()
+            for sep in elem.findall("separator"):
+                for tag, k in _grouped_children(sep).items():
+                    if len(k) < 2:
+                        continue
+                    if tag == "i":
+                        _named_texts(k, d)
+                        continue
+                    for n in k:
+                        for q in _grouped_children(n).values():
+                            if len(q) > 1:
+                                _named_texts(q, d)
+            yield "parameters", {"parameters": d}
+        elif depth == 1 and elem.tag == "atominfo":
+            info = {}
+            info["num_atoms"] = int(elem.find("atoms").text)
+            info["num_types"] = int(elem.find("types").text)
+            for array in elem.findall("array"):
+                if array.get("name") == "atoms":
+                    info["elements"] = [
+                        rc.find("c").text.strip()
+                        for rc in array.find("set").findall("rc")
+                    ]
+            yield "atominfo", info
+        elif depth == 1 and elem.tag == "kpoints":
+            info = {}
+            info["kpoints"] = _named_varray(elem, "kpointlist")
+            info["kpoint_weights"] = _named_varray(elem, "weights")[:, 0]
+            yield "kpoints", info
+        elif depth == 2 and top == "calculation":
+            tag = elem.tag
+            name = elem.get("name")
+            if tag == "scstep":
+                energy = elem.find("energy")
+                if energy is not None:
+                    step["scstep_energy"] = [
+                        i.text for i in energy.findall("i")
+                    ]
+            elif tag == "energy" and "energies" in sections:
+                step["energy"] = float(elem.findall("i")[1].text)
+            elif tag == "structure" and "structures" in sections:
+                basis = _named_varray(elem.find("crystal"), "basis")
+                coords = _named_varray(elem, "positions")
+                step["structure"] = (basis, coords)
+            elif tag == "varray" and name == "forces":
+                if "forces" in sections:
+                    step["forces"] = _float_rows(elem.findall("v"))
+            elif tag == "varray" and name == "stress":
+                if "stresses" in sections:
+                    step["stress"] = _float_rows(elem.findall("v"))
+            elif tag in ["eigenvalues", "dos"] and tag in sections:
+                # Kept unparsed, the caller decides which step to convert
+                step[tag] = elem
+                continue
+        elif depth == 1 and elem.tag == "calculation":
+            yield "calculation", step
+        if depth == 1:
+            elem.clear()
+            # Detach so memory stays flat over very long trajectories
+            root.remove(elem)
+        elif depth == 2 and top == "calculation":
+            elem.clear()
+
+
+def parse_vasprun(filename="vasprun.xml", sections=vasprun_sections):
+    """
+    Parse vasprun.xml incrementally into numpy arrays.
+
+    Elements are freed as soon as they are read, so memory stays
+    proportional to the requested data rather than to the file size.
+    Input parameters, atom info and k-points are always read.
+
+    Args:
+
+        filename: vasprun.xml path
+
+        sections: any of energies, structures, forces, stresses
+        (for every ionic step), eigenvalues and dos (of the last step)
+
+    Returns:
+          dictionary of parsed data, keys absent for missing sections
+    """
+    info = {}
+    steps = {"energies": [], "structures": [], "forces": [], "stresses": []}
+    last = {}
+    for tag, data in _iter_vasprun(filename, sections=sections):
+        if tag != "calculation":
+            info.update(data)
+            continue
+        for key, name in [
+            ("energies", "energy"),
+            ("structures", "structure"),
+            ("forces", "forces"),
+            ("stresses", "stress"),
+        ]:
+            if name in data:
+                steps[key].append(data[name])
+        last = data
+    for key, vals in steps.items():
+        if key in sections and vals:
+            info[key] = vals if key == "structures" else np.array(vals)
+    if "scstep_energy" in last:
+        info["scstep_energy"] = last["scstep_energy"]
+    if "eigenvalues" in last:
+        info["eigenvalues"] = _float_sets(
+            last["eigenvalues"].find("array").find("set")
+        )
+    if "dos" in last:
+        dos = last["dos"]
+        efermi = dos.find("i")
+        if efermi is not None:
+            info["efermi"] = float(efermi.text)
+        total = dos.find("total")
+        if total is not None:
+            info["total_dos"] = _float_sets(total.find("array").find("set"))
+        partial = dos.find("partial")
+        if partial is not None:
+            array = partial.find("array")
+            info["pdos_fields"] = [
+                f.text.strip() for f in array.findall("field")
+            ]
+            info["partial_dos"] = _float_sets(array.find("set"))
+    return info
+
+
+def load_chunks(store_dir="trajectory"):
+    """
+    Read ionic step chunks written by Vasprun.to_chunks.
+
+    Args:
+
+        store_dir: directory with meta.json and chunk files
+
+    Returns:
+          generator of dictionaries of arrays, one per chunk,
+          with the first axis running over ionic steps
+    """
+    with open(os.path.join(store_dir, "meta.json"), "r") as f:
+        meta = json.load(f)
+    for name in meta["chunks"]:
+        with np.load(os.path.join(store_dir, name)) as chunk:
+            yield {k: chunk[k] for k in chunk.files}
+
+
 class Vasprun(object):
     """Construct vasprun.xml handling object."""
 
-    def __init__(self, filename="vasprun.xml", data={}):
-        """Intialize with filename, or optional parameters below."""
+    def __init__(
+        self,
+        filename="vasprun.xml",
+        data={},
+        backend="iterparse",
+        sections=vasprun_sections,
+    ):
+        """
+        Intialize with filename, or optional parameters below.
+
+        Args:
+
+            filename: vasprun.xml path
+
+            data: xmltodict dictionary of the file, used instead of reading
+
+            backend: iterparse reads only the sections below into arrays,
+            other properties parse the whole file on first use;
+            xmltodict parses the whole file up front
+
+            sections: sections to read with the iterparse backend,
+            see parse_vasprun; they are read on first property access,
+            so iter_steps and to_chunks never load them
+        """
+        if backend not in ["iterparse", "xmltodict"]:
+            raise ValueError("Unknown vasprun backend", backend)
         self._filename = filename
-        self._data = data
-        self.ionic_steps = None
+        self._xml_data = data
+        self._parsed = None
+        self._sections = None
+        self._input_parameters = None
         self.electronic_steps = None
-        self.input_parameters = None
-        if self._data == {}:
+        if data == {}:
+            if backend == "iterparse":
+                self._sections = sections
+            else:
+                self.xml_to_dict()
+
+    @property
+    def _arrays(self):
+        """Get arrays of the iterparse sections, parsed on first use."""
+        if self._parsed is None:
+            self._parsed = {}
+            if self._sections is not None:
+                self._parsed = parse_vasprun(
+                    self._filename, sections=self._sections
+                )
+        return self._parsed
+
+    @property
+    def input_parameters(self):
+        """Get input parameters, parsed on first use."""
+        if self._input_parameters is None:
+            if "parameters" in self._arrays:
+                self._input_parameters = self._arrays["parameters"]
+            else:
+                self._input_parameters = self.all_input_parameters
+        return self._input_parameters
+
+    @input_parameters.setter
+    def input_parameters(self, value):
+        self._input_parameters = value
+
+    @property
+    def _data(self):
+        """Get xmltodict dictionary of the file, parsed on first use."""
+        if self._xml_data == {}:
             self.xml_to_dict()
+        return self._xml_data
+
+    @property
+    def ionic_steps(self):
+        """Get calculation blocks of the xmltodict dictionary."""
+        steps = self._data["modeling"]["calculation"]
+        if type(steps) is not list:
+            steps = [steps]
+        return steps
 
     @classmethod
     def from_dict(self, d={}):
@@ -1075,18 +1424,17 @@ class Vasprun(object):
 
     def xml_to_dict(self):
         """Convert XML to dictionary."""
+        import xmltodict
+
         with open(self._filename) as fd:
             data = xmltodict.parse(fd.read())
-            self._data = data
-            self.ionic_steps = data["modeling"]["calculation"]
-            if type(self.ionic_steps) is not list:
-                self.ionic_steps = [self.ionic_steps]
-            if self.input_parameters is None:
-                self.input_parameters = self.all_input_parameters
+            self._xml_data = data
 
     @property
     def final_energy(self):
         """Get final energy."""
+        if "scstep_energy" in self._arrays:
+            return float(self._arrays["scstep_energy"][11])
         return float(
             self.ionic_steps[-1]["scstep"][-1]["energy"]["i"][11]["#text"]
         )
@@ -1112,16 +1460,22 @@ class Vasprun(object):
     @property
     def efermi(self):
         """Get Fermi-energy."""
+        if "efermi" in self._arrays:
+            return self._arrays["efermi"]
         return float(self.ionic_steps[-1]["dos"]["i"]["#text"])
 
     @property
     def num_atoms(self):
         """Get number of simulation atoms."""
+        if "num_atoms" in self._arrays:
+            return self._arrays["num_atoms"]
         return int(self._data["modeling"]["atominfo"]["atoms"])
 
     @property
     def num_types(self):
         """Get number of atom types."""
+        if "num_types" in self._arrays:
+            return self._arrays["num_types"]
         return int(self._data["modeling"]["atominfo"]["types"])
 
     @property
@@ -1147,6 +1501,8 @@ class Vasprun(object):
     @property
     def avg_absorption_coefficient(self, max_axis=3):
         """Get average absoprtion coefficient. Used in solar-cell module."""
+        from scipy.constants import physical_constants, speed_of_light
+
         eV_to_recip_cm = 1.0 / (
             physical_constants["Planck constant in eV s"][0]
             * speed_of_light
@@ -1334,6 +1690,8 @@ class Vasprun(object):
     @property
     def elements(self):
         """Get atom elements."""
+        if "elements" in self._arrays:
+            return list(self._arrays["elements"])
         element_dat = self._data["modeling"]["atominfo"]["array"][0]["set"][
             "rc"
         ]
@@ -1377,6 +1735,8 @@ class Vasprun(object):
     @property
     def all_energies(self):
         """Get all total energies."""
+        if "energies" in self._arrays:
+            return self._arrays["energies"].copy()
         energies = []
         for i in self.ionic_steps:
             en = float(i["energy"]["i"][1]["#text"])
@@ -1402,6 +1762,17 @@ class Vasprun(object):
     @property
     def all_structures(self):
         """Get all structures."""
+        if "structures" in self._arrays:
+            elements = self.elements
+            return [
+                Atoms(
+                    lattice_mat=lattice_mat,
+                    elements=elements,
+                    coords=frac_coords,
+                    cartesian=False,
+                )
+                for lattice_mat, frac_coords in self._arrays["structures"]
+            ]
         structs = []
         for i in self.ionic_steps:
             s = i["structure"]
@@ -1412,6 +1783,11 @@ class Vasprun(object):
     @property
     def eigenvalues(self):
         """Get all eigenvalues."""
+        if "eigenvalues" in self._arrays:
+            eigs = self._arrays["eigenvalues"]
+            if self.is_spin_polarized:
+                return eigs[0].copy(), eigs[1].copy()
+            return eigs[0].copy(), eigs[0].copy()
         nkpts = len(self.kpoints._kpoints)
         all_up_eigs = []
         all_dn_eigs = []
@@ -1462,6 +1838,8 @@ class Vasprun(object):
     @property
     def all_forces(self):
         """Get all forces."""
+        if "forces" in self._arrays:
+            return self._arrays["forces"].copy()
         forces = []
         for m in self.ionic_steps:
             force = np.array(
@@ -1474,6 +1852,8 @@ class Vasprun(object):
     @property
     def all_stresses(self):
         """Get all stresses."""
+        if "stresses" in self._arrays:
+            return self._arrays["stresses"].copy()
         stresses = []
         for m in self.ionic_steps:
             stress = np.array(
@@ -1483,9 +1863,131 @@ class Vasprun(object):
             stresses.append(stress)
         return np.array(stresses)
 
+    def iter_steps(self, fields=("structure", "forces", "energy")):
+        """
+        Stream ionic steps from the file one at a time.
+
+        Memory use does not grow with the number of steps, so this also
+        works for long molecular dynamics runs. No other section is read,
+        as long as no other property of this object is used; open with
+        Vasprun(filename, sections=[]) to make that explicit:
+
+            vrun = Vasprun("vasprun.xml", sections=[])
+            for step in vrun.iter_steps(fields=["energy"]):
+                print(step["energy"])
+
+        Args:
+
+            fields: any of structure, forces, stress and energy
+
+        Returns:
+              generator of dictionaries with the requested fields,
+              structure as Atoms
+        """
+        for elements, step in self._stream_steps(fields):
+            yield step
+
+    def _stream_steps(self, fields):
+        """Yield (elements, step) pairs for iter_steps and to_chunks."""
+        for field in fields:
+            if field not in step_fields:
+                raise ValueError("Unknown ionic step field", field)
+        sections = [step_fields[field] for field in fields]
+        elements = []
+        for tag, data in _iter_vasprun(self._filename, sections=sections):
+            if tag == "atominfo":
+                elements = data["elements"]
+            if tag != "calculation":
+                continue
+            step = {}
+            for field in fields:
+                if field == "structure":
+                    lattice_mat, frac_coords = data["structure"]
+                    step[field] = Atoms(
+                        lattice_mat=lattice_mat,
+                        elements=elements,
+                        coords=frac_coords,
+                        cartesian=False,
+                    )
+                else:
+                    step[field] = data[field]
+            yield elements, step
+
+    def to_chunks(
+        self,
+        store_dir="trajectory",
+        fields=("structure", "forces", "energy"),
+        chunk_size=1000,
+    ):
+        """
+        Write ionic steps to a directory of fixed size npz chunks.
+
+        Steps are streamed from the file, so at most one chunk is held
+        in memory. Structures are stored as lattice_mat and frac_coords
+        arrays. Read back with load_chunks:
+
+            Vasprun("vasprun.xml", sections=[]).to_chunks("trajectory")
+            for chunk in load_chunks("trajectory"):
+                print(chunk["energy"])
+
+        Args:
+
+            store_dir: output directory, created if missing
+
+            fields: any of structure, forces, stress and energy
+
+            chunk_size: number of ionic steps per chunk
+
+        Returns:
+              number of ionic steps written
+        """
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        chunks = []
+        buf = {}
+        nsteps = 0
+
+        def flush():
+            name = "chunk_%06d.npz" % len(chunks)
+            np.savez(
+                os.path.join(store_dir, name),
+                **{k: np.array(v) for k, v in buf.items()}
+            )
+            chunks.append(name)
+            buf.clear()
+
+        elements = []
+        for elements, step in self._stream_steps(fields):
+            for field, val in step.items():
+                if field == "structure":
+                    buf.setdefault("lattice_mat", []).append(
+                        val.lattice_mat
+                    )
+                    buf.setdefault("frac_coords", []).append(
+                        val.frac_coords
+                    )
+                else:
+                    buf.setdefault(field, []).append(val)
+            nsteps += 1
+            if nsteps % chunk_size == 0:
+                flush()
+        if buf:
+            flush()
+        meta = {
+            "elements": list(elements),
+            "fields": list(fields),
+            "nsteps": nsteps,
+            "chunks": chunks,
+        }
+        with open(os.path.join(store_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return nsteps
+
     @property
     def all_input_parameters(self):
         """Get all explicit input parameters. Need to add a few more."""
+        if "parameters" in self._arrays:
+            return OrderedDict(self._arrays["parameters"])
         d = OrderedDict()
         # import type
         for i in self._data["modeling"]["parameters"]["separator"]:
@@ -1512,6 +2014,11 @@ class Vasprun(object):
     @property
     def kpoints(self):
         """Get Kpoints."""
+        if "kpoints" in self._arrays:
+            return Kpoints(
+                kpoints=self._arrays["kpoints"].copy(),
+                kpoints_weights=self._arrays["kpoint_weights"].copy(),
+            )
         kplist = np.array(
             [
                 [float(j) for j in i.split()]
@@ -1586,6 +2093,7 @@ class Vasprun(object):
         info["kp_labels_points"] = list(kp_labels_points)
         info["kp_labels"] = list(kp_labels)
         if plot:
+            plt = _pyplot()
             for i, j in zip(info["spin_up_bands_x"], info["spin_up_bands_y"]):
                 plt.plot(
                     np.array(i).flatten(), np.array(j).flatten(), color="b"
@@ -1617,6 +2125,13 @@ class Vasprun(object):
         energies = []
         spin_up = []
         spin_dn = []
+        if "total_dos" in self._arrays:
+            dos = self._arrays["total_dos"]
+            energies = dos[0][:, 0].copy()
+            spin_up = dos[0][:, 1].copy()
+            if self.is_spin_polarized:
+                spin_dn = -1 * dos[1][:, 1]
+            return energies, spin_up, spin_dn
         spin_up_data = np.array(
             [
                 [float(j) for j in i.split()]
@@ -1646,6 +2161,13 @@ class Vasprun(object):
         info = rec_dict()
         natoms = self.num_atoms
         nspin = self.nspins
+        if "partial_dos" in self._arrays:
+            pdos = self._arrays["partial_dos"]
+            for atom in range(natoms):
+                for spin in range(nspin):
+                    for k, key in enumerate(self._arrays["pdos_fields"]):
+                        info[spin][atom][key] = pdos[atom, spin][:, k].copy()
+            return info
         pdos_keys = self.ionic_steps[-1]["dos"]["partial"]["array"]["field"]
         steps_dat = self.ionic_steps[-1]["dos"]["partial"]["array"]["set"][
             "set"
@@ -1809,6 +2331,7 @@ class Vasprun(object):
             if has_f_elements:
                 info["spin_down_f"] = -1 * spin_down_f
             if plot:
+                plt = _pyplot()
                 plt.plot(
                     info["energy"], info["spin_up_s"], color="red", label="s"
                 )
@@ -1882,6 +2405,7 @@ class Vasprun(object):
                         spin_down_info[i] += -1 * pdos[0][atom][k]
             info["spin_down_info"] = spin_down_info
             if plot:
+                plt = _pyplot()
                 for i, j in info.items():
                     if "spin" in i:
                         for m, n in j.items():
@@ -1921,6 +2445,8 @@ def parse_raman_dat(
     activity = np.array(activity)
     indices = np.arange(0, len(activity) - 1)
     try:
+        import scipy.signal as ss
+
         indices = ss.find_peaks_cwt(activity, np.arange(1, 5))
     except Exception:
         print("Cannot use peak finding module", vasp_raman_path)
@@ -15,7 +15,10 @@ from jarvis.core.kpoints import Kpoints3D
 from jarvis.io.vasp.outputs import Vasprun
 import scipy
 import scipy.optimize as opt
+import scipy.sparse as sps
+import scipy.sparse.linalg
 import copy as copy
+from multiprocessing import Pool
 
 
 def get_projectors_for_formula(
@@ -169,6 +172,46 @@ def get_orbitals(
     return inds
 
 
+_node_ham = None
+
+
+def _init_node_worker(ham):
+    """Set the Hamiltonian used by _node_worker in this process."""
+    global _node_ham
+    _node_ham = ham
+
+
+def _node_worker(task):
+    """Minimize the direct gap in a box around a seed k-point."""
+    k, dk, num_occ = task
+    start = _node_ham.nevals
+
+    def fun_to_min(k):
+        val, vect, p = _node_ham.solve_ham(k, proj=None)
+        return val[num_occ] - val[num_occ - 1]
+
+    B = opt.Bounds(k - dk, k + dk, keep_feasible=True)
+    res = opt.minimize(
+        fun_to_min,
+        k,
+        method="Powell",
+        bounds=B,
+        tol=0.5e-3,
+        options={"maxfev": 5},
+    )
+    if res.fun < 0.005:
+        res = opt.minimize(
+            fun_to_min,
+            res.x,
+            method="Powell",
+            bounds=B,
+            tol=1e-5,
+            options={"maxfev": 30},
+        )
+    val, vect, p = _node_ham.solve_ham(res.x, proj=None)
+    return res.x, val, _node_ham.nevals - start
+
+
 class WannierHam(object):
     """Construct WannierHamltonian object."""
 
@@ -182,9 +225,16 @@ class WannierHam(object):
         H_val=None,
         H=None,
         HR=None,
+        cache=False,
     ):
-        """Initialize the class."""
+        """
+        Initialize the class.
+
+        With cache=True the parsed hoppings are saved next to the
+        file as .npz and reused while the file mtime and size match.
+        """
         self.filename = filename
+        self.cache = cache
         self.nr = nr
         self.nwan = nwan
         self.sym_r = sym_r
@@ -192,6 +242,7 @@ class WannierHam(object):
         self.H_val = H_val
         self.H = H
         self.HR = HR
+        self.nevals = 0
 
         if self.nr is None:
             self.read_ham()
@@ -223,190 +274,176 @@ class WannierHam(object):
         thresh=-10,
         node_tol=0.001,
         use_min=True,
+        n_jobs=1,
+        refine=False,
     ):
-        """Find nodes, Dirac, Wyel points."""
-        K = np.zeros((nk1 * 4, nk2 * 4, nk3 * 4, 3), dtype=float)
+        """
+        Find nodes, Dirac, Wyel points.
+
+        The direct gap is first computed on the coarse nk1 x nk2 x nk3
+        grid in one batch. Only coarse cells with a corner gap below
+        thresh are subdivided into the 4 x 4 x 4 fine grid, whose
+        points are again solved in one batch. With refine=True the
+        subdivision is an octree: a cell is halved twice and only the
+        halves with a corner gap below thresh are kept. Points with a
+        gap below 0.15 seed a bounded minimization, run over n_jobs
+        processes. Hamiltonian evaluations are counted in self.nevals.
+        """
         k1 = np.array(k1, dtype=float)
         k2 = np.array(k2, dtype=float)
         k3 = np.array(k3, dtype=float)
+        n1, n2, n3 = nk1 * 4, nk2 * 4, nk3 * 4
+        f1 = np.arange(n1, dtype=float) / float(n1)
+        f2 = np.arange(n2, dtype=float) / float(n2)
+        f3 = np.arange(n3, dtype=float) / float(n3)
+        K = (
+            origin
+            + k1 * f1[:, None, None, None]
+            + k2 * f2[None, :, None, None]
+            + k3 * f3[None, None, :, None]
+        )
 
-        for c1 in range(4 * nk1):
-            for c2 in range(4 * nk2):
-                for c3 in range(4 * nk3):
-                    K[c1, c2, c3, :] = (
-                        origin
-                        + k1 * float(c1) / float(nk1 * 4)
-                        + k2 * float(c2) / float(nk2 * 4)
-                        + k3 * float(c3) / float(nk3 * 4)
-                    )
-
-                    #        VALS = np.zeros((nk1,nk2, ham.nwan))
-
-        IMAGE = np.zeros((nk1 * 4, nk2 * 4, nk3 * 4, len(sig)))
-        DIRECTGAP = np.zeros((nk1 * 4, nk2 * 4, nk3 * 4))
+        IMAGE = np.zeros((n1, n2, n3, len(sig)))
+        DIRECTGAP = np.zeros((n1, n2, n3))
         DIRECTGAP[:, :, :] = 100.0
 
-        VAL = np.ones((nk1 * 4, nk2 * 4, nk3 * 4)) * 100.0
-
-        #        sig_0 = 0.2
+        VAL = np.ones((n1, n2, n3)) * 100.0
 
         # initial pass
 
-        for c1 in range(0, 4 * nk1, 4):
-            print("c1 ", c1)
-            for c2 in range(0, 4 * nk2, 4):
-                for c3 in range(0, 4 * nk3, 4):
-                    k = K[c1, c2, c3, :]
-                    val, vect, p = self.solve_ham(k, proj=None)
+        EIG = np.zeros((n1, n2, n3, self.nwan))
+        done = np.zeros((n1, n2, n3), dtype=bool)
 
-                    d = val[num_occ] - val[num_occ - 1]
-                    DIRECTGAP[c1, c2, c3] = d
+        def solve(mask):
+            todo = mask & ~done
+            vals, vects, p = self.solve_ham_batch(K[todo], vectors=False)
+            EIG[todo] = vals
+            DIRECTGAP[todo] = vals[:, num_occ] - vals[:, num_occ - 1]
+            done[todo] = True
 
-                    # IMAGE[c1,c2,c3,-1] = np.exp( -(d)**2 / sig[-1]**2)
+        sel = np.zeros((n1, n2, n3), dtype=bool)
+        sel[::4, ::4, ::4] = True
+        solve(sel)
 
         if thresh == -10:
             thresh = max(np.min(DIRECTGAP) * 1.5, 0.03)
             print("set thresh ", thresh)
 
-            # second pass
-
-            #        maxval = np.max(IMAGE[:,:,:,-1])
-            #        thresh = maxval * 0.1
-            #        print("thresh ", maxval, thresh)
-
-        def fun_to_min(k):
-            val, vect, p = self.solve_ham(k, proj=None)
-            return val[num_occ] - val[num_occ - 1]
-
-        num_thresh = 0
-
-        min_gap = 1000000000.0
-        min_cond = 1000000000.0
-        max_val = -1000000000.0
-
-        dk1 = float(1) / float(nk1 * 4) / 2.0
-        dk2 = float(1) / float(nk2 * 4) / 2.0
-        dk3 = float(1) / float(nk3 * 4) / 2.0
+        def corner_low(gap, thresh):
+            low = gap < thresh
+            for ax in range(3):
+                low = low | np.roll(low, -1, ax)
+            return low
+
+        # second pass
+        if refine:
+            # octree: halve flagged cells and keep the halves that
+            # have a corner below thresh, scaled down with the cell
+            flag = corner_low(DIRECTGAP[::4, ::4, ::4], thresh)
+            for s in (2, 1):
+                m = np.zeros((n1 // s, n2 // s, n3 // s), dtype=bool)
+                m[::2, ::2, ::2] = flag
+                for ax in range(3):
+                    m = m | np.roll(m, 1, ax) | np.roll(m, 2, ax)
+                sel = np.zeros((n1, n2, n3), dtype=bool)
+                sel[::s, ::s, ::s] = m
+                solve(sel)
+                if s > 1:
+                    parent = flag.repeat(2, 0).repeat(2, 1).repeat(2, 2)
+                    low = corner_low(DIRECTGAP[::s, ::s, ::s], thresh * s / 4)
+                    flag = low & parent
+        else:
+            # a fine point is kept if a corner of its coarse cell lying
+            # on the same faces is below thresh
+            low = DIRECTGAP[::4, ::4, ::4] < thresh
+            sel = np.zeros((nk1, 4, nk2, 4, nk3, 4), dtype=bool)
+            for a in range(2):
+                for b in range(2):
+                    for c in range(2):
+                        m = low
+                        if a:
+                            m = m | np.roll(m, -1, 0)
+                        if b:
+                            m = m | np.roll(m, -1, 1)
+                        if c:
+                            m = m | np.roll(m, -1, 2)
+                        fa = slice(a, a * 3 + 1)
+                        fb = slice(b, b * 3 + 1)
+                        fc = slice(c, c * 3 + 1)
+                        sel[:, fa, :, fb, :, fc] = m[:, None, :, None, :, None]
+            sel = sel.reshape(n1, n2, n3)
+            solve(sel)
+
+        # coarse cell first, then the point inside it
+        cell = np.nonzero(
+            sel.reshape(nk1, 4, nk2, 4, nk3, 4).transpose(0, 2, 4, 1, 3, 5)
+        )
+        inds = (
+            cell[0] * 4 + cell[3],
+            cell[1] * 4 + cell[4],
+            cell[2] * 4 + cell[5],
+        )
+        num_thresh = inds[0].size
+        kpts = K[inds]
+        vals = EIG[inds]
+
+        if use_min and num_thresh > 0:
+            dk = np.array([0.5 / n1, 0.5 / n2, 0.5 / n3])
+            gaps = vals[:, num_occ] - vals[:, num_occ - 1]
+            seeds = np.nonzero(gaps < 0.15)[0]
+            tasks = [(kpts[i], dk, num_occ) for i in seeds]
+            if n_jobs == -1:
+                n_jobs = os.cpu_count()
+            if n_jobs > 1 and len(tasks) > 1:
+                light = WannierHam(nr=self.nr, nwan=self.nwan, HR=self.HR)
+                light.R = self.R
+                pool = Pool(
+                    n_jobs, initializer=_init_node_worker, initargs=(light,)
+                )
+                try:
+                    results = pool.map(_node_worker, tasks)
+                finally:
+                    pool.terminate()
+                # evaluations made by the worker copies
+                self.nevals += sum(r[2] for r in results)
+            else:
+                _init_node_worker(self)
+                results = [_node_worker(t) for t in tasks]
+                _init_node_worker(None)
+            for i, (x, val, nevals) in zip(seeds, results):
+                kpts[i] = x
+                vals[i] = val
+
+        gaps = vals[:, num_occ] - vals[:, num_occ - 1]
+        DIRECTGAP[inds] = gaps
+        VAL[inds] = 0.5 * (vals[:, num_occ] + vals[:, num_occ - 1])
+        min_gap = np.min(gaps, initial=1000000000.0)
+        min_cond = np.min(vals[:, num_occ], initial=1000000000.0)
+        max_val = np.max(vals[:, num_occ - 1], initial=-1000000000.0)
 
         weyl_points = []
         dirac_points = []
         higher_order_points = []
-
-        for c1 in range(0, 4 * nk1, 4):
-            print("c1 ", c1)
-            for c2 in range(0, 4 * nk2, 4):
-                for c3 in range(0, 4 * nk3, 4):
-                    for c1a in range(4):
-                        for c2a in range(4):
-                            for c3a in range(4):
-
-                                if c1a > 0:
-                                    c1p = (c1 + 4) % (4 * nk1)
-                                else:
-                                    c1p = c1
-                                if c2a > 0:
-                                    c2p = (c2 + 4) % (4 * nk2)
-                                else:
-                                    c2p = c2
-                                if c3a > 0:
-                                    c3p = (c3 + 4) % (4 * nk3)
-                                else:
-                                    c3p = c3
-
-                                if (
-                                    DIRECTGAP[c1, c2, c3] < thresh
-                                    or DIRECTGAP[c1, c2, c3p] < thresh
-                                    or DIRECTGAP[c1, c2p, c3] < thresh
-                                    or DIRECTGAP[c1, c2p, c3p] < thresh
-                                    or DIRECTGAP[c1p, c2, c3] < thresh
-                                    or DIRECTGAP[c1p, c2, c3p] < thresh
-                                    or DIRECTGAP[c1p, c2p, c3] < thresh
-                                    or DIRECTGAP[c1p, c2p, c3p] < thresh
-                                ):
-                                    num_thresh += 1
-                                    k = K[c1 + c1a, c2 + c2a, c3 + c3a, :]
-
-                                    if use_min:
-                                        B = opt.Bounds(
-                                            k - [dk1, dk2, dk3],
-                                            k + [dk1, dk2, dk3],
-                                            keep_feasible=True,
-                                        )
-                                        val, vect, p = self.solve_ham(
-                                            k, proj=None
-                                        )
-                                        if (
-                                            val[num_occ] - val[num_occ - 1]
-                                            < 0.15
-                                        ):
-                                            res = opt.minimize(
-                                                fun_to_min,
-                                                k,
-                                                method="Powell",
-                                                bounds=B,
-                                                tol=0.5e-3,
-                                                options={"maxfev": 5},
-                                            )
-                                            if res.fun < 0.005:
-                                                res = opt.minimize(
-                                                    fun_to_min,
-                                                    res.x,
-                                                    method="Powell",
-                                                    bounds=B,
-                                                    tol=1e-5,
-                                                    options={"maxfev": 30},
-                                                )
-                                            val, vect, p = self.solve_ham(
-                                                res.x, proj=None
-                                            )
-
-                                            k = res.x
-                                    else:
-                                        val, vect, p = self.solve_ham(
-                                            k, proj=None
-                                        )
-
-                                    d = val[num_occ] - val[num_occ - 1]
-                                    if d < node_tol:
-                                        # degen = 0
-                                        gap_mean = (
-                                            val[num_occ] + val[num_occ - 1]
-                                        ) / 2.0
-                                        count = np.sum(
-                                            np.abs(val - gap_mean)
-                                            < node_tol * 2
-                                        )
-                                        if count == 2:
-                                            weyl_points.append(copy.copy(k))
-                                            print("weyl point ", k, d, count)
-                                        elif count == 4 or count == 4:
-                                            dirac_points.append(copy.copy(k))
-                                            print("dirac point ", k, d, count)
-                                        else:
-                                            higher_order_points.append(
-                                                copy.copy(k)
-                                            )
-                                            print(
-                                                "nontrivial point ",
-                                                k,
-                                                d,
-                                                count,
-                                            )
-
-                                    DIRECTGAP[c1 + c1a, c2 + c2a, c3 + c3a] = d
-                                    VAL[c1 + c1a, c2 + c2a, c3 + c3a] = 0.5 * (
-                                        val[num_occ] + val[num_occ - 1]
-                                    )
-                                    min_gap = min(d, min_gap)
-                                    min_cond = min(min_cond, val[num_occ])
-                                    max_val = max(max_val, val[num_occ - 1])
+        for i in np.nonzero(gaps < node_tol)[0]:
+            k = kpts[i]
+            d = gaps[i]
+            val = vals[i]
+            gap_mean = (val[num_occ] + val[num_occ - 1]) / 2.0
+            count = np.sum(np.abs(val - gap_mean) < node_tol * 2)
+            if count == 2:
+                weyl_points.append(copy.copy(k))
+                print("weyl point ", k, d, count)
+            elif count == 4:
+                dirac_points.append(copy.copy(k))
+                print("dirac point ", k, d, count)
+            else:
+                higher_order_points.append(copy.copy(k))
+                print("nontrivial point ", k, d, count)
 
         for (cs, s) in enumerate(sig):
             IMAGE[:, :, :, cs] = np.exp(-((DIRECTGAP) ** 2) / s ** 2)
 
-        print(
-            "num thresh ", num_thresh, " out of ", nk1 * nk2 * nk3 * 4 * 4 * 4
-        )
+        print("num thresh ", num_thresh, " out of ", n1 * n2 * n3)
         print(
             "min direct gap ", min_gap, " indirect gap  ", min_cond - max_val
         )
@@ -475,19 +512,11 @@ class WannierHam(object):
 
         # nwan = self.nwan
 
-        for c1 in range(lim1):
-            for c2 in range(lim2):
-                k = K[c1, c2, :]
-                val, vect, p = self.solve_ham(k, proj=None)
-                VECT[c1, c2, :, :] = vect
-                if (val[nocc] - val[nocc - 1]) < gap_min:
-                    gap_min = val[nocc] - val[nocc - 1]
-
-                if val[nocc - 1] > val_max:
-                    val_max = val[nocc - 1]
-
-                if val[nocc] < cond_min:
-                    cond_min = val[nocc]
+        vals, vects, p = self.solve_ham_batch(K[:lim1, :lim2].reshape(-1, 3))
+        VECT[:, :, :, :] = vects.reshape(lim1, lim2, self.nwan, self.nwan)
+        gap_min = min(gap_min, np.min(vals[:, nocc] - vals[:, nocc - 1]))
+        val_max = max(val_max, np.max(vals[:, nocc - 1]))
+        cond_min = min(cond_min, np.min(vals[:, nocc]))
 
         print(
             "minimum_direct_gap", gap_min, "indirect_gap", cond_min - val_max
@@ -553,66 +582,60 @@ class WannierHam(object):
 
     def read_ham(self):
         """Read _hr.dat file.."""
-        f = open(self.filename, "r")
-        lines = f.read().splitlines()
-        # allines = f.readlines()
-        f.close()
-        self.nwan = int(lines[1])
-        self.nr = int(lines[2])
-        if self.nr % 15 == 0:
-            lines_r = int(math.floor(self.nr // 15))
-        else:
-            lines_r = int(math.floor(self.nr // 15) + 1)
-
-        # print ('self.nwan,self.nr',self.nwan,self.nr,lines_r)
-        self.sym_r = np.zeros(self.nr, dtype=float)
-        # load sym ops
-        for i in range(lines_r):
-
-            num = 3 + i
-            start = i * 15
-            end = (i + 1) * 15
-            if end > self.nr:
-                end = self.nr
-            self.sym_r[start:end] = [float(j) for j in lines[num].split()]
-        # print (self.sym_r)
+        sidecar = self.filename + ".npz"
+        stat = os.stat(self.filename)
+        key = np.array([stat.st_mtime, stat.st_size], dtype=float)
+        loaded = False
+        if self.cache and os.path.isfile(sidecar):
+            with np.load(sidecar) as data:
+                if np.array_equal(data["key"], key):
+                    self.nwan = int(data["nwan"])
+                    self.nr = int(data["nr"])
+                    self.sym_r = data["sym_r"]
+                    self.H_int = data["H_int"]
+                    self.H_val = data["H_val"]
+                    loaded = True
+        if not loaded:
+            self.read_hoppings()
+            if self.cache:
+                np.savez(
+                    sidecar,
+                    key=key,
+                    nwan=self.nwan,
+                    nr=self.nr,
+                    sym_r=self.sym_r,
+                    H_int=self.H_int,
+                    H_val=self.H_val,
+                )
+        return self.build_hr()
+
+    def read_hoppings(self):
+        """Parse header, degeneracies and hopping block of _hr.dat."""
+        with open(self.filename, "r") as f:
+            f.readline()
+            self.nwan = int(f.readline())
+            self.nr = int(f.readline())
+            lines_r = int(math.ceil(self.nr / 15.0))
+            # load sym ops
+            sym = " ".join([f.readline() for i in range(lines_r)])
+            text = f.read()
+        self.sym_r = np.fromstring(sym, dtype=float, sep=" ", count=self.nr)
 
         tot = self.nwan ** 2 * self.nr
-        self.H_int = np.zeros((tot, 5), dtype=int)
+        vals = np.fromstring(text, dtype=float, sep=" ", count=tot * 7)
+        if vals.size != tot * 7:
+            raise ValueError("Incomplete hopping data", self.filename)
+        vals = vals.reshape(tot, 7)
+        self.H_int = vals[:, 0:5].astype(int)
+        sym = self.sym_r[np.arange(tot) // self.nwan ** 2]
         self.H_val = np.zeros(tot, dtype=complex)
+        self.H_val.real = vals[:, 5] / sym
+        self.H_val.imag = vals[:, 6] / sym
 
-        c = 0
-        rnum = 0
-        for i in range(lines_r + 3, lines_r + 3 + tot):
-
-            rnum = (c) // self.nwan ** 2
-            # print ('lines[i].split()[0:5]',c,self.nwan**2)#,self.sym_r[rnum])
-            self.H_int[c, :] = [int(j) for j in lines[i].split()[0:5]]
-            # print ('lines[i][5]',lines[i])
-            self.H_val[c] = (
-                float(lines[i].split()[5]) + 1j * float(lines[i].split()[6])
-            ) / float(self.sym_r[rnum])
-            c += 1
-
-        # print (self.H_int[0,:])
-        # print (self.H_val[0])
-
-        # print (self.H_int[-1,:])
-        # print (self.H_val[-1])
-
-        # print ('loaded ', self.filename)
-        # print ('nwan: ', self.nwan)
-        # print ('nr:   ', self.nr)
-        # print ()
-
-        # reshape
-
-        nx1 = np.min(self.H_int[:, 0])
-        nx2 = np.max(self.H_int[:, 0])
-        ny1 = np.min(self.H_int[:, 1])
-        ny2 = np.max(self.H_int[:, 1])
-        nz1 = np.min(self.H_int[:, 2])
-        nz2 = np.max(self.H_int[:, 2])
+    def build_hr(self):
+        """Scatter hoppings into H on the R grid and flatten it to HR."""
+        nx1, ny1, nz1 = np.min(self.H_int[:, 0:3], axis=0)
+        nx2, ny2, nz2 = np.max(self.H_int[:, 0:3], axis=0)
 
         self.ind = [[nx1, nx2], [ny1, ny2], [nz1, nz2]]
 
@@ -623,37 +646,23 @@ class WannierHam(object):
         print("H size", ix, iy, iz, self.nwan, self.nwan)
 
         self.H = np.zeros((ix, iy, iz, self.nwan, self.nwan), dtype=complex)
+        ind = self.H_int[:, 0:3] - [nx1, ny1, nz1]
+        nw1 = self.H_int[:, 3] - 1
+        nw2 = self.H_int[:, 4] - 1
+        self.H[ind[:, 0], ind[:, 1], ind[:, 2], nw1, nw2] = self.H_val
+
+        # last hopping row of each R vector
+        last = np.full((ix, iy, iz), -1, dtype=int)
+        last[ind[:, 0], ind[:, 1], ind[:, 2]] = np.arange(ind.shape[0])
+        found = np.argwhere(last >= 0)
+        self.ind_dict = dict(
+            zip(map(tuple, found.tolist()), last[last >= 0].tolist())
+        )
 
-        self.ind_dict = {}
-        for i in range(self.H_val.shape[0]):
-            ind = self.get_ind(self.H_int[i, 0:3])
-
-            self.ind_dict[(ind[0], ind[1], ind[2])] = i
-
-            nw1 = self.H_int[i, 3]
-            nw2 = self.H_int[i, 4]
-
-            self.H[ind[0], ind[1], ind[2], nw1 - 1, nw2 - 1] = self.H_val[i]
-
-        # print ('done reshaping1')
         nr = ix * iy * iz
-        self.R = np.zeros((nr, 3), dtype=float)
-        self.HR = np.zeros((nr, self.nwan ** 2), dtype=complex)
-
-        c = 0
-        for x in range(nx1, nx2 + 1):
-            for y in range(ny1, ny2 + 1):
-                for z in range(nz1, nz2 + 1):
-                    #                    ind = self.ind_dict[(x,y,z)]
-                    ind = self.get_ind([x, y, z])
-                    self.R[c, :] = [x, y, z]
-                    self.HR[c, :] = np.reshape(
-                        self.H[ind[0], ind[1], ind[2], :, :], self.nwan ** 2
-                    )
-                    c += 1
-
-        if c != nr:
-            ValueError("c is not equal to r", c, nr)
+        grid = np.mgrid[nx1 : nx2 + 1, ny1 : ny2 + 1, nz1 : nz2 + 1]
+        self.R = grid.reshape(3, nr).T.astype(float)
+        self.HR = self.H.reshape(nr, self.nwan ** 2)
 
         return self.R, self.H, self.HR
 
@@ -668,6 +677,7 @@ class WannierHam(object):
     def solve_ham(self, k=[0, 0, 0], proj=None):
         """Solve Wannier Hamiltonian at a k-point."""
         nr = self.R.shape[0]
+        self.nevals += 1
         # print ('nr==',nr,self.nr)
         hk = np.zeros((self.nwan, self.nwan), dtype=complex)
 
@@ -675,9 +685,7 @@ class WannierHam(object):
 
         exp_ikr = np.exp(1.0j * 2 * np.pi * np.sum(kmat * self.R, 1))
 
-        temp = np.zeros(self.nwan ** 2, dtype=complex)
-        for i in range(nr):
-            temp += exp_ikr[i] * self.HR[i, :]
+        temp = np.dot(exp_ikr, self.HR)
 
         hk = np.reshape(temp, (self.nwan, self.nwan))
 
@@ -694,14 +702,113 @@ class WannierHam(object):
 
         return val.real, vect, p
 
+    def solve_ham_batch(
+        self, kpoints=[], proj=None, chunk_size=1000, vectors=True
+    ):
+        """
+        Solve Wannier Hamiltonian at many k-points.
+
+        All phases of a chunk of k-points form one (nk x nR) matrix,
+        so every H(k) in the chunk is built with a single matmul
+        against HR and diagonalized with a stacked eigh.
+
+        Args:
+            kpoints: k-points in fractional coordinates, nk x 3
+
+            proj: orbital indices to project eigenvectors onto
+
+            chunk_size: k-points handled at once, bounds memory
+
+            vectors: whether to return the eigenvectors
+
+        Returns:
+              vals: eigenvalues, nk x nwan
+
+              vects: eigenvectors, nk x nwan x nwan, or None
+
+              p: projections, nk x nwan
+        """
+        kpoints = np.array(kpoints, dtype=float).reshape(-1, 3)
+        nk = kpoints.shape[0]
+        self.nevals += nk
+        nwan = self.nwan
+        vals = np.zeros((nk, nwan), dtype=float)
+        vects = None
+        if vectors:
+            vects = np.zeros((nk, nwan, nwan), dtype=complex)
+        p = np.ones((nk, nwan), dtype=float)
+        for start in range(0, nk, chunk_size):
+            end = min(start + chunk_size, nk)
+            exp_ikr = np.exp(
+                1.0j * 2 * np.pi * np.dot(kpoints[start:end], self.R.T)
+            )
+            hk = np.dot(exp_ikr, self.HR).reshape(end - start, nwan, nwan)
+            hk = (hk + hk.transpose(0, 2, 1).conj()) / 2.0
+            if not vectors and proj is None:
+                vals[start:end] = np.linalg.eigvalsh(hk)
+                continue
+            val, vect = np.linalg.eigh(hk)
+            vals[start:end] = val
+            if vectors:
+                vects[start:end] = vect
+            if proj is not None:
+                vp = vect[:, proj, :]
+                p[start:end] = np.real(np.sum(vp * np.conj(vp), 1))
+        return vals, vects, p
+
+    def solve_ham_sparse(self, k=[0, 0, 0], nbands=10, sigma=0.0, proj=None):
+        """
+        Solve a sparse Wannier Hamiltonian for bands near an energy.
+
+        H(k) is assembled as a sparse NWAN x NWAN matrix and only the
+        nbands eigenvalues closest to sigma are found with shift-invert
+        Lanczos, e.g. edge states near the Fermi level of a slab.
+
+        Args:
+            k: k-point in fractional coordinates
+
+            nbands: number of eigenvalues, less than nwan
+
+            sigma: energy the eigenvalues are searched around
+
+            proj: orbital indices to project eigenvectors onto
+
+        Returns:
+              val: eigenvalues in ascending order
+
+              vect: eigenvectors, nwan x nbands
+
+              p: projections
+        """
+        nwan = self.nwan
+        self.nevals += 1
+        hr = sps.coo_matrix(self.HR)
+        exp_ikr = np.exp(1.0j * 2 * np.pi * np.dot(self.R, k))
+        hk = sps.csr_matrix(
+            (
+                hr.data * exp_ikr[hr.row],
+                (hr.col // nwan, hr.col % nwan),
+            ),
+            shape=(nwan, nwan),
+        )
+        hk = (hk + hk.getH()) / 2.0
+
+        val, vect = scipy.sparse.linalg.eigsh(hk, k=nbands, sigma=sigma)
+        order = np.argsort(val)
+        val = val[order]
+        vect = vect[:, order]
+
+        if proj is not None:
+            p = np.real(np.sum(vect[proj, :] * np.conj(vect[proj, :]), 0))
+        else:
+            p = np.ones(val.shape)
+
+        return val.real, vect, p
+
     def band_structure_eigs(self, kpath=None, proj=None, efermi=0.0):
         """Get eigenvalues for band eigenvalues."""
-        eigs = []
-        for i in kpath:
-            # print (i)
-            val, vect, p = self.solve_ham(k=i, proj=proj)
-            eigs.append(val - efermi)
-        return np.array(eigs)
+        vals, vects, p = self.solve_ham_batch(kpath, proj=proj, vectors=False)
+        return vals - efermi
 
     def get_bandstructure_plot(
         self, atoms=None, efermi=0.0, filename="bs.png", yrange=[-4, 4]
@@ -805,13 +912,10 @@ class WannierHam(object):
         nk = len(kpoints)
         nwan = self.nwan
 
-        vals = np.zeros((nk, nwan), dtype=float)
-        pvals = np.zeros((nk, nwan), dtype=float)
-
-        for i, k in enumerate(kpoints):
-            val, vect, p = self.solve_ham(k, proj)
-            vals[i, :] = val - efermi
-            pvals[i, :] = p
+        vals, vects, pvals = self.solve_ham_batch(
+            kpoints, proj=proj, vectors=False
+        )
+        vals = vals.reshape(nk, nwan) - efermi
 
         # print vals
         # print "pvals"
@@ -861,115 +965,81 @@ class WannierHam(object):
     def generate_supercell(
         self, supercell=[2, 2, 2], index=[0, 0, 0], sparse=False
     ):
-        """Generate supercell."""
+        """
+        Generate supercell.
+
+        Every (R, subcell) pair maps the hopping block H(R) to one
+        block of the supercell Hamiltonian at R' = (subcell + R) //
+        supercell, so all blocks are placed with index arithmetic.
+        With sparse=True, HR is a scipy.sparse.csr_matrix of shape
+        (nr, NWAN ** 2) holding only the non-zero hoppings; use
+        solve_ham_sparse on it.
+        """
         t0 = time.time()
 
         nw = self.nwan
-
-        factor = np.prod(supercell)
-        NWAN = factor * self.nwan
-
-        def plus_r(rold, subcell):
-            rnew = subcell + rold
-            # print ('cell',rnew,supercell)
-            cellnew = rnew // supercell  # this is integer division
-            subnew = rnew % supercell
-
-            return cellnew, subnew
-
-        def subcell_index(ss):
-            t = (
-                ss[0] * supercell[1] * supercell[2]
-                + ss[1] * supercell[2]
-                + ss[2]
-            )
-            return range(t * nw, (t + 1) * nw)
-
-        RH_new = {}
-        h_temp = np.zeros((self.nwan, self.nwan), dtype=complex)
-        subcell = np.zeros(3, dtype=int)
+        supercell = np.array(supercell, dtype=int)
+        nsub = int(np.prod(supercell))
+        NWAN = nsub * nw
+        nR = self.R.shape[0]
+
+        # subcells in i, j, k order, their block index is the position
+        subcells = np.indices(supercell).reshape(3, nsub).T
+        rnew = np.rint(self.R).astype(int)[:, None, :] + subcells[None, :, :]
+        cellnew = (rnew // supercell).reshape(-1, 3)
+        subnew = rnew % supercell
+        t = (
+            subnew[:, :, 0] * supercell[1] * supercell[2]
+            + subnew[:, :, 1] * supercell[2]
+            + subnew[:, :, 2]
+        ).ravel()
+        ii = np.repeat(np.arange(nR), nsub)
+        s = np.tile(np.arange(nsub), nR)
+
+        keep = ~np.any((np.array(index) > 0) & (cellnew != 0), axis=1)
+        cellnew, t, ii, s = cellnew[keep], t[keep], ii[keep], s[keep]
+
+        # new R vectors in order of first appearance
+        cells, first, inv = np.unique(
+            cellnew, axis=0, return_index=True, return_inverse=True
+        )
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        c = rank[inv.ravel()]
+        nr = order.size
 
         t1 = time.time()
 
-        for ii in range(self.R.shape[0]):
-
-            rold = np.array(self.R[ii, :], dtype=int)
-
-            for i in range(supercell[0]):
-                for j in range(supercell[1]):
-                    for k in range(supercell[2]):
-                        subcell[:] = [i, j, k]
-
-                        cellnew, subnew = plus_r(rold, subcell)
-
-                        if (
-                            (index[0] > 0 and cellnew[0] != 0)
-                            or (index[1] > 0 and cellnew[1] != 0)
-                            or (index[2] > 0 and cellnew[2] != 0)
-                        ):
-                            continue
-
-                        if tuple(cellnew) not in RH_new:
-                            if sparse:
-                                sps = scipy.sparse.csr_matrix  # TO CHECK
-                                RH_new[tuple(cellnew)] = [
-                                    cellnew,
-                                    sps.lil_matrix(
-                                        (NWAN, NWAN), dtype=complex
-                                    ),
-                                ]
-                            else:
-                                RH_new[tuple(cellnew)] = [
-                                    cellnew,
-                                    np.zeros((NWAN, NWAN), dtype=complex),
-                                ]
-
-                        h_temp[:, :] = np.reshape(
-                            self.HR[ii, :], (self.nwan, self.nwan)
-                        )
-
-                        r1 = subcell_index(subcell)
-                        r2 = subcell_index(subnew)
-
-                        for c1, c2 in enumerate(r1):
-                            for d1, d2 in enumerate(r2):
-                                RH_new[tuple(cellnew)][1][c2, d2] += h_temp[
-                                    c1, d1
-                                ]
+        H3 = np.reshape(self.HR, (nR, nw, nw))
+        if sparse:
+            # gather the non-zero hoppings of H(R) for every pair
+            rr, aa, bb = np.nonzero(H3)
+            start = np.searchsorted(rr, np.arange(nR))
+            n = np.bincount(rr, minlength=nR)[ii]
+            pj = np.repeat(np.arange(ii.size), n)
+            e = np.repeat(start[ii] - np.cumsum(n) + n, n) + np.arange(
+                n.sum()
+            )
+            row = c[pj]
+            col = (s[pj] * nw + aa[e]) * NWAN + t[pj] * nw + bb[e]
+            HR = sps.csr_matrix(
+                (H3[rr[e], aa[e], bb[e]], (row, col)),
+                shape=(nr, NWAN ** 2),
+                dtype=complex,
+            )
+        else:
+            # each (R', subcell, subnew) block is filled exactly once
+            HR = np.zeros((nr, nsub, nw, nsub, nw), dtype=complex)
+            HR[c, s, :, t, :] = H3[ii]
+            HR = HR.reshape(nr, NWAN ** 2)
 
         t2 = time.time()
 
-        nr = len(RH_new)
         hbig = WannierHam(nr=nr)
-        # hbig = wan_ham()
-        # if sparse:
-        #    hbig.sparse = True
-
-        # nwan = NWAN
         hbig.nwan = NWAN
-        # hbig.nr = rn
-
-        # R = np.zeros((nr, 3), dtype=float)
-        hbig.R = np.zeros((nr, 3), dtype=float)
-        if sparse:
-            # HR = sps.lil_matrix((nr, NWAN ** 2), dtype=complex)
-            hbig.HR = sps.lil_matrix((nr, NWAN ** 2), dtype=complex)
-        else:
-            # HR = np.zeros((nr, NWAN ** 2), dtype=complex)
-            hbig.HR = np.zeros((nr, NWAN ** 2), dtype=complex)
-
-        for c, i in enumerate(RH_new):
-            h = RH_new[i][1]
-            r = RH_new[i][0]
-            if sparse:
-                # HR[c, :] = sps.lil_matrix.reshape(h, NWAN * NWAN)
-                hbig.HR[c, :] = sps.lil_matrix.reshape(h, NWAN * NWAN)
-            else:
-                # HR[c, :] = np.reshape(h, NWAN * NWAN)
-                hbig.HR[c, :] = np.reshape(h, NWAN * NWAN)
-
-            # R[c, :] = r
-            hbig.R[c, :] = r
+        hbig.R = np.array(cells[order], dtype=float)
+        hbig.HR = HR
 
         t3 = time.time()
         print("TIME SUPERCELL", t1 - t0, t2 - t1, t3 - t2)
@@ -995,17 +1065,12 @@ class WannierHam(object):
                     + k2 * float(c2) / float(nk2)
                 )
 
-        image = np.zeros((nk1, nk2))
-
-        for c1 in range(nk1):
-            for c2 in range(nk2):
-                k = K[c1, c2, :]
-                val, vect, p = self.solve_ham(k=k)
-                image[c1, c2] = np.sum(
-                    np.exp(-((val - fermi) ** 2) / sig ** 2)
-                )
+        vals, vects, p = self.solve_ham_batch(
+            K.reshape(-1, 3), vectors=False
+        )
+        image = np.sum(np.exp(-((vals - fermi) ** 2) / sig ** 2), 1)
 
-        return image
+        return image.reshape(nk1, nk2)
 
 
 class Wannier90wout(object):
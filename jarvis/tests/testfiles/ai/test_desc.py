@@ -1,6 +1,7 @@
 from jarvis.ai.descriptors.cfid import CFID
 from jarvis.ai.descriptors.coulomb import coulomb_matrix
 from jarvis.core.atoms import Atoms
+import numpy as np
 
 
 def test_desc():
@@ -3144,3 +3145,44 @@ def test_desc():
 
 
 # test_desc()
+
+
+def test_cfid_batch(tmpdir):
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    Si = Atoms(
+        lattice_mat=box, coords=[[0, 0, 0], [0.25, 0.2, 0.25]], elements=["Si", "Si"]
+    )
+    SiC = Atoms(
+        lattice_mat=box, coords=[[0, 0, 0], [0.25, 0.25, 0.25]], elements=["Si", "C"]
+    )
+    cache = str(tmpdir.join("cfid"))
+    x = CFID.batch([Si, SiC, Si], n_jobs=2, chunksize=1, cache_dir=cache)
+    assert x.shape == (3, 1557) and x.dtype == "float32"
+    assert np.allclose(x[1], CFID(SiC).get_comp_descp(), rtol=1e-6)
+    assert (x[0] == x[2]).all()
+    y = CFID.batch(iter([SiC, Si]), cache_dir=cache)
+    assert (y[0] == x[1]).all() and (y[1] == x[0]).all()
+
+
+def test_coulomb_batch():
+    from jarvis.ai.descriptors.coulomb import (
+        coulomb_batch,
+        coulomb_eigenvalues,
+        sorted_coulomb_matrix,
+    )
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    SiC = Atoms(
+        lattice_mat=box, coords=[[0, 0, 0], [0.25, 0.25, 0.25]], elements=["Si", "C"]
+    )
+    CSi = Atoms(
+        lattice_mat=box, coords=[[0.25, 0.25, 0.25], [0, 0, 0]], elements=["C", "Si"]
+    )
+    assert (sorted_coulomb_matrix(SiC) == sorted_coulomb_matrix(CSi)).all()
+    eigs = coulomb_eigenvalues(SiC, max_dim=4)
+    assert eigs[2:].tolist() == [0, 0]
+    assert round(eigs.sum(), 4) == round(0.5 * (14 ** 2.4 + 6 ** 2.4), 4)
+    x = coulomb_batch([SiC, {"atoms": CSi.to_dict()}], kind="sorted", n_jobs=2)
+    assert x.shape == (2, 100) and x.dtype == "float32"
+    assert (x[0] == x[1]).all()
+    assert np.allclose(coulomb_batch(iter([SiC]))[0], coulomb_matrix(SiC))
@@ -0,0 +1,43 @@
+from jarvis.ai.pkgs.utils import get_ml_data
+from jarvis.db.jsonutils import dumpjson
+import numpy as np
+import os
+
+
+def test_get_ml_data():
+    d = [
+        {"jid": "JVASP-%d" % i, "desc": [float(i)] * 1557, "ehull": i * 0.1}
+        for i in range(20)
+    ]
+    d[1]["desc"] = "na"
+    d[2]["desc"] = [1.0] * 10
+    d[3]["ehull"] = "na"
+    d[4]["ehull"] = float("inf")
+    X, Y, jid = get_ml_data(ml_property="ehull", dataset=d, chunk_size=3)
+    assert X.dtype == np.float32
+    assert X.shape == (7, 1557)
+    assert jid == ["JVASP-%d" % i for i in [0, 5, 6, 7, 8, 9, 10]]
+    assert np.allclose(X[:, 0], [0, 5, 6, 7, 8, 9, 10])
+    assert np.allclose(Y, X[:, 0] * 0.1)
+    X, Y, jid = get_ml_data(ml_property="ehull", dataset=d, data_ranges=None)
+    assert len(jid) == 16
+
+
+def test_get_ml_data_cache(tmpdir, monkeypatch):
+    import jarvis.ai.pkgs.utils as utils
+
+    path = str(tmpdir.join("data.json"))
+    cache = str(tmpdir.join("cache"))
+    d = [{"jid": "JVASP-1", "desc": [1.0] * 1557, "ehull": 0.1}]
+    dumpjson(d, path)
+    monkeypatch.setattr(utils, "download", lambda dataset: path)
+    X, Y, jid = get_ml_data("ehull", dataset="dft_3d", cache_dir=cache)
+    X, Y, jid = get_ml_data("ehull", dataset="dft_3d", cache_dir=cache)
+    assert jid == ["JVASP-1"] and isinstance(X, np.memmap)
+    # A re-downloaded json is converted again, not served from the cache
+    d.append({"jid": "JVASP-2", "desc": [2.0] * 1557, "ehull": 0.2})
+    dumpjson(d, path)
+    os.utime(path, (1, 1))
+    X, Y, jid = get_ml_data("ehull", dataset="dft_3d", cache_dir=cache)
+    assert jid == ["JVASP-1", "JVASP-2"]
+    assert np.allclose(Y, [0.1, 0.2])
@@ -0,0 +1,49 @@
+from jarvis.analysis.diffraction.xrd import (
+    XRD,
+    XRDSearch,
+    broaden_pattern,
+    xrd_patterns,
+)
+from jarvis.core.atoms import Atoms
+import numpy as np
+
+box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+coords = [[0, 0, 0], [0.25, 0.25, 0.25]]
+elements = ["Si", "Si"]
+Si = Atoms(lattice_mat=box, coords=coords, elements=elements)
+
+
+def test_xrd():
+    x, d, y = XRD().simulate(atoms=Si)
+    assert len(x) == 12
+    assert [round(i, 3) for i in x[:3]] == [28.471, 47.351, 56.182]
+    assert [round(i, 3) for i in y[:3]] == [28.976, 19.311, 11.469]
+
+
+def test_xrd_search(tmpdir):
+    fname = str(tmpdir.join("xrd.npy"))
+    Si2 = Atoms(lattice_mat=np.array(box) * 1.05, coords=coords, elements=elements)
+    Si3 = Atoms(
+        lattice_mat=box, coords=[[0, 0, 0], [0.25, 0.2, 0.25]], elements=elements
+    )
+    dataset = [{"atoms": Si.to_dict()}, Si2, Si3]
+    x = xrd_patterns(dataset, filename=fname, n_jobs=2, chunksize=1)
+    assert x.shape == (3, 901)
+    assert np.allclose(x, xrd_patterns(dataset))
+    a, b, c = XRD().simulate(atoms=Si2)
+    measured = broaden_pattern(a, c)
+    for metric in ["cosine", "pearson"]:
+        search = XRDSearch(fname, ids=["a", "b", "c"], metric=metric)
+        best = search.query(measured, top_k=2)
+        assert best[0][0] == "b"
+        assert round(best[0][1], 4) == 1.0
+        assert search.query(measured, top_k=1, prefilter=2)[0][0] == "b"
+
+
+def test_xrd_failed_rows():
+    Og = Atoms(lattice_mat=box, coords=coords, elements=["Og", "Og"])
+    x = xrd_patterns([Si, Og])
+    assert np.isnan(x[1]).all() and not np.isnan(x[0]).any()
+    search = XRDSearch(x)
+    assert search.query(x[0], top_k=2) == [(0, 1.0)]
+    assert search.query(x[0], top_k=2, prefilter=1)[0][0] == 0
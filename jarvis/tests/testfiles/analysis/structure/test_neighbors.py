@@ -1,5 +1,9 @@
-from jarvis.analysis.structure.neighbors import NeighborsAnalysis
+from jarvis.analysis.structure.neighbors import (
+    NeighborsAnalysis,
+    neighbor_backends,
+)
 from jarvis.core.atoms import Atoms
+from jarvis.db.jsonutils import loadjson
 import numpy as np
 import os
 import matplotlib.pyplot as plt
@@ -36,3 +40,101 @@ def test_nbors():
     ardf = nbr.atomwise_radial_dist()
     cmd = "rm *.png"
     os.system(cmd)
+
+
+def test_nbor_backends():
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    coords = [[0, 0, 0], [0.25, 0.2, 0.25]]
+    elements = ["Si", "Si"]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=elements)
+    kd = NeighborsAnalysis(Si, backend="kdtree").nbor_list(rcut=5.0)
+    bf = NeighborsAnalysis(Si, backend="brute").nbor_list(rcut=5.0)
+    assert (kd["nn"] == bf["nn"]).all()
+    assert (kd["nn_id"] == bf["nn_id"]).all()
+    assert np.allclose(kd["dist"], bf["dist"])
+    assert np.allclose(kd["bondx"], bf["bondx"])
+    small = NeighborsAnalysis(Si, max_n=4).nbor_list(rcut=5.0)
+    assert small["nn"].max() == 4
+
+
+def test_nbor_cache(monkeypatch):
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    coords = [[0, 0, 0], [0.25, 0.2, 0.25]]
+    elements = ["Si", "Si"]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=elements)
+    searches = []
+    search = neighbor_backends["kdtree"]
+
+    def counted(coords, lat, rcut):
+        searches.append(rcut)
+        return search(coords, lat, rcut)
+
+    monkeypatch.setitem(neighbor_backends, "kdtree", counted)
+    nbr = NeighborsAnalysis(Si)
+    del searches[:]
+    nbr.nbor_list(rcut=5.0)
+    cached = nbr.nbor_list(rcut=3.0)
+    assert searches == [5.0]
+    fresh = NeighborsAnalysis(Si).nbor_list(rcut=3.0)
+    for key in ["dist", "nn_id", "nn", "bondx", "bondy", "bondz"]:
+        assert (cached[key] == fresh[key]).all()
+    first = nbr.get_all_distributions
+    n = len(searches)
+    again = nbr.get_all_distributions
+    assert len(searches) == n
+    other = NeighborsAnalysis(Si).get_all_distributions
+    for key in ["rdf", "adfa", "adfb", "ddf", "nn"]:
+        assert np.array_equal(first[key], again[key])
+        assert np.array_equal(first[key], other[key])
+
+
+def test_angle_kernels():
+    box = [[5.493642, 0, 0], [0, 5.493642, 0], [0, 0, 5.493642]]
+    elements = ["Si", "Si", "Si", "Si", "Si", "Si", "Si", "Si"]
+    coords = [
+        [0, 0, 0],
+        [0.25, 0.25, 0.25],
+        [0.000000, 0.500000, 0.500000],
+        [0.250000, 0.750000, 0.750000],
+        [0.500000, 0.000000, 0.500000],
+        [0.750000, 0.250000, 0.750000],
+        [0.500000, 0.500000, 0.000000],
+        [0.750000, 0.750000, 0.250000],
+    ]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=elements)
+    nbr = NeighborsAnalysis(Si)
+    angs = nbr.atomwise_angle_dist(rcut=2.5, c_size=10)
+    assert angs.shape[1] == 180
+    # Six tetrahedral angles of 109.47 degrees around every atom
+    assert (angs[:, 108] == 6).all() and angs.sum() == 6 * len(angs)
+    adfa, _ = nbr.ang_dist_first()
+    assert np.argmax(adfa) == 108
+    ddf, _ = nbr.get_ddf()
+    assert len(ddf) == 179
+    # Reference from the loop implementation, one atom displaced so the
+    # dihedrals spread over several bins
+    coords[1] = [0.27, 0.24, 0.25]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=elements)
+    ddf, _ = NeighborsAnalysis(Si).get_ddf()
+    nz = np.nonzero(ddf)[0]
+    assert nz.tolist() == list(range(54, 64)) + [175, 176, 177, 178]
+    assert ddf[nz].tolist() == [2, 3, 6, 5, 5, 11, 8, 5, 3, 2, 1, 6, 9, 9]
+
+
+def test_rocksalt_distributions():
+    # Rock salt has bond pairs at exactly 180 degrees, where a 1 ulp
+    # change in a bond length moves counts between bins
+    a = 2.82
+    box = [[0, a, a], [a, 0, a], [a, a, 0]]
+    NaCl = Atoms(
+        lattice_mat=box,
+        coords=[[0, 0, 0], [0.5, 0.5, 0.5]],
+        elements=["Na", "Cl"],
+    )
+    dist = NeighborsAnalysis(NaCl).get_all_distributions
+    # Reference from the loop implementation
+    ref = loadjson(
+        os.path.join(os.path.dirname(__file__), "nacl_distributions.json")
+    )
+    for key in ["rdf", "adfa", "adfb", "ddf", "nn"]:
+        assert np.asarray(dist[key]).tolist() == ref[key]
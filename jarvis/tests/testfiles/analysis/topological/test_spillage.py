@@ -1,4 +1,5 @@
 from jarvis.analysis.topological.spillage import Spillage
+import numpy as np
 import os
 
 wf_noso = os.path.join(os.path.dirname(__file__), "WAVECAR.nosoc")
@@ -13,4 +14,12 @@ def test_spillage():
     assert (spillage) == (0.48)
 
 
+def test_spillage_threads():
+    spl = Spillage(wf_noso=wf_noso, wf_so=wf_so)
+    info = spl.overlap_so_spinpol()
+    info_threads = spl.overlap_so_spinpol(n_jobs=4)
+    assert np.allclose(info["spillage_k"], info_threads["spillage_k"])
+    assert info["kmax"] == info_threads["kmax"]
+
+
 # test_spillage()
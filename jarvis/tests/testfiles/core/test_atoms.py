@@ -2,7 +2,10 @@ from jarvis.core.atoms import Atoms, VacuumPadding, get_supercell_dims
 import os
 from jarvis.db.figshare import get_jid_data, data
 import tarfile
+import pytest
 import tempfile
+import subprocess
+import sys
 
 new_file, filename = tempfile.mkstemp()
 
@@ -174,5 +177,115 @@ def test_basic_atoms():
     os.system(cmd)
 
 
+def test_import_time():
+    # Cold import in a fresh interpreter, json tables and plotting deferred
+    code = (
+        "import sys, jarvis.core.atoms;"
+        "print([m for m in ('matplotlib', 'scipy', 'xmltodict')"
+        " if m in sys.modules])"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert out.stdout.strip() == "[]"
+
+
+def test_supercell_order():
+    import numpy as np
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    Si = Atoms(
+        lattice_mat=box,
+        coords=[[0, 0, 0], [0.25, 0.2, 0.25]],
+        elements=["Si", "C"],
+        props=["a", "b"],
+    )
+    s = Si.make_supercell([1, 2, 3])
+    ref = [
+        [(c[0] + j) / 1, (c[1] + k) / 2, (c[2] + m) / 3]
+        for c in Si.frac_coords
+        for j in range(1)
+        for k in range(2)
+        for m in range(3)
+    ]
+    assert np.allclose(s.frac_coords, ref)
+    assert s.elements == ["Si"] * 6 + ["C"] * 6
+    assert s.props == ["a"] * 6 + ["b"] * 6
+    sm = Si.make_supercell_matrix([1, 2, 3])
+    assert sm.elements == s.elements
+    big = Si.make_supercell([4, 4, 3])
+    big2 = Si.make_supercell_matrix([4, 4, 3])
+    assert big.num_atoms == big2.num_atoms == 96
+    assert np.allclose(big.cart_coords, big2.cart_coords)
+
+
+@pytest.mark.skipif(
+    "JARVIS_BENCHMARK" not in os.environ,
+    reason="set JARVIS_BENCHMARK=1 to time large supercells",
+)
+def test_supercell_benchmark():
+    import time
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    Si = Atoms(
+        lattice_mat=box,
+        coords=[[0, 0, 0], [0.25, 0.25, 0.25]],
+        elements=["Si", "Si"],
+    )
+    t1 = time.time()
+    big = Si.make_supercell([40, 40, 32])
+    t2 = time.time()
+    big2 = Si.make_supercell_matrix([40, 40, 32])
+    t3 = time.time()
+    print("make_supercell, make_supercell_matrix time", t2 - t1, t3 - t2)
+    assert big.num_atoms == big2.num_atoms == 102400
+
+
+def test_atoms_cache():
+    import pickle
+    import numpy as np
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    SiC = Atoms(
+        lattice_mat=box,
+        coords=[[0, 0, 0], [0.25, 0.25, 0.25], [0.5, 0.5, 0.5]],
+        elements=["Si", "C", "Si"],
+    )
+    assert not hasattr(SiC, "__dict__")
+    assert SiC.uniq_species == ["Si", "C"]
+    assert SiC.composition.to_dict() == {"Si": 2, "C": 1}
+    assert SiC.atomic_numbers == [14, 6, 14]
+    den = SiC.density
+    assert SiC.density is den
+    cart = SiC.cart_coords.copy()
+    SiC.apply_strain(0.1)
+    assert round(den / SiC.density, 3) == 1.331
+    assert np.allclose(SiC.cart_coords, 1.1 * cart)
+    SiC.elements = ["Ge", "C", "C"]
+    assert SiC.composition.to_dict() == {"Ge": 1, "C": 2}
+    assert SiC.Z.tolist() == [32, 6, 6]
+    SiC2 = pickle.loads(pickle.dumps(SiC))
+    assert SiC2.to_dict() == SiC.to_dict()
+    assert SiC2.density == SiC.density
+
+    Si2 = Atoms(
+        lattice_mat=box, coords=[[0, 0, 0], [0.25, 0.25, 0.25]], elements=["Si", "Si"]
+    )
+    assert Si2.uniq_species == ["Si"]
+    Si2.elements[1] = "C"
+    assert Si2.elements == ["Si", "C"]
+    assert Si2.composition.to_dict() == {"Si": 1, "C": 1}
+    assert Si2.uniq_species == ["Si", "C"]
+    assert Si2.Z.tolist() == [14, 6]
+    Si2.clear_cache()
+    assert Si2.to_dict()["elements"] == ["Si", "C"]
+    Si2.elements.append("O")
+    Si2.coords = [[0, 0, 0], [0.25, 0.25, 0.25], [0.5, 0.5, 0.5]]
+    assert Si2.elements == ["Si", "C", "O"]
+    assert pickle.loads(pickle.dumps(Si2)).elements == ["Si", "C", "O"]
+
+
 # test_basic_atoms()
 # def test_basic_atoms():
@@ -45,3 +45,76 @@ def test_graph():
     assert num_nodes == 48
     assert num_edges == 2304
     assert (g.adjacency_matrix.shape) == (48,48)
+
+
+def test_sparse_graph():
+    from jarvis.core.atoms import Atoms
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    coords = [[0, 0, 0], [0.25, 0.25, 0.25]]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=["Si", "Si"])
+    g = Graph.from_atoms(Si, sparse=True, cutoff=4.0, max_neighbors=None)
+    assert (g.num_nodes, g.num_edges) == (2, 32)
+    assert round(min(g.edge_attributes), 3) == 2.351
+    assert g.edge_vectors.shape == (32, 3)
+    g = Graph.from_atoms(Si, sparse=True, cutoff=4.0, max_neighbors=4)
+    assert g.num_edges == 8
+    assert g.adjacency_matrix.shape == (2, 2)
+    g = Graph.from_dict(g.to_dict())
+    assert len(g.edge_vectors) == 8
+
+
+def test_adjacency_12_atoms():
+    from jarvis.core.atoms import Atoms
+    import numpy as np
+
+    coords = np.random.RandomState(0).rand(12, 3)
+    box = np.eye(3) * 10.0
+    atoms = Atoms(lattice_mat=box, coords=coords, elements=["Si"] * 12)
+    dense = Graph.from_atoms(atoms, enforce_c_size=5.0)
+    assert dense.num_edges == 144
+    dist = np.array(atoms.raw_distance_matrix)
+    assert np.allclose(dense.adjacency_matrix, np.exp(-dist / 0.5))
+    # 144 sparse edges too, sorted by source and distance
+    g = Graph.from_atoms(atoms, sparse=True, cutoff=20.0, max_neighbors=12)
+    assert g.num_edges == 144
+    adj = g.adjacency_matrix
+    assert adj.sum(axis=1).tolist() == [12] * 12
+    ref = np.zeros((12, 12))
+    for i, j in g.edges:
+        ref[i, j] += 1
+    assert (adj == ref).all()
+
+
+def test_export_graphs(tmpdir):
+    from jarvis.core.atoms import Atoms
+    from jarvis.core.graphs import export_graphs, GraphDataset
+    import numpy as np
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    coords = [[0, 0, 0], [0.25, 0.25, 0.25]]
+    Si = Atoms(lattice_mat=box, coords=coords, elements=["Si", "Si"])
+    dataset = [Si, {"atoms": Si.make_supercell([1, 1, 2]).to_dict()}] * 3
+    prefix = str(tmpdir.join("graphs"))
+    shards = export_graphs(
+        dataset, prefix=prefix, shard_size=4, n_jobs=2, cutoff=4.0
+    )
+    assert len(shards) == 2
+    data = GraphDataset(prefix)
+    assert len(data) == 6
+    g = data[3]
+    ref = Graph.from_atoms(
+        Si.make_supercell([1, 1, 2]), sparse=True, cutoff=4.0
+    )
+    assert np.array_equal(g["edges"], ref.edges)
+    assert np.allclose(g["edge_attributes"], ref.edge_attributes)
+    assert g["node_attributes"].shape == (4, 11)
+    b = data.batch([0, 5])
+    assert b["node_attributes"].shape == (6, 11)
+    assert b["edges"].max() == 5
+    assert list(b["graph_index"]) == [0, 0, 1, 1, 1, 1]
+    # A shorter re-export and a longer prefix leave their shards alone
+    export_graphs(dataset[:2], prefix=prefix + "-x", shard_size=1)
+    assert len(export_graphs(dataset[:2], prefix=prefix, shard_size=4)) == 1
+    assert len(GraphDataset(prefix)) == 2
+    assert len(GraphDataset(prefix + "-x")) == 2
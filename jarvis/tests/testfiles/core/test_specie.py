@@ -1,4 +1,12 @@
-from jarvis.core.specie import Specie
+from jarvis.core.specie import (
+    Specie,
+    chem_data,
+    chrg_data,
+    element_index,
+    element_properties,
+)
+from jarvis.core.atoms import Atoms
+import numpy as np
 
 
 def test_sp():
@@ -10,3 +18,24 @@ def test_sp():
         round(el.get_chgdescrp_arr[1], 2),
         round(el.get_descrp_arr[1], 2),
     ) == (13, 26.98, "Al", 12.17, 2792.11)
+
+
+def test_tables():
+    for el in chem_data:
+        ref = np.array(list(chem_data[el].values())).astype(float)
+        assert (Specie(el).get_descrp_arr == ref).all()
+        if el in chrg_data:
+            assert (Specie(el).get_chgdescrp_arr == chrg_data[el][0][1]).all()
+    els = ["Si", "O", "asdfg", "Ac"]
+    props = element_properties(els, ["Z", "atom_mass", "asdfg"])
+    for el, row in zip(els, props):
+        sp = Specie(el)
+        ref = [sp.Z, sp.atomic_mass, sp.element_property("asdfg")]
+        np.testing.assert_array_equal(row, np.array(ref, dtype=float))
+    assert np.isnan(Specie.table[element_index(["asdfg"])]).all()
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    coords = [[0, 0, 0], [0.25, 0.25, 0.25]]
+    atoms = Atoms(lattice_mat=box, coords=coords, elements=["Si", "O"])
+    assert atoms.atomic_numbers == [14, 8]
+    assert atoms.Z.tolist() == [14, 8]
+    assert round(atoms.mass.sum(), 2) == 44.08
@@ -8,3 +8,17 @@ def test_utils():
    x={'x':1,'y':2,'z':3}
    y={'m':1,'n':2,'o':3}
    z=update_dict(x,y)
+
+
+def test_parallel_map():
+    from jarvis.core.utils import parallel_map, as_atoms
+    from jarvis.core.atoms import Atoms
+
+    box = [[2.715, 2.715, 0], [0, 2.715, 2.715], [2.715, 0, 2.715]]
+    Si = Atoms(lattice_mat=box, coords=[[0, 0, 0]], elements=["Si"])
+    items = [Si, {"atoms": Si.to_dict()}] * 5
+    serial = list(parallel_map(abs, range(-5, 5)))
+    assert serial == list(parallel_map(abs, range(-5, 5), 2, 3))
+    assert serial == [5, 4, 3, 2, 1, 0, 1, 2, 3, 4]
+    vols = [as_atoms(i).volume for i in items]
+    assert vols == [Si.volume] * 10
@@ -1,4 +1,13 @@
-from jarvis.db.figshare import data, get_ff_eneleast
+from jarvis.db.figshare import (
+    data,
+    get_ff_eneleast,
+    make_store,
+    store_columns,
+    store_lookup,
+)
+from jarvis.db.jsonutils import dumpjson
+import math
+import os
 
 
 def test_figshare_download():
@@ -19,4 +28,45 @@ def test_figshare_download():
     )
 
 
+def test_store(tmpdir):
+    fname = str(tmpdir.join("data.sqlite"))
+    records = [
+        {"jid": "JVASP-%d" % i, "desc": [i, 0.5], "ehull": i * 0.1}
+        for i in range(100)
+    ]
+    records[3]["ehull"] = "na"
+    records[4]["magnetic"] = True
+    make_store(records, fname)
+    assert store_lookup(fname, jid="JVASP-7")["desc"] == [7, 0.5]
+    assert store_lookup(fname, jid="JVASP-3")["ehull"] == "na"
+    assert store_lookup(fname, jid="JVASP-4")["magnetic"] is True
+    assert store_lookup(fname, jid="JVASP-1000") is None
+    sub = store_columns(fname, columns=["jid", "desc"])
+    assert sub[10] == {"jid": "JVASP-10", "desc": [10, 0.5]}
+    sel = store_columns(
+        fname, columns=["jid"], where='"ehull" BETWEEN ? AND ?', params=(9.75, 10)
+    )
+    assert [i["jid"] for i in sel] == ["JVASP-98", "JVASP-99"]
+    records[5]["ehull"] = float("nan")
+    del records[6]["desc"]
+    make_store(records, fname)
+    rows = store_columns(fname)
+    assert math.isnan(rows[5]["ehull"])
+    assert "desc" not in rows[6] and "magnetic" not in rows[6]
+    assert rows[4]["magnetic"] is True
+    assert rows[7] == records[7]
+
+
+def test_local_store(tmpdir, monkeypatch):
+    import jarvis.db.figshare as figshare
+
+    path = str(tmpdir.join("data.json"))
+    dumpjson([{"jid": "JVASP-1", "ehull": 0.1}], path)
+    monkeypatch.setattr(figshare, "download", lambda dataset: path)
+    assert figshare.get_jid_data("JVASP-1")["ehull"] == 0.1
+    dumpjson([{"jid": "JVASP-1", "ehull": 0.25}], path)
+    os.utime(path, (1, 1))
+    assert figshare.get_jid_data("JVASP-1")["ehull"] == 0.25
+
+
 # test_figshare_download()
@@ -0,0 +1,36 @@
+from jarvis.db.jsonutils import (
+    dumpjson,
+    loadjson,
+    iterjson,
+    iterjson_chunks,
+    pack_chunks,
+)
+import numpy as np
+
+
+def test_iterjson(tmpdir):
+    fname = str(tmpdir.join("data.json"))
+    d = [
+        {"jid": "JVASP-%d" % i, "desc": [i, 0.5, 1e-3], "t": "a]"}
+        for i in range(50)
+    ]
+    d[2]["desc"] = "na"
+    dumpjson(d, fname)
+    for chunk_size in [1, 7, 1 << 20]:
+        assert list(iterjson(fname, chunk_size=chunk_size)) == loadjson(fname)
+    chunks = list(iterjson_chunks(fname, keys=["jid"], chunk_size=20))
+    assert [x.shape for x, r in chunks] == [(20, 3), (20, 3), (10, 3)]
+    X = np.vstack([x for x, r in chunks])
+    assert X.dtype == np.float32
+    assert np.isnan(X[2]).all()
+    assert np.allclose(X[7], [7, 0.5, 1e-3])
+    assert chunks[2][1][0] == {"jid": "JVASP-40"}
+
+
+def test_pack_chunks_width():
+    d = [{"desc": "na"}, {"desc": "na"}, {"desc": [1, 2]}, {"desc": [3, 4]}]
+    chunks = list(pack_chunks(d, chunk_size=1))
+    assert [x.shape for x, r in chunks] == [(1, 2)] * 4
+    X = np.vstack([x for x, r in chunks])
+    assert np.isnan(X[:2]).all() and X[2:].tolist() == [[1, 2], [3, 4]]
+    assert [x.shape for x, r in pack_chunks(d[:2], chunk_size=1)] == [(1, 0)] * 2
@@ -7,6 +7,7 @@ from jarvis.io.vasp.outputs import (
     Locpot,
     Outcar,
     parse_raman_dat,
+    load_chunks,
 )
 import numpy as np
 import os
@@ -17,6 +18,8 @@ plt.switch_backend("agg")
 
 
 import tarfile
+import subprocess
+import sys
 
 example_fold_tgz = os.path.join(
     os.path.dirname(__file__),
@@ -219,6 +222,29 @@ def test_chgcar():
     fd = Chgcar.from_dict(td)
 
 
+def test_chgcar_cache(tmpdir):
+    lines = ["Si", "1.0", "5 0 0", "0 5 0", "0 0 5", "Si", "1", "Direct"]
+    lines += ["0 0 0", "", "    2    2    3"]
+    vals = np.arange(24, dtype="float")
+    for block in [vals[:12], vals[12:]]:
+        lines += [" ".join("%.11E" % v for v in block[:5])]
+        lines += [" ".join("%.11E" % v for v in block[5:10])]
+        lines += [" ".join("%.11E" % v for v in block[10:])]
+        lines += ["augmentation occupancies   1   2", " 0.1 0.2"]
+        if len(lines) < 20:
+            lines += ["    2    2    3"]
+    filename = str(tmpdir.join("CHGCAR"))
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    c1 = Chgcar(filename=filename, cache=True)
+    c2 = Chgcar(filename=filename, cache=True)
+    assert isinstance(c2.chg, np.memmap)
+    assert c1.is_spin_polarized() and c2.is_spin_polarized()
+    assert (c1.chg == c2.chg).all()
+    assert c1.chg.shape == (2, 2, 2, 3)
+    assert c1.chg[1][0][0][0] == 12 / 125.0
+
+
 def test_locpot():
     # print (chg.is_spin_polarized(), chg.is_spin_orbit(), np.array(chg.chg).shape)
     assert (
@@ -313,6 +339,51 @@ def test_dfpt():
     assert vrun.all_structures[0].volume == 42.60334334259966
 
 
+def test_vrun_backends():
+    filename = os.path.join(os.path.dirname(__file__), "vasprun.xml.JVASP-39")
+    fast = Vasprun(filename)
+    full = Vasprun(filename, backend="xmltodict")
+    assert fast.all_input_parameters == full.all_input_parameters
+    assert fast.elements == full.elements
+    assert fast.efermi == full.efermi
+    for a, b in zip(fast.eigenvalues, full.eigenvalues):
+        assert (a == b).all()
+    assert (fast.all_forces == full.all_forces).all()
+    assert (fast.all_energies == full.all_energies).all()
+    assert (fast.kpoints.kpts == full.kpoints.kpts).all()
+    assert fast.get_indir_gap == full.get_indir_gap
+    assert fast.all_structures[0].volume == full.all_structures[0].volume
+    # Sections not read by iterparse fall back to the full parse
+    bec = fast.dfpt_data["born_charges"]
+    assert (bec == full.dfpt_data["born_charges"]).all()
+    part = Vasprun(filename, sections=["energies"])
+    assert part.all_energies[0] == -24.86360178
+    assert (part.all_forces == full.all_forces).all()
+    dos = fast.total_dos
+    assert dos[0].shape == dos[1].shape and dos[2] == []
+
+
+def test_vrun_steps(tmpdir):
+    filename = os.path.join(os.path.dirname(__file__), "vasprun.xml.JVASP-39")
+    vrun = Vasprun(filename, sections=[])
+    steps = list(vrun.iter_steps(fields=("structure", "forces", "energy")))
+    assert len(steps) == 1
+    assert steps[0]["energy"] == -24.86360178
+    assert steps[0]["structure"].volume == 42.60334334259966
+    store = str(tmpdir.join("traj"))
+    assert vrun.to_chunks(store, fields=("structure", "stress")) == 1
+    chunk = list(load_chunks(store))[0]
+    assert chunk["stress"][0][0][0] == -14.79381147
+    assert chunk["frac_coords"].shape == (1, 4, 3)
+    # Default sections are read on first property use, not by streaming
+    lazy = Vasprun(filename)
+    assert len(list(lazy.iter_steps())) == 1
+    assert lazy.to_chunks(str(tmpdir.join("lazy"))) == 1
+    assert lazy._parsed is None
+    assert lazy.all_energies[0] == -24.86360178
+    assert lazy.input_parameters["ENMAX"] == vrun.input_parameters["ENMAX"]
+
+
 def single_element_vrun():
     vrun = Vasprun(
         os.path.join(os.path.dirname(__file__), "vasprun.xml.JVASP-816")
@@ -355,9 +426,33 @@ def test_wavecar():
     assert (gvec.shape) == (555, 3)
 
 
+def test_wavecar_bands():
+    bands = wf_noso.read_bands(ispin=1, ikpt=1, band_slice=slice(0, 4))
+    assert bands.shape == (4, wf_noso._nplws[0])
+    for i in range(4):
+        cg = wf_noso.readBandCoeff(ispin=1, ikpt=1, iband=i + 1)
+        assert (cg == bands[i]).all()
+    assert (wf_noso.gvectors(1) == wf_noso.gvectors(1)).all()
+
+
 def test_raman():
     ram = os.path.join(os.path.dirname(__file__), "vasp_raman.dat")
     parse_raman_dat(ram)
 
 
+def test_import_time():
+    # Cold import in a fresh interpreter, plotting and xml parsing deferred
+    code = (
+        "import sys, jarvis.io.vasp.outputs;"
+        "print([m for m in ('matplotlib', 'scipy', 'xmltodict')"
+        " if m in sys.modules])"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert out.stdout.strip() == "[]"
+
+
 # test_out()
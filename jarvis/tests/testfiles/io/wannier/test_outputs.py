@@ -6,6 +6,8 @@ from jarvis.io.wannier.outputs import (
     get_orbitals,
 )
 import os
+import shutil
+import numpy as np
 import tempfile
 from jarvis.core.kpoints import generate_kgrid
 from jarvis.io.vasp.inputs import Poscar
@@ -82,6 +84,64 @@ def test_outputs_bi2se3():
     ) == (0.12, 3.02, "Bi", 1, 40, 320,)
 
 
+def test_solve_ham_batch():
+    w = WannierHam(filename=wann_soc_win_hr)
+    kpoints = generate_kgrid([4, 4, 4])
+    vals, vects, p = w.solve_ham_batch(kpoints, proj=[0, 1], chunk_size=7)
+    for i, k in enumerate(kpoints):
+        val, vect, pk = w.solve_ham(k, proj=[0, 1])
+        assert np.allclose(vals[i], val)
+        assert np.allclose(p[i], pk)
+    eigs = w.band_structure_eigs(kpath=kpoints, efermi=1.0)
+    assert np.allclose(eigs, vals - 1.0)
+
+
+def test_find_nodes():
+    w = WannierHam(filename=wann_soc_win_hr)
+    out = w.find_nodes(nk1=1, nk2=1, nk3=1)
+    assert w.nevals > 0
+    par = WannierHam(filename=wann_soc_win_hr).find_nodes(
+        nk1=1, nk2=1, nk3=1, n_jobs=2
+    )
+    assert np.allclose(out[1], par[1])
+    assert np.allclose(out[3], par[3])
+    for a, b in zip(out[4:], par[4:]):
+        assert np.allclose(a, b)
+    wr = WannierHam(filename=wann_soc_win_hr)
+    ref = wr.find_nodes(nk1=1, nk2=1, nk3=1, refine=True)
+    assert wr.nevals <= w.nevals
+    assert len(ref[4]) <= len(out[4])
+
+
+def test_sparse_supercell():
+    w = WannierHam(filename=wann_soc_win_hr)
+    big = w.generate_supercell([2, 1, 2], index=[0, 0, 1])
+    sp = w.generate_supercell([2, 1, 2], index=[0, 0, 1], sparse=True)
+    assert np.array_equal(big.R, sp.R)
+    assert np.allclose(big.HR, sp.HR.toarray())
+    k = [0.1, 0.2, 0.0]
+    val, vect, p = big.solve_ham(k)
+    vals, vects, ps = sp.solve_ham_sparse(k, nbands=6, sigma=0.0)
+    near = np.sort(val[np.argsort(np.abs(val))[:6]])
+    assert np.allclose(vals, near)
+
+
+def test_hr_cache(tmpdir):
+    fname = str(tmpdir.join("wannier90_hr.dat"))
+    shutil.copy(wann_soc_win_hr, fname)
+    w = WannierHam(filename=fname, cache=True)
+    assert os.path.isfile(fname + ".npz")
+    wc = WannierHam(filename=fname, cache=True)
+    assert np.array_equal(w.HR, wc.HR)
+    assert np.array_equal(w.R, wc.R)
+    assert w.ind_dict == wc.ind_dict
+    # changed file is parsed again
+    with open(fname, "a") as f:
+        f.write("\n")
+    wn = WannierHam(filename=fname, cache=True)
+    assert np.array_equal(w.H_val, wn.H_val)
+
+
 def test_wann_cent():
     centers = Wannier90wout(wout_path=wann_wout).give_wannier_centers()
     # print (centers, len(centers))